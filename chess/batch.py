@@ -0,0 +1,231 @@
+# chess/batch.py
+
+import argparse
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for batched evaluation
+    np = None
+
+from chess.evaluation import MG_TABLES, EG_TABLES, PHASE_WEIGHTS, MAX_PHASE, SCORE_UNITS, evaluate_board
+from chess.pawns import (
+    DOUBLED_PAWN_PENALTY, ISOLATED_PAWN_PENALTY, BACKWARD_PAWN_PENALTY, PASSED_PAWN_BONUS_MG, PASSED_PAWN_BONUS_EG,
+)
+from chess.position import Position, STARTING_FEN
+from chess.bitboard import COL_MASKS, ROW_MASKS
+from chess.move_generator import generate_position_moves
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Batched evaluation requires numpy (pip install numpy)")
+
+
+def encode_planes(positions):
+    """
+    Encode positions as a (N, 12, 64) array of 0/1 piece planes.
+
+    Plane p holds the bitboard of piece index p (white P..K, then black P..K,
+    see chess/position.py) with one entry per square.
+
+    Args:
+        positions (list): Positions, or list boards (converted with Position.from_board).
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (N, 12, 64).
+    """
+    _require_numpy()
+    bitboards = np.array(
+        [(p if isinstance(p, Position) else Position.from_board(p)).pieces for p in positions],
+        dtype=np.uint64,
+    ).reshape(-1, 12)
+    # Little-endian bytes of each bitboard, unpacked least significant bit first
+    as_bytes = bitboards.astype('<u8').view(np.uint8).reshape(-1, 12, 8)
+    return np.unpackbits(as_bytes, axis=2, bitorder='little')
+
+
+def stacked_tables():
+    """ The evaluation tables as (12, 64) int64 arrays (middlegame, endgame) plus phase weights per plane. """
+    _require_numpy()
+    weights = np.array([PHASE_WEIGHTS[piece % 6] for piece in range(12)], dtype=np.int64)
+    return np.array(MG_TABLES, dtype=np.int64), np.array(EG_TABLES, dtype=np.int64), weights
+
+
+def evaluate_planes(planes):
+    """
+    Material, piece-square and pawn structure evaluation of encoded positions.
+
+    The middlegame and endgame scores come from a single (N, 768) x (768, 2)
+    matrix product against the stacked tables. The tables hold integer
+    centipawns and every partial sum stays far below 2**53, so the float64
+    product is exact and the tapered blend matches evaluate_board bit for bit.
+    The pawn structure terms are computed with bitboard operations over the
+    whole batch (see pawn_scores) and added in before the blend.
+
+    Returns:
+        numpy.ndarray: float64 scores in pawns, positive favoring white.
+    """
+    _require_numpy()
+    mg_table, eg_table, weights = stacked_tables()
+    tables = np.stack([mg_table.reshape(-1), eg_table.reshape(-1)], axis=1).astype(np.float64)
+    flat = planes.reshape(len(planes), 12 * 64).astype(np.float64)
+    scores = flat @ tables
+    pawn_mg, pawn_eg = pawn_scores(planes)
+    mg, eg = scores[:, 0] + pawn_mg, scores[:, 1] + pawn_eg
+    phase = np.minimum(planes.sum(axis=2, dtype=np.int64) @ weights, MAX_PHASE)
+    return (mg * phase + eg * (MAX_PHASE - phase)) / (MAX_PHASE * SCORE_UNITS)
+
+
+def pawn_scores(planes):
+    """
+    Pawn structure (middlegame, endgame) centipawns of encoded positions, as two
+    int64 arrays: the terms of chess.pawns.pawn_structure, computed with shifts
+    and masks on arrays of pawn bitboards, one element per position.
+    """
+    _require_numpy()
+    # Pack the two pawn planes back into bitboards
+    bitboards = np.packbits(planes[:, [0, 6]], axis=2, bitorder='little').view('<u8').reshape(-1, 2)
+    white, black = bitboards[:, 0].astype(np.uint64), bitboards[:, 1].astype(np.uint64)
+    white_mg, white_eg = _side_pawn_scores(white, black)
+    # Black's pawns with the ranks flipped (byte swapped), so that they too advance to higher ranks
+    black_mg, black_eg = _side_pawn_scores(black.byteswap(), white.byteswap())
+    return white_mg - black_mg, white_eg - black_eg
+
+
+_FILE_A = np.uint64(COL_MASKS[0])
+_FILE_H = np.uint64(COL_MASKS[7])
+_RANK_1 = np.uint64(ROW_MASKS[0])
+_RANKS = [np.uint64(mask) for mask in ROW_MASKS]
+_SHIFTS = {shift: np.uint64(shift) for shift in (1, 7, 8, 9, 16, 32)}
+
+
+def _popcount(bitboards):
+    """ Bits set in each element of a uint64 array, as int64. """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    bits = bitboards - ((bitboards >> _SHIFTS[1]) & np.uint64(0x5555555555555555))
+    bits = (bits & np.uint64(0x3333333333333333)) + ((bits >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    bits = (bits + (bits >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((bits * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def _fill_up(bitboards):
+    """ Each square, plus every square above it on its file. """
+    bitboards = bitboards | (bitboards << _SHIFTS[8])
+    bitboards = bitboards | (bitboards << _SHIFTS[16])
+    return bitboards | (bitboards << _SHIFTS[32])
+
+
+def _fill_down(bitboards):
+    bitboards = bitboards | (bitboards >> _SHIFTS[8])
+    bitboards = bitboards | (bitboards >> _SHIFTS[16])
+    return bitboards | (bitboards >> _SHIFTS[32])
+
+
+def _adjacent_files(bitboards):
+    """ The squares beside each set square, on the same rank. """
+    return ((bitboards << _SHIFTS[1]) & ~_FILE_A) | ((bitboards >> _SHIFTS[1]) & ~_FILE_H)
+
+
+def _side_pawn_scores(own, enemy):
+    """ Pawn terms of the side whose pawns are `own`, both bitboards oriented so that it advances to higher ranks. """
+    files = _fill_down(_fill_up(own))
+    # Doubled: a file with n pawns counts n - 1
+    doubled = _popcount(own) - _popcount(files & _RANK_1)
+    neighbours = _adjacent_files(files)
+    isolated = _popcount(own & ~neighbours)
+    # Backward: not isolated, no friendly pawn on an adjacent file level with
+    # or behind it, and the square in front guarded by an enemy pawn
+    supported = _fill_up(_adjacent_files(own))
+    guarded = _adjacent_files(enemy) >> _SHIFTS[16]
+    backward = _popcount(own & neighbours & ~supported & guarded)
+    # Passed: no enemy pawn ahead on its own or an adjacent file, and no
+    # friendly pawn ahead on its own file
+    passed = own & ~_fill_down((enemy | _adjacent_files(enemy)) >> _SHIFTS[8]) & ~_fill_down(own >> _SHIFTS[8])
+    mg = (- DOUBLED_PAWN_PENALTY[0] * doubled - ISOLATED_PAWN_PENALTY[0] * isolated
+          - BACKWARD_PAWN_PENALTY[0] * backward)
+    eg = (- DOUBLED_PAWN_PENALTY[1] * doubled - ISOLATED_PAWN_PENALTY[1] * isolated
+          - BACKWARD_PAWN_PENALTY[1] * backward)
+    for rank in range(1, 7):
+        count = _popcount(passed & _RANKS[rank])
+        mg += PASSED_PAWN_BONUS_MG[rank] * count
+        eg += PASSED_PAWN_BONUS_EG[rank] * count
+    return mg, eg
+
+
+def evaluate_batch(positions):
+    """
+    Evaluate many positions at once; identical to [evaluate_board(p) for p in positions].
+
+    Args:
+        positions (list): Positions or list boards.
+
+    Returns:
+        numpy.ndarray: float64 scores in pawns, positive favoring white.
+    """
+    return evaluate_planes(encode_planes(positions))
+
+
+def random_positions(count, seed=0, max_plies=80):
+    """ Positions sampled from random legal games, for benchmarks. """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.from_fen(STARTING_FEN)
+        for _ in range(rng.randrange(max_plies)):
+            moves = generate_position_moves(position, position.side)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        position.history = []
+        positions.append(position)
+    return positions
+
+
+def benchmark(count=20000, seed=0):
+    """ Compare batched evaluation throughput with the scalar evaluate_board paths. """
+    _require_numpy()
+    positions = random_positions(count, seed)
+    boards = [position.to_board() for position in positions]
+
+    start = time.perf_counter()
+    list_scores = [evaluate_board(board) for board in boards]
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recount_scores = []
+    for position in positions:
+        position.refresh_scores()
+        recount_scores.append(evaluate_board(position))
+    recount_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    planes = encode_planes(positions)
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_scores = evaluate_planes(planes)
+    batch_time = time.perf_counter() - start
+
+    identical = (np.array_equal(batch_scores, np.array(list_scores))
+                 and np.array_equal(batch_scores, np.array(recount_scores)))
+    print(f"{count} positions, batch results identical to evaluate_board: {identical}")
+    print(f"evaluate_board on list boards     {count / list_time:>12.0f} positions/s")
+    print(f"evaluate_board after full recount {count / recount_time:>12.0f} positions/s")
+    print(f"evaluate_batch (encode + eval)    {count / (encode_time + batch_time):>12.0f} positions/s")
+    print(f"evaluate_planes (pre-encoded)     {count / batch_time:>12.0f} positions/s")
+    print(f"evaluate_batch speedup over the full recount: {recount_time / (encode_time + batch_time):.2f}x")
+    return identical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batched NumPy evaluation against evaluate_board.")
+    parser.add_argument("--positions", type=int, default=20000, help="number of random positions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    return 0 if benchmark(args.positions, args.seed) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+# chess/bitboard.py
+
+# Bitboard helpers and precomputed attack tables.
+#
+# Squares are numbered the same way as the list-of-lists board in chess/board.py:
+# square = row * 8 + col, so square 0 is board[0][0] (white's queen-side rook)
+# and square 63 is board[7][7]. A bitboard is a Python int whose bit `square`
+# is set when that square is part of the set.
+
+FULL_BOARD = 0xFFFFFFFFFFFFFFFF
+
+WHITE, BLACK = 0, 1
+COLOR_NAMES = ('white', 'black')
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_TYPES = 'PNBRQK'
+
+ROW_MASKS = [0xFF << (8 * row) for row in range(8)]
+COL_MASKS = [0x0101010101010101 << col for col in range(8)]
+
+
+def square_index(row, col):
+    """ Convert a (row, col) board coordinate to a square index. """
+    return row * 8 + col
+
+
+def square_coords(square):
+    """ Convert a square index back to a (row, col) board coordinate. """
+    return square >> 3, square & 7
+
+
+def color_index(color):
+    """ Convert 'white'/'black' to WHITE/BLACK, passing integer colors through. """
+    if color == 'white':
+        return WHITE
+    if color == 'black':
+        return BLACK
+    return color
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(bb):
+        """ Number of set bits in a bitboard. """
+        return bb.bit_count()
+else:  # Python < 3.10
+    def popcount(bb):
+        """ Number of set bits in a bitboard. """
+        return bin(bb).count('1')
+
+
+def lsb(bb):
+    """ Index of the least significant set bit of a non-empty bitboard. """
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb):
+    """ Index of the most significant set bit of a non-empty bitboard. """
+    return bb.bit_length() - 1
+
+
+def iter_squares(bb):
+    """ Yield the index of every set bit, lowest first. """
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for square in range(64):
+        row, col = square_coords(square)
+        attacks = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                attacks |= 1 << square_index(r, c)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks([
+    (2, 1), (2, -1), (-2, 1), (-2, -1),
+    (1, 2), (1, -2), (-1, 2), (-1, -2)
+])
+
+KING_ATTACKS = _leaper_attacks([
+    (1, 0), (-1, 0), (0, 1), (0, -1),
+    (1, 1), (1, -1), (-1, 1), (-1, -1)
+])
+
+# PAWN_ATTACKS[color][square]: squares a pawn of `color` on `square` attacks.
+# White pawns move towards higher rows, black pawns towards lower rows.
+PAWN_ATTACKS = [
+    _leaper_attacks([(1, -1), (1, 1)]),
+    _leaper_attacks([(-1, -1), (-1, 1)]),
+]
+
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def _slide(square, directions, occupied):
+    """ Attacks of a slider on `square`, stopping at the first occupied square. """
+    row, col = square_coords(square)
+    attacks = 0
+    for dr, dc in directions:
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bit = 1 << square_index(r, c)
+            attacks |= bit
+            if occupied & bit:
+                break
+            r, c = r + dr, c + dc
+    return attacks
+
+
+def _relevant_mask(square, directions):
+    """ Squares whose occupancy can change a slider's attacks (board edges excluded). """
+    row, col = square_coords(square)
+    mask = 0
+    for dr, dc in directions:
+        r, c = row + dr, col + dc
+        while 0 <= r + dr < 8 and 0 <= c + dc < 8:
+            mask |= 1 << square_index(r, c)
+            r, c = r + dr, c + dc
+    return mask
+
+
+def _slider_tables(directions):
+    """
+    Build occupancy-indexed attack tables for a slider.
+
+    For every square, every subset of its relevant occupancy mask is mapped to
+    the attack set. Python's dict plays the role that magic multiplication plays
+    in C engines: a lookup is a single `occupied & mask` plus a hash probe.
+    """
+    masks = []
+    tables = []
+    for square in range(64):
+        mask = _relevant_mask(square, directions)
+        table = {}
+        subset = 0
+        while True:  # Carry-Rippler enumeration of all subsets of `mask`
+            table[subset] = _slide(square, directions, subset)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+ROOK_MASKS, ROOK_TABLES = _slider_tables(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_TABLES = _slider_tables(BISHOP_DIRECTIONS)
+
+
+def rook_attacks(square, occupied):
+    """ Squares attacked by a rook on `square` given the occupancy bitboard. """
+    return ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+
+def bishop_attacks(square, occupied):
+    """ Squares attacked by a bishop on `square` given the occupancy bitboard. """
+    return BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+
+
+def queen_attacks(square, occupied):
+    """ Squares attacked by a queen on `square` given the occupancy bitboard. """
+    return (ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+            | BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]])
+
+
+def _line_tables():
+    """
+    BETWEEN[a][b]: squares strictly between a and b if they share a row, column
+    or diagonal, else 0. LINE[a][b]: the whole line through a and b (board edge
+    to board edge, both included) if they are aligned, else 0.
+    """
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        row, col = square_coords(a)
+        for dr, dc in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            ray = 0
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                b = square_index(r, c)
+                between[a][b] = ray
+                ray |= 1 << b
+                r, c = r + dr, c + dc
+            full = ray | (1 << a) | _ray(a, -dr, -dc)
+            for b in iter_squares(ray):
+                line[a][b] = full
+    return between, line
+
+
+def _ray(square, dr, dc):
+    row, col = square_coords(square)
+    ray = 0
+    r, c = row + dr, col + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        ray |= 1 << square_index(r, c)
+        r, c = r + dr, c + dc
+    return ray
+
+
+BETWEEN, LINE = _line_tables()
@@ -1,5 +1,6 @@
 # chess/board.py
 from chess.pieces import Piece
+from chess.position import Position
 from chess.move_generator import (
     generate_pawn_moves,
     generate_knight_moves,
@@ -46,6 +47,23 @@ def setup_initial_board():
 
     return board
 
+
+# Function to set up the initial position as bitboards
+def setup_initial_position():
+    return Position.from_board(setup_initial_board())
+
+
+# Function to set up a position from a FEN string
+def setup_position_from_fen(fen):
+    return Position.from_fen(fen)
+
+
+# Function to write a board (list board or Position) as a FEN string
+def board_to_fen(board, color='white'):
+    if not isinstance(board, Position):
+        board = Position.from_board(board, color)
+    return board.to_fen()
+
 # def make_move(board, move):
 #     """
 #     Applies the given move to the board and returns the new board state.
@@ -84,6 +102,8 @@ def setup_initial_board():
 
 # Function to print the chessboard
 def print_board(board):
+    if isinstance(board, Position):
+        board = board.to_board()
     for row in board:
         print(' '.join([str(piece) if piece else '.' for piece in row]))
 
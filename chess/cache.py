@@ -0,0 +1,183 @@
+# chess/cache.py
+
+import sqlite3
+import time
+
+# Persistent analysis cache: search results kept in an SQLite file across
+# runs, keyed by Zobrist key (see chess/zobrist.py, whose keys are the same in
+# every run). The search consults it before starting and writes its results
+# back when it is done (see iterative_deepening in chess/search.py).
+#
+# Entries hold what a transposition table entry holds: best move, depth,
+# bound and score (side to move's view), mate scores counted in plies from
+# the stored position as in the table (see score_to_tt in chess/search.py),
+# so they hold wherever the position is reached. Delete the file after
+# changing the evaluation, or the old scores are used.
+
+DEFAULT_MAX_ENTRIES = 1000000
+
+# When the table outgrows its limit, entries are evicted down to this
+# fraction of it, so that eviction runs rarely and in bulk
+EVICT_TO = 0.9
+
+# Eviction policies: least recently used first, or shallowest first (least
+# recently used among equal depths)
+EVICT_LRU = 'lru'
+EVICT_DEPTH = 'depth'
+
+# Keys per SELECT, below SQLite's limit on bound parameters
+_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    key INTEGER PRIMARY KEY,
+    move INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    bound INTEGER NOT NULL,
+    score REAL NOT NULL,
+    used REAL NOT NULL
+)
+"""
+
+_UPSERT = """
+INSERT INTO analysis (key, move, depth, bound, score, used) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    move = excluded.move, depth = excluded.depth, bound = excluded.bound,
+    score = excluded.score, used = excluded.used
+WHERE excluded.depth >= analysis.depth
+"""
+
+_EVICT_ORDER = {
+    EVICT_LRU: 'used',
+    EVICT_DEPTH: 'depth, used',
+}
+
+
+def _signed(key):
+    """ A 64-bit Zobrist key as the signed integer SQLite stores. """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _unsigned(key):
+    return key + (1 << 64) if key < 0 else key
+
+
+class AnalysisCache:
+    """
+    Search results stored on disk, shared between runs and processes.
+
+    A store keeps the deeper of the old and new result for a position. Several
+    processes may use one file: SQLite serializes the writes, and the file is
+    opened in write-ahead-log mode so that readers do not wait for writers.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, policy=EVICT_LRU):
+        """
+        Args:
+            path (str): The cache file; created if it does not exist.
+            max_entries (int): Size limit, in positions.
+            policy (str): Which entries to evict first: EVICT_LRU or EVICT_DEPTH.
+        """
+        if policy not in _EVICT_ORDER:
+            raise ValueError(f"Unknown eviction policy {policy!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.policy = policy
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+        self._entries = self.count()
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def close(self):
+        self.connection.close()
+
+    def count(self):
+        """ Number of positions in the cache. """
+        return self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def probe(self, key):
+        """
+        Look up one position.
+
+        Returns:
+            tuple or None: (move, depth, bound, score) as TranspositionTable.probe.
+        """
+        return self.probe_many([key]).get(key)
+
+    def probe_many(self, keys):
+        """
+        Look up several positions at once, marking the ones found as used.
+
+        Returns:
+            dict: Zobrist key -> (move, depth, bound, score) for the keys found.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for index in range(0, len(keys), _QUERY_CHUNK):
+            chunk = [_signed(key) for key in keys[index:index + _QUERY_CHUNK]]
+            rows = self.connection.execute(
+                f"SELECT key, move, depth, bound, score FROM analysis WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk)
+            for key, move, depth, bound, score in rows:
+                found[_unsigned(key)] = (move, depth, bound, score)
+        self.probes += len(keys)
+        self.hits += len(found)
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany("UPDATE analysis SET used = ? WHERE key = ?",
+                                            [(now, _signed(key)) for key in found])
+        return found
+
+    def store_many(self, entries):
+        """
+        Store search results, keeping existing entries that are deeper.
+
+        Args:
+            entries (iterable): (key, move, depth, bound, score) tuples, scores
+                                from the side to move's point of view.
+        """
+        now = time.time()
+        rows = [(_signed(key), move, depth, bound, score, now) for key, move, depth, bound, score in entries]
+        if not rows:
+            return
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(_UPSERT, rows)
+            # Updates count as changes too, so this overestimates the growth
+            self._entries += self.connection.total_changes - before
+        self.stores += len(rows)
+        if self._entries > self.max_entries:
+            self._entries = self.count()
+            if self._entries > self.max_entries:
+                self.evict(self._entries - int(self.max_entries * EVICT_TO))
+
+    def evict(self, count):
+        """ Remove `count` entries, in the order of the eviction policy. """
+        with self.connection:
+            self.connection.execute(
+                f"DELETE FROM analysis WHERE key IN "
+                f"(SELECT key FROM analysis ORDER BY {_EVICT_ORDER[self.policy]} LIMIT ?)", (count,))
+        self._entries = self.count()
+
+    def clear(self):
+        """ Remove every entry and reset the counters. """
+        with self.connection:
+            self.connection.execute("DELETE FROM analysis")
+        self._entries = 0
+        self.probes = self.hits = self.stores = 0
+
+    def stats(self):
+        """ Counters: entries, probes, hits, stores and hit rate. """
+        return {
+            'entries': self.count(),
+            'probes': self.probes,
+            'hits': self.hits,
+            'stores': self.stores,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+        }
@@ -0,0 +1,251 @@
+# chess/epd.py
+
+import argparse
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chess.position import Position
+from chess.notation import parse_san, move_to_san
+from chess.search import iterative_deepening, get_transposition_table, set_hash_size, DEFAULT_HASH_MB
+
+# EPD (Extended Position Description) lines hold the first four FEN fields
+# followed by operations, each an opcode with operands and a closing ';':
+#
+#   2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";
+#
+# Test suites use `bm` (best moves, any of which solves the position), `am`
+# (moves to avoid) and `id`.
+
+
+def parse_epd(line):
+    """
+    Split an EPD line into a FEN and its operations.
+
+    Args:
+        line (str): One EPD record.
+
+    Returns:
+        tuple: (fen, operations) where operations maps each opcode to its list of
+               operands. The `hmvc` and `fmvn` operations, when present, fill in
+               the FEN move clocks.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD, expected at least 4 fields: {line!r}")
+    operations = {}
+    if len(fields) == 5:
+        for operation in _split_operations(fields[4]):
+            tokens = shlex.split(operation)
+            if tokens:
+                operations[tokens[0]] = tokens[1:]
+    halfmove = operations.get('hmvc', ['0'])[0]
+    fullmove = operations.get('fmvn', ['1'])[0]
+    return ' '.join(fields[:4] + [halfmove, fullmove]), operations
+
+
+def _split_operations(text):
+    """ Split on the semicolons that are not inside a quoted operand. """
+    operations = []
+    current = ''
+    quoted = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        if char == ';' and not quoted:
+            operations.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        operations.append(current.strip())
+    return operations
+
+
+def expected_moves(fen, operations):
+    """
+    Parse the `bm` and `am` operands of an EPD record.
+
+    Returns:
+        tuple: (best_moves, avoid_moves), sets of int moves.
+
+    Raises:
+        ValueError: If the FEN or an operand cannot be parsed.
+    """
+    try:
+        position = Position.from_fen(fen)
+    except IndexError:
+        raise ValueError(f"Invalid FEN: {fen!r}")
+    best_moves = {parse_san(position, san) for san in operations.get('bm', [])}
+    avoid_moves = {parse_san(position, san) for san in operations.get('am', [])}
+    return best_moves, avoid_moves
+
+
+def read_epd(path, errors=None):
+    """
+    Parse an EPD file into a list of (fen, operations), skipping blank and '#' lines.
+
+    Records with an invalid FEN or an unparsable `bm`/`am` move are skipped,
+    so that one bad record does not stop a whole suite.
+
+    Args:
+        path (str): The EPD file.
+        errors (list): Optional; a message for each skipped record is appended.
+    """
+    entries = []
+    with open(path) as epd_file:
+        for line_number, line in enumerate(epd_file, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    entry = parse_epd(line)
+                    expected_moves(*entry)
+                except ValueError as error:
+                    if errors is not None:
+                        errors.append(f"{path}:{line_number}: {error}")
+                    continue
+                entries.append(entry)
+    return entries
+
+
+def _init_worker(hash_mb):
+    set_hash_size(hash_mb)
+
+
+def solve_position(fen, operations, depth=None, movetime_ms=None, max_nodes=None):
+    """
+    Search one EPD position and check the result against its `bm`/`am` operations.
+
+    The transposition table is cleared first so that every position is searched
+    the same way regardless of what ran before it in the worker.
+
+    Returns:
+        dict: id, fen, the expected and played moves (SAN), solved, depth, nodes,
+              elapsed, and time_to_solution, the time at which the search settled
+              on a solving move for good (None if it never did).
+    """
+    position = Position.from_fen(fen)
+    best_moves, avoid_moves = expected_moves(fen, operations)
+
+    def solves(move):
+        if move is None:
+            return False
+        if best_moves and move not in best_moves:
+            return False
+        return move not in avoid_moves
+
+    get_transposition_table().clear()
+    result = iterative_deepening(position, depth, movetime_ms=movetime_ms, max_nodes=max_nodes)
+
+    time_to_solution = None
+    for move, at in zip(result.depth_moves, result.depth_times):
+        if not solves(move):
+            time_to_solution = None
+        elif time_to_solution is None:
+            time_to_solution = at
+
+    return {
+        'id': (operations.get('id') or [fen])[0],
+        'fen': fen,
+        'bm': operations.get('bm', []),
+        'am': operations.get('am', []),
+        'move': move_to_san(position, result.best_move) if result.best_move is not None else None,
+        'solved': solves(result.best_move),
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'elapsed': result.elapsed,
+        'time_to_solution': time_to_solution,
+    }
+
+
+def _solve_entry(entry, depth, movetime_ms, max_nodes):
+    fen, operations = entry
+    return solve_position(fen, operations, depth, movetime_ms, max_nodes)
+
+
+def run_suite(entries, workers=None, depth=None, movetime_ms=None, max_nodes=None, hash_mb=DEFAULT_HASH_MB):
+    """
+    Solve EPD positions over a pool of worker processes.
+
+    Each position is searched by a single worker under the same limits, so the
+    per-position numbers do not depend on the number of workers; more workers
+    only finish the suite sooner.
+
+    Args:
+        entries (list): (fen, operations) pairs as returned by read_epd.
+        workers (int): Number of processes (default: one per CPU).
+        depth (int): Depth limit per position.
+        movetime_ms (int): Time limit per position in milliseconds.
+        max_nodes (int): Node limit per position.
+        hash_mb (int): Transposition table size of each worker.
+
+    Yields:
+        dict: The result of each position (see solve_position), in input order.
+    """
+    if depth is None and movetime_ms is None and max_nodes is None:
+        raise ValueError("run_suite needs a depth, movetime_ms or max_nodes limit")
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(hash_mb,)) as pool:
+        futures = [pool.submit(_solve_entry, entry, depth, movetime_ms, max_nodes) for entry in entries]
+        for future in futures:
+            yield future.result()
+
+
+def summarize(results, wall_time):
+    """ Totals over a suite run: positions, solved, nodes, summed search time and nps. """
+    nodes = sum(r['nodes'] for r in results)
+    search_time = sum(r['elapsed'] for r in results)
+    solved = [r for r in results if r['solved']]
+    solution_times = [r['time_to_solution'] for r in solved if r['time_to_solution'] is not None]
+    return {
+        'positions': len(results),
+        'solved': len(solved),
+        'nodes': nodes,
+        'search_time': search_time,
+        'wall_time': wall_time,
+        'nps': nodes / search_time if search_time else 0.0,
+        'suite_nps': nodes / wall_time if wall_time else 0.0,
+        'mean_time_to_solution': sum(solution_times) / len(solution_times) if solution_times else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an EPD test suite (bm/am operations) and report solved positions and speed.")
+    parser.add_argument("epd", help="EPD file")
+    parser.add_argument("--workers", type=int, help="number of processes (default: one per CPU)")
+    parser.add_argument("--depth", type=int, help="depth limit per position")
+    parser.add_argument("--movetime", type=int, help="time limit per position in milliseconds")
+    parser.add_argument("--nodes", type=int, help="node limit per position")
+    parser.add_argument("--hash", type=int, default=DEFAULT_HASH_MB, metavar="MB", help="transposition table size per worker")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.movetime = 1000
+
+    errors = []
+    entries = read_epd(args.epd, errors)
+    for error in errors:
+        print(f"skipped {error}", file=sys.stderr)
+    start = time.perf_counter()
+    results = []
+    for r in run_suite(entries, args.workers, args.depth, args.movetime, args.nodes, args.hash):
+        results.append(r)
+        if not args.quiet:
+            expected = ('bm ' + ' '.join(r['bm'])) if r['bm'] else ('am ' + ' '.join(r['am']))
+            solution = f"{r['time_to_solution']:.2f}s" if r['time_to_solution'] is not None else '-'
+            print(f"{'ok  ' if r['solved'] else 'FAIL'} {r['id']:<16} {expected:<16} played {r['move'] or '-':<8} "
+                  f"depth {r['depth']:>2}  nodes {r['nodes']:>9}  solved at {solution}")
+    summary = summarize(results, time.perf_counter() - start)
+
+    print(f"solved {summary['solved']} / {summary['positions']}")
+    print(f"nodes {summary['nodes']}  search time {summary['search_time']:.2f}s  nps {summary['nps']:.0f} per worker")
+    print(f"wall time {summary['wall_time']:.2f}s  suite throughput {summary['suite_nps']:.0f} nps")
+    if summary['mean_time_to_solution'] is not None:
+        print(f"mean time to solution {summary['mean_time_to_solution']:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
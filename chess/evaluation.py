@@ -1,5 +1,9 @@
 # chess/evaluation.py
 
+import runpy
+
+from chess.pawns import PAWN_TABLE, pawn_structure
+
 # Piece values for material evaluation
 PIECE_VALUES = {
     'P': 1,   # Pawn
@@ -94,55 +98,133 @@ KING_ENDGAME_POSITION_SCORES = [
     [-5, -3, -3, -3, -3, -3, -3, -5]
 ]
 
-def evaluate_board(board, endgame=False):
+# The position tables by name, in piece type order (the king has two)
+TABLE_NAMES = ('PAWN_POSITION_SCORES', 'KNIGHT_POSITION_SCORES', 'BISHOP_POSITION_SCORES',
+               'ROOK_POSITION_SCORES', 'QUEEN_POSITION_SCORES',
+               'KING_MIDDLE_POSITION_SCORES', 'KING_ENDGAME_POSITION_SCORES')
+
+# Game phase weight of each piece type (P, N, B, R, Q, K). The starting
+# position adds up to MAX_PHASE; fewer pieces means closer to the endgame.
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+MAX_PHASE = 24
+
+# Scores are accumulated in integer centipawns so that running sums kept by
+# Position.make_move never drift from a full recount.
+SCORE_UNITS = 100
+
+# Per-piece square tables, indexed [piece][square] with piece = color * 6 + type
+# and square = row * 8 + col (see chess/position.py). Each entry is material
+# plus position score, in centipawns, signed from white's point of view.
+# The tables above are drawn with white's back rank at the bottom, while row 0
+# of the board is white's back rank, so white reads them flipped vertically and
+# black reads them as drawn. MG_TABLES is used in the middlegame and EG_TABLES
+# in the endgame; only the king tables differ.
+MG_TABLES = [[0] * 64 for _ in range(12)]
+EG_TABLES = [[0] * 64 for _ in range(12)]
+
+
+def build_tables():
     """
-    Evaluates the current position on the board for both material and position.
-    
-    Positive score favors white, negative score favors black.
+    (Re)compute MG_TABLES and EG_TABLES from PIECE_VALUES and the position tables.
+
+    The lists are updated in place, so modules holding a reference to them see
+    the new values. Positions created earlier must call Position.refresh_scores().
     """
-    total_evaluation = 0
+    position_tables = [PAWN_POSITION_SCORES, KNIGHT_POSITION_SCORES, BISHOP_POSITION_SCORES,
+                       ROOK_POSITION_SCORES, QUEEN_POSITION_SCORES]
+    for piece_type, letter in enumerate('PNBRQK'):
+        if piece_type == 5:
+            middle, end = KING_MIDDLE_POSITION_SCORES, KING_ENDGAME_POSITION_SCORES
+        else:
+            middle = end = position_tables[piece_type]
+        material = PIECE_VALUES[letter]
+        for square in range(64):
+            row, col = square >> 3, square & 7
+            MG_TABLES[piece_type][square] = round((material + middle[7 - row][col]) * SCORE_UNITS)
+            EG_TABLES[piece_type][square] = round((material + end[7 - row][col]) * SCORE_UNITS)
+            MG_TABLES[6 + piece_type][square] = -round((material + middle[row][col]) * SCORE_UNITS)
+            EG_TABLES[6 + piece_type][square] = -round((material + end[row][col]) * SCORE_UNITS)
 
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece is not None:
-                piece_value = get_piece_value(piece, row, col, endgame)
-                if piece.color == 'white':
-                    total_evaluation += piece_value
-                else:
-                    total_evaluation -= piece_value
 
-    return total_evaluation
+build_tables()
+
 
+def current_tables():
+    """ A copy of PIECE_VALUES and the position tables, as a dict keyed by their names. """
+    tables = {'PIECE_VALUES': dict(PIECE_VALUES)}
+    for name in TABLE_NAMES:
+        tables[name] = [list(row) for row in globals()[name]]
+    return tables
 
-def get_piece_value(piece, row, col, endgame=False):
+
+def set_tables(tables):
     """
-    Returns the value of the piece, including its positional score.
+    Replace PIECE_VALUES and position tables with the ones in `tables` (a dict
+    as returned by current_tables; missing names are left alone) and rebuild
+    MG_TABLES and EG_TABLES. Positions created earlier must call
+    Position.refresh_scores().
     """
-    piece_type = piece.piece_type.upper()  # Use uppercase to represent all pieces
-    material_value = PIECE_VALUES.get(piece_type, 0)
-
-    # Positional value
-    if piece_type == 'P':
-        position_value = PAWN_POSITION_SCORES[row][col]
-    elif piece_type == 'N':
-        position_value = KNIGHT_POSITION_SCORES[row][col]
-    elif piece_type == 'B':
-        position_value = BISHOP_POSITION_SCORES[row][col]
-    elif piece_type == 'R':
-        position_value = ROOK_POSITION_SCORES[row][col]
-    elif piece_type == 'Q':
-        position_value = QUEEN_POSITION_SCORES[row][col]
-    elif piece_type == 'K':
-        if endgame:
-            position_value = KING_ENDGAME_POSITION_SCORES[row][col]
-        else:
-            position_value = KING_MIDDLE_POSITION_SCORES[row][col]
-    else:
-        position_value = 0  # Other pieces can be added here with their tables
+    if 'PIECE_VALUES' in tables:
+        PIECE_VALUES.update(tables['PIECE_VALUES'])
+    for name in TABLE_NAMES:
+        if name in tables:
+            table = globals()[name]
+            for row, values in zip(table, tables[name]):
+                row[:] = values
+    build_tables()
 
-    # Combine material and positional value
-    return material_value + position_value
+
+def read_tables(path):
+    """ The tables defined by a module written by chess/tune.py, as a dict for set_tables. """
+    module = runpy.run_path(path)
+    return {name: module[name] for name in ('PIECE_VALUES',) + TABLE_NAMES if name in module}
+
+
+def load_tables(path):
+    """ Use the evaluation tables of a module written by chess/tune.py (see set_tables). """
+    set_tables(read_tables(path))
+
+
+def taper(mg, eg, phase):
+    """ Blend middlegame and endgame centipawn scores by game phase, returning pawns. """
+    if phase > MAX_PHASE:
+        phase = MAX_PHASE
+    return (mg * phase + eg * (MAX_PHASE - phase)) / (MAX_PHASE * SCORE_UNITS)
+
+
+def evaluate_board(board):
+    """
+    Evaluates the current position on the board for material, position and pawn structure.
+
+    For a Position this is O(1): the material and position scores and the game
+    phase are kept up to date by make_move/unmake_move, and the pawn structure
+    score is usually found in the pawn hash table (see chess/pawns.py). A list
+    board is scanned.
+
+    Positive score favors white, negative score favors black.
+    """
+    if not isinstance(board, list):
+        pawns = board.pieces
+        pawn_mg, pawn_eg = PAWN_TABLE.probe(board.pawn_key, pawns[0], pawns[6])
+        return taper(board.mg_score + pawn_mg, board.eg_score + pawn_eg, board.phase)
+
+    mg = eg = phase = 0
+    pawns = [0, 0]
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece is not None:
+                piece_type = 'PNBRQK'.index(piece.piece_type.upper())
+                index = piece_type if piece.color == 'white' else 6 + piece_type
+                square = row * 8 + col
+                mg += MG_TABLES[index][square]
+                eg += EG_TABLES[index][square]
+                phase += PHASE_WEIGHTS[piece_type]
+                if piece_type == 0:
+                    pawns[index // 6] |= 1 << square
+
+    pawn_mg, pawn_eg = pawn_structure(pawns[0], pawns[1])
+    return taper(mg + pawn_mg, eg + pawn_eg, phase)
 
 
 # Example usage:
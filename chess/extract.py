@@ -0,0 +1,215 @@
+# chess/extract.py
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chess.pgn import read_file, split_file, iter_moves
+from chess.packed import pack_position, RECORD_SIZE, PACKED_EXTENSION
+from chess.move_generator import generate_capture_moves
+from chess.see import static_exchange_evaluation
+
+# Position extraction: replay the games of a PGN file and write the positions
+# that pass the filters, labelled with the game result, to a packed position
+# file (see chess/packed.py). Large files are split into byte ranges at game
+# boundaries and the ranges are replayed in parallel, each worker writing its
+# own part file; the parts are then joined in file order.
+
+# Game results as stored in packed records (white's view)
+RESULT_VALUES = {'1-0': 1, '0-1': -1, '1/2-1/2': 0}
+
+# Byte ranges per worker, so that a slow range does not hold up the others
+CHUNKS_PER_WORKER = 4
+
+
+class PositionFilter:
+    """
+    Which games and positions to extract.
+
+    Attributes:
+        min_elo (int): Both players rated at least this (WhiteElo/BlackElo tags);
+                       games without ratings are skipped when set.
+        min_ply (int): Skip positions before this ply (0 is the starting position).
+        max_ply (int): Skip positions after this ply.
+        quiet (bool): Only quiet positions, see is_quiet.
+        finished (bool): Skip games without a result.
+    """
+
+    def __init__(self, min_elo=None, min_ply=0, max_ply=None, quiet=False, finished=True):
+        self.min_elo = min_elo
+        self.min_ply = min_ply
+        self.max_ply = max_ply
+        self.quiet = quiet
+        self.finished = finished
+
+    def accepts_game(self, game):
+        if self.finished and game['result'] not in RESULT_VALUES:
+            return False
+        if self.min_elo is not None:
+            ratings = [_rating(game['headers'], tag) for tag in ('WhiteElo', 'BlackElo')]
+            if None in ratings or min(ratings) < self.min_elo:
+                return False
+        return True
+
+
+def _rating(headers, tag):
+    try:
+        return int(headers.get(tag, ''))
+    except ValueError:
+        return None
+
+
+def is_quiet(position, move):
+    """
+    True if a position is quiet: the side to move is not in check, the move
+    played from it is not a capture or promotion, and no capture wins
+    material by static exchange evaluation. The static evaluation of a quiet
+    position is a fair estimate of its value, which is what tuning sets need.
+    """
+    if position.in_check():
+        return False
+    from_square, to_square = move & 63, (move >> 6) & 63
+    en_passant = position.squares[from_square] % 6 == 0 and (to_square - from_square) % 8
+    if move >> 12 or position.squares[to_square] is not None or en_passant:
+        return False
+    return all(static_exchange_evaluation(position, capture) <= 0
+               for capture in generate_capture_moves(position, position.side))
+
+
+def extract_positions(games, position_filter=None, stats=None):
+    """
+    Replay games and yield the positions that pass the filter.
+
+    SAN moves are parsed against the move generator; a game with an illegal
+    or unreadable move contributes the positions before it.
+
+    Args:
+        games (iterable): Games as read by chess.pgn.read_games or read_file.
+        position_filter (PositionFilter): Defaults to every position of every finished game.
+        stats (dict): Optional counters, updated in place: games, skipped, errors, positions.
+
+    Yields:
+        tuple: (position, info) where info holds 'result' (1, 0, -1 or None),
+               'ply', 'move' (the move played from the position) and the game's
+               'headers'. The position is updated in place as the game is
+               replayed, so copy or pack it before the next one is yielded.
+    """
+    position_filter = position_filter or PositionFilter()
+    stats = stats if stats is not None else {}
+    for name in ('games', 'skipped', 'errors', 'positions'):
+        stats.setdefault(name, 0)
+    for game in games:
+        stats['games'] += 1
+        if not position_filter.accepts_game(game):
+            stats['skipped'] += 1
+            continue
+        result = RESULT_VALUES.get(game['result'])
+        try:
+            for ply, (position, move) in enumerate(iter_moves(game)):
+                if ply < position_filter.min_ply:
+                    continue
+                if position_filter.max_ply is not None and ply > position_filter.max_ply:
+                    break
+                if position_filter.quiet and not is_quiet(position, move):
+                    continue
+                stats['positions'] += 1
+                yield position, {'result': result, 'ply': ply, 'move': move, 'headers': game['headers']}
+        except ValueError:
+            stats['errors'] += 1
+
+
+def extract_range(path, start, end, output, position_filter=None):
+    """
+    Extract the positions of one byte range of a PGN file to a packed file.
+
+    Returns:
+        dict: The counters of extract_positions.
+    """
+    stats = {}
+    with open(output, 'wb') as out:
+        for position, info in extract_positions(read_file(path, start, end), position_filter, stats):
+            out.write(pack_position(position, info['result']))
+    return stats
+
+
+def extract_file(path, output, position_filter=None, workers=None, progress=None):
+    """
+    Extract the positions of a PGN file to a packed position file, in parallel.
+
+    Args:
+        path (str): The PGN file.
+        output (str): The packed position file to write.
+        position_filter (PositionFilter): Which positions to keep.
+        workers (int): Worker processes (default: one per CPU); 1 runs in this process.
+        progress (callable): Called with the running totals after each byte range.
+
+    Returns:
+        dict: Totals of the counters of extract_positions.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = split_file(path, workers * CHUNKS_PER_WORKER if workers > 1 else 1)
+    parts = [f"{output}.part{index}" for index in range(len(ranges))]
+    totals = {'games': 0, 'skipped': 0, 'errors': 0, 'positions': 0}
+
+    def add(stats):
+        for name, value in stats.items():
+            totals[name] += value
+        if progress is not None:
+            progress(totals)
+
+    try:
+        if workers == 1:
+            for (start, end), part in zip(ranges, parts):
+                add(extract_range(path, start, end, part, position_filter))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(extract_range, path, start, end, part, position_filter)
+                           for (start, end), part in zip(ranges, parts)]
+                for future in futures:
+                    add(future.result())
+        # Join the parts in file order, so the output does not depend on the worker count
+        with open(output, 'wb') as out:
+            for part in parts:
+                with open(part, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, out)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract positions from a PGN file into a packed position file.")
+    parser.add_argument("pgn", help="PGN file to read")
+    parser.add_argument("output", help=f"packed position file to write (32 bytes per position, "
+                                       f"conventionally named *{PACKED_EXTENSION})")
+    parser.add_argument("--min-elo", type=int, help="both players rated at least this")
+    parser.add_argument("--min-ply", type=int, default=0, help="skip positions before this ply")
+    parser.add_argument("--max-ply", type=int, help="skip positions after this ply")
+    parser.add_argument("--quiet", action="store_true", help="quiet positions only (no check, capture or winning exchange)")
+    parser.add_argument("--unfinished", action="store_true", help="also extract games without a result")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    position_filter = PositionFilter(args.min_elo, args.min_ply, args.max_ply, args.quiet, not args.unfinished)
+    start = time.perf_counter()
+
+    def report(totals):
+        print(f"\r{totals['games']} games, {totals['positions']} positions, "
+              f"{time.perf_counter() - start:.1f}s", end='', flush=True)
+
+    totals = extract_file(args.pgn, args.output, position_filter, args.workers, report)
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"{totals['games']} games ({totals['skipped']} filtered out, {totals['errors']} with illegal moves), "
+          f"{totals['positions']} positions written to {args.output} "
+          f"({totals['positions'] * RECORD_SIZE} bytes) in {elapsed:.1f}s, "
+          f"{totals['games'] / elapsed if elapsed else 0:.0f} games/s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,402 @@
+# chess/match.py
+
+import argparse
+import datetime
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chess import evaluation
+from chess.bitboard import KNIGHT, BISHOP, popcount
+from chess.position import Position, STARTING_FEN
+from chess.move_generator import generate_position_moves
+from chess.notation import move_to_san
+from chess.pgn import read_games, iter_moves, write_game
+from chess.epd import parse_epd
+from chess.search import iterative_deepening
+from chess.transposition import TranspositionTable
+
+# A match plays every opening twice, once with each engine as white, so that
+# an unbalanced opening favours neither side. Games are played by a pool of
+# worker processes, one game per task; results arrive as games finish, which
+# lets SPRT stop the match as soon as the evidence is conclusive.
+
+# Games still going after this many plies are adjudicated as draws
+MAX_PLIES = 400
+
+# Hash table size of each engine in a game
+ENGINE_HASH_MB = 8
+
+# Evaluation parameters an engine configuration may override (material values
+# in pawns, see chess/evaluation.py)
+EVALUATION_PARAMETERS = tuple(evaluation.PIECE_VALUES)
+DEFAULT_TABLES = evaluation.current_tables()
+
+# Table modules (see chess/tune.py) read by this process, by path
+_table_modules = {}
+
+LIGHT_SQUARES = 0x55AA55AA55AA55AA
+
+# Default SPRT error rates
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+
+
+def parse_engine(text):
+    """
+    Parse an engine configuration such as 'name=new,depth=4,movetime=200,N=3.25'.
+
+    Keys are name, depth, movetime (ms per move), nodes (per move), tables (an
+    evaluation table module written by chess/tune.py) and the piece letters of
+    EVALUATION_PARAMETERS (material value in pawns, applied on top of the tables).
+
+    Returns:
+        dict: The configuration; at least one search limit is required.
+    """
+    config = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        key, separator, value = item.partition('=')
+        key = key.strip()
+        if not separator:
+            raise ValueError(f"Expected key=value in engine configuration: {item!r}")
+        if key in ('name', 'tables'):
+            config[key] = value.strip()
+        elif key in ('depth', 'movetime', 'nodes'):
+            config[key] = int(value)
+        elif key.upper() in EVALUATION_PARAMETERS:
+            config.setdefault('piece_values', {})[key.upper()] = float(value)
+        else:
+            raise ValueError(f"Unknown engine configuration key {key!r}")
+    if not any(key in config for key in ('depth', 'movetime', 'nodes')):
+        raise ValueError(f"Engine configuration needs a depth, movetime or nodes limit: {text!r}")
+    config.setdefault('name', text)
+    return config
+
+
+def read_openings(path):
+    """
+    Read opening positions as FEN strings.
+
+    A .pgn file gives the position at the end of each game. Any other file
+    holds one FEN or EPD record per line; blank and '#' lines are skipped.
+    """
+    openings = []
+    if path.endswith('.pgn'):
+        with open(path) as pgn_file:
+            for game in read_games(pgn_file):
+                position = None
+                for position, move in iter_moves(game):
+                    pass
+                if position is None:
+                    openings.append(game['headers'].get('FEN', STARTING_FEN))
+                else:
+                    position.make_move(move)
+                    openings.append(position.to_fen())
+        return openings
+    with open(path) as opening_file:
+        for line in opening_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                openings.append(' '.join(fields[:6]))
+            else:
+                openings.append(parse_epd(line)[0])
+    return openings
+
+
+def is_repetition(position, count=3):
+    """
+    True if the current position has occurred `count` times. Only positions
+    since the last capture or pawn move can repeat.
+    """
+    history = position.history
+    seen = 1
+    # Undo records hold the key of the position before each move; the same
+    # side is to move every second ply
+    for back in range(2, min(position.halfmove_clock, len(history)) + 1, 2):
+        if history[-back][6] == position.key:
+            seen += 1
+            if seen >= count:
+                return True
+    return False
+
+
+def insufficient_material(position):
+    """
+    True if neither side can possibly mate: bare kings, a single minor piece,
+    or bishops only, all on squares of the same color.
+    """
+    pieces = position.pieces
+    for color in (0, 1):
+        base = color * 6
+        if pieces[base] or pieces[base + 3] or pieces[base + 4]:
+            return False  # Pawns, rooks or queens
+    knights = pieces[KNIGHT] | pieces[6 + KNIGHT]
+    bishops = pieces[BISHOP] | pieces[6 + BISHOP]
+    minors = popcount(knights | bishops)
+    if minors <= 1:
+        return True
+    return not knights and (bishops & LIGHT_SQUARES == 0 or bishops & ~LIGHT_SQUARES == 0)
+
+
+def game_result(position, legal_moves):
+    """
+    Result of the game in `position`, if it is over.
+
+    Returns:
+        tuple: (result, termination) such as ('1-0', 'checkmate') or
+               ('1/2-1/2', 'fifty-move rule'), or None while the game goes on.
+    """
+    if not legal_moves:
+        if position.in_check():
+            return ('0-1' if position.side == 0 else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if position.halfmove_clock >= 100:
+        return '1/2-1/2', 'fifty-move rule'
+    if insufficient_material(position):
+        return '1/2-1/2', 'insufficient material'
+    if is_repetition(position):
+        return '1/2-1/2', 'threefold repetition'
+    return None
+
+
+def _use_evaluation(config, position):
+    """ Switch the evaluation tables to the table module and piece values of an engine configuration. """
+    path = config.get('tables')
+    if path is None:
+        tables = DEFAULT_TABLES
+    else:
+        if path not in _table_modules:
+            _table_modules[path] = dict(DEFAULT_TABLES, **evaluation.read_tables(path))
+        tables = _table_modules[path]
+    tables = dict(tables, PIECE_VALUES=dict(tables['PIECE_VALUES'], **config.get('piece_values', {})))
+    if tables != evaluation.current_tables():
+        evaluation.set_tables(tables)
+    # The running scores were summed with the other engine's tables
+    position.refresh_scores()
+
+
+def play_game(fen, white, black, max_plies=MAX_PLIES):
+    """
+    Play one game between two engine configurations.
+
+    Each engine keeps its own transposition table for the whole game, and the
+    evaluation tables are switched to its parameters before it moves.
+
+    Args:
+        fen (str): Starting position.
+        white (dict): Configuration of the engine playing white (see parse_engine).
+        black (dict): Configuration of the engine playing black.
+        max_plies (int): Adjudicate a draw after this many plies.
+
+    Returns:
+        dict: fen, white and black names, moves (SAN), result, termination,
+              plies and the average search depth of each side.
+    """
+    position = Position.from_fen(fen)
+    engines = (white, black)
+    tables = (TranspositionTable(ENGINE_HASH_MB), TranspositionTable(ENGINE_HASH_MB))
+    depths = ([], [])
+    moves = []
+    outcome = None
+    while outcome is None:
+        legal_moves = generate_position_moves(position, position.side)
+        outcome = game_result(position, legal_moves)
+        if outcome is not None:
+            break
+        if len(moves) >= max_plies:
+            outcome = '1/2-1/2', 'adjudication'
+            break
+        side = position.side
+        config = engines[side]
+        _use_evaluation(config, position)
+        result = iterative_deepening(position, config.get('depth'), tables[side], config.get('movetime'),
+                                     config.get('nodes'))
+        move = result.best_move if result.best_move is not None else legal_moves[0]
+        depths[side].append(result.depth)
+        moves.append(move_to_san(position, move, legal_moves))
+        position.make_move(move)
+
+    result, termination = outcome
+    return {
+        'fen': fen,
+        'white': white['name'],
+        'black': black['name'],
+        'moves': moves,
+        'result': result,
+        'termination': termination,
+        'plies': len(moves),
+        'white_depth': sum(depths[0]) / len(depths[0]) if depths[0] else 0.0,
+        'black_depth': sum(depths[1]) / len(depths[1]) if depths[1] else 0.0,
+    }
+
+
+def run_match(engine_a, engine_b, openings, games, workers=None, max_plies=MAX_PLIES):
+    """
+    Play a match of `games` games over a pool of worker processes.
+
+    Openings are used in order (wrapping around), each for a pair of games
+    with colors reversed: engine_a has white in even rounds.
+
+    Yields:
+        dict: The result of each game (see play_game) with its 'round' number,
+              in the order the games finish. Closing the generator early
+              cancels the games not yet started.
+    """
+    if not openings:
+        raise ValueError("run_match needs at least one opening")
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for game in range(games):
+            fen = openings[(game // 2) % len(openings)]
+            white, black = (engine_a, engine_b) if game % 2 == 0 else (engine_b, engine_a)
+            futures[pool.submit(play_game, fen, white, black, max_plies)] = game + 1
+        for future in as_completed(futures):
+            result = future.result()
+            result['round'] = futures[future]
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def score_of(result, name):
+    """ Score of engine `name` in one game: 1, 0.5 or 0. """
+    if result['result'] == '1/2-1/2':
+        return 0.5
+    white_won = result['result'] == '1-0'
+    return 1.0 if white_won == (result['white'] == name) else 0.0
+
+
+def elo_from_score(score):
+    """ Elo difference corresponding to an expected score between 0 and 1. """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def expected_score(elo):
+    """ Expected score of a player `elo` points stronger than the opponent. """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_estimate(wins, draws, losses):
+    """
+    Elo difference with a 95% confidence interval from game results.
+
+    The per-game scores (1, 0.5, 0) give a mean and standard error; the
+    interval on the score is converted to Elo.
+
+    Returns:
+        tuple: (elo, error margin), or (0.0, inf) before any games.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = elo_from_score(score - margin), elo_from_score(score + margin)
+    return elo_from_score(score), (high - low) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of H1 (elo = elo1) against H0 (elo = elo0).
+
+    Uses the normal approximation of the generalized SPRT on the per-game
+    score, which is accurate for the match sizes it is used with.
+    """
+    games = wins + draws + losses
+    if not games or not wins + draws or not losses + draws:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha=SPRT_ALPHA, beta=SPRT_BETA):
+    """ (lower, upper) LLR bounds: below lower accept H0, above upper accept H1. """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a match between two engine configurations and report Elo.")
+    parser.add_argument("engine", nargs=2, help="engine configurations, e.g. 'name=new,depth=3,N=3.2' "
+                                                "(the first is the one being tested)")
+    parser.add_argument("--openings", help="FEN/EPD or PGN file of opening positions (default: the start position)")
+    parser.add_argument("--games", type=int, default=100, help="number of games (default: 100)")
+    parser.add_argument("--workers", type=int, help="number of processes (default: one per CPU)")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument("--pgn", help="write the games to this PGN file")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+                        help="stop early when SPRT accepts elo0 or elo1")
+    parser.add_argument("--alpha", type=float, default=SPRT_ALPHA, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=SPRT_BETA, help="SPRT false negative rate")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    engine_a, engine_b = (parse_engine(text) for text in args.engine)
+    if engine_a['name'] == engine_b['name']:
+        engine_b['name'] += '-2'
+    openings = read_openings(args.openings) if args.openings else [STARTING_FEN]
+    lower, upper = sprt_bounds(args.alpha, args.beta)
+
+    pgn_file = open(args.pgn, 'w') if args.pgn else None
+    date = datetime.date.today().strftime('%Y.%m.%d')
+    wins = draws = losses = 0
+    verdict = None
+    start = time.perf_counter()
+    games = run_match(engine_a, engine_b, openings, args.games, args.workers, args.max_plies)
+    try:
+        for result in games:
+            score = score_of(result, engine_a['name'])
+            wins += score == 1.0
+            draws += score == 0.5
+            losses += score == 0.0
+            if pgn_file is not None:
+                headers = {'Event': f"{engine_a['name']} vs {engine_b['name']}", 'Site': 'BarebonesChess match',
+                           'Date': date, 'Round': result['round'], 'White': result['white'],
+                           'Black': result['black'], 'Termination': result['termination'],
+                           'PlyCount': result['plies']}
+                if result['fen'] != STARTING_FEN:
+                    headers.update(SetUp='1', FEN=result['fen'])
+                write_game(pgn_file, headers, result['moves'], result['result'])
+                pgn_file.flush()
+            if not args.quiet:
+                elo, margin = elo_estimate(wins, draws, losses)
+                print(f"round {result['round']:>4}  {result['white']} - {result['black']}  {result['result']:<7} "
+                      f"{result['termination']:<21} +{wins} ={draws} -{losses}  elo {elo:+.1f} +/- {margin:.1f}")
+            if args.sprt:
+                llr = sprt_llr(wins, draws, losses, *args.sprt)
+                if llr >= upper or llr <= lower:
+                    verdict = 'H1' if llr >= upper else 'H0'
+                    break
+    finally:
+        games.close()
+        if pgn_file is not None:
+            pgn_file.close()
+
+    played = wins + draws + losses
+    elo, margin = elo_estimate(wins, draws, losses)
+    print(f"{engine_a['name']} vs {engine_b['name']}: {played} games, +{wins} ={draws} -{losses}, "
+          f"score {(wins + draws / 2) / played if played else 0:.3f}")
+    print(f"elo {elo:+.1f} +/- {margin:.1f} (95%)  time {time.perf_counter() - start:.0f}s")
+    if args.sprt:
+        llr = sprt_llr(wins, draws, losses, *args.sprt)
+        status = {'H1': f"accepted H1 (elo >= {args.sprt[1]:g})", 'H0': f"accepted H0 (elo <= {args.sprt[0]:g})",
+                  None: "inconclusive"}[verdict]
+        print(f"SPRT [{args.sprt[0]:g}, {args.sprt[1]:g}]: LLR {llr:.2f} bounds [{lower:.2f}, {upper:.2f}] {status}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
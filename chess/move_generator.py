@@ -1,19 +1,34 @@
+from chess.bitboard import (
+    WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, FULL_BOARD, ROW_MASKS,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, LINE,
+    ROOK_MASKS, ROOK_TABLES, BISHOP_MASKS, BISHOP_TABLES, color_index,
+)
+from chess.position import (
+    Position, move_to_tuple,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+)
+
+
 def is_on_board(x, y):
     """ Check if the coordinates are within the bounds of the chessboard. """
     return 0 <= x < 8 and 0 <= y < 8
 
 
+# The per-piece generators below work on the list board and produce
+# pseudo-legal moves: they do not check whether the king is left in check.
+# generate_legal_moves uses the bitboard generator further down instead.
+
 def generate_pawn_moves(board, x, y):
     """ Generate legal moves for a pawn. """
     piece = board[x][y]
     moves = []
-    direction = 1 if piece.color == 'white' else -1  # White moves up (-1), black moves down (+1)
+    direction = 1 if piece.color == 'white' else -1  # White moves down the rows (+1), black moves up (-1)
     
     # Forward movement
     if is_on_board(x + direction, y) and board[x + direction][y] is None:
         moves.append((x + direction, y))
-        # Double move on the first turn
-        if (piece.color == 'white' and x == 6) or (piece.color == 'black' and x == 1):
+        # Double move from the starting row (row 1 for white, row 6 for black)
+        if (piece.color == 'white' and x == 1) or (piece.color == 'black' and x == 6):
             if board[x + 2 * direction][y] is None:
                 moves.append((x + 2 * direction, y))
     
@@ -105,45 +120,271 @@ def generate_king_moves(board, x, y):
     
     return moves
 
+def generate_capture_moves(board, color):
+    """ Generates only the legal captures and promotions for a Position. """
+    return generate_position_moves(board, color, captures_only=True)
+
+
 def generate_legal_moves(board, color):
     """
     Generates all legal moves for the given color (either 'white' or 'black').
 
     Args:
-        board (list): The current state of the chessboard.
+        board (list or Position): The current state of the chessboard.
         color (str): The player's color ('white' or 'black').
 
     Returns:
         list of tuples: Each move is represented as a tuple (start_pos, end_pos),
                         where start_pos and end_pos are (row, col) positions.
+                        When `board` is a Position the moves are ints instead
+                        (see chess/position.py), which also carry the promotion
+                        piece.
     """
+    if isinstance(board, Position):
+        return generate_position_moves(board, color)
+
+    # A list board has no move history: castling rights are inferred from the
+    # king and rook squares and en passant is not available.
+    position = Position.from_board(board, color)
     legal_moves = []
+    for move in generate_position_moves(position, color):
+        move = move_to_tuple(move)
+        if move not in legal_moves:  # The four promotions map to one tuple
+            legal_moves.append(move)
+    return legal_moves
 
-    for x in range(8):
-        for y in range(8):
-            piece = board[x][y]
-            if piece is None or piece.color != color:
-                continue  # Skip empty squares or pieces of the opposite color
-
-            # Generate moves based on the type of piece
-            if piece.piece_type == 'P':  # Pawn
-                moves = generate_pawn_moves(board, x, y)
-            elif piece.piece_type == 'N':  # Knight
-                moves = generate_knight_moves(board, x, y)
-            elif piece.piece_type == 'B':  # Bishop
-                moves = generate_bishop_moves(board, x, y)
-            elif piece.piece_type == 'R':  # Rook
-                moves = generate_rook_moves(board, x, y)
-            elif piece.piece_type == 'Q':  # Queen
-                moves = generate_queen_moves(board, x, y)
-            elif piece.piece_type == 'K':  # King
-                moves = generate_king_moves(board, x, y)
-            else:
-                moves = []  # No moves if the piece is unrecognized
 
-            # Convert piece-specific moves to the format (start_pos, end_pos)
-            start_pos = (x, y)
-            for end_pos in moves:
-                legal_moves.append((start_pos, end_pos))
+PROMOTION_TYPES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# (right, king from, king to, squares that must be empty, squares that must not be attacked)
+CASTLING_MOVES = [
+    [(WHITE_KINGSIDE, 4, 6, 0x60, (5, 6)),
+     (WHITE_QUEENSIDE, 4, 2, 0x0E, (3, 2))],
+    [(BLACK_KINGSIDE, 60, 62, 0x60 << 56, (61, 62)),
+     (BLACK_QUEENSIDE, 60, 58, 0x0E << 56, (59, 58))],
+]
+
+
+# Kinds of moves generate_moves_of_kind can produce. Promotions count as
+# captures, so QUIETS are the moves that change no material.
+CAPTURES = 1
+QUIETS = 2
+ALL_MOVES = CAPTURES | QUIETS
+
+
+def generate_position_moves(position, color, captures_only=False):
+    """
+    Generates the legal moves for a bitboard Position.
+
+    The pieces giving check and the pinned pieces are computed once up front.
+    Under double check only the king moves; under single check the other
+    pieces must capture the checker or block; a pinned piece stays on the line
+    through its king and pinner; and the king never steps onto an attacked
+    square. Only en passant, where two pieces leave the same row, is verified
+    by looking at the position after the capture.
+
+    Args:
+        position (Position): The position to generate moves for.
+        color (str or int): The player's color ('white'/'black' or WHITE/BLACK).
+        captures_only (bool): Only generate captures and promotions, as needed
+                              by the quiescence search.
+
+    Returns:
+        list of int: Moves encoded as in chess/position.py.
+    """
+    context = move_context(position, color)
+    return generate_moves_of_kind(position, context, CAPTURES if captures_only else ALL_MOVES)
+
+
+def move_context(position, color):
+    """
+    The checks and pins that constrain the moves of `color`.
+
+    Computed once per position, so that the captures and the quiet moves can be
+    generated separately (see generate_moves_of_kind) without repeating it.
 
-    return legal_moves
\ No newline at end of file
+    Returns:
+        tuple: (color, king square, checkers, check mask, pinned, pin lines),
+               or None when `color` has no king.
+    """
+    color = color_index(color)
+    them = color ^ 1
+    pieces = position.pieces
+    king = pieces[color * 6 + KING]
+    if not king:
+        return None
+    king_square = king.bit_length() - 1
+    checkers = position.attackers_to(king_square, them)
+    if checkers and not checkers & (checkers - 1):
+        check_mask = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+    else:
+        check_mask = FULL_BOARD
+
+    # Pinned pieces: an enemy slider on a line with our king, with exactly one
+    # of our pieces between them
+    own = position.occupancy[color]
+    occupied = position.occupancy[2]
+    pinned = 0
+    pin_lines = {}
+    their_queens = pieces[them * 6 + QUEEN]
+    snipers = ((ROOK_TABLES[king_square][0] & (pieces[them * 6 + ROOK] | their_queens))
+               | (BISHOP_TABLES[king_square][0] & (pieces[them * 6 + BISHOP] | their_queens)))
+    while snipers:
+        bit = snipers & -snipers
+        snipers ^= bit
+        sniper_square = bit.bit_length() - 1
+        blockers = BETWEEN[king_square][sniper_square] & occupied
+        if blockers and not blockers & (blockers - 1) and blockers & own:
+            pinned |= blockers
+            pin_lines[blockers.bit_length() - 1] = LINE[king_square][sniper_square]
+    return color, king_square, checkers, check_mask, pinned, pin_lines
+
+
+def generate_moves_of_kind(position, context, kind=ALL_MOVES, from_mask=FULL_BOARD):
+    """
+    Generates the legal moves of one kind, optionally only from some squares.
+
+    Args:
+        position (Position): The position to generate moves for.
+        context (tuple): move_context(position, color).
+        kind (int): CAPTURES (captures and promotions), QUIETS or ALL_MOVES.
+        from_mask (int): Bitboard of the squares whose pieces may move; used to
+                         check a single move (e.g. from the transposition
+                         table) without generating the rest.
+
+    Returns:
+        list of int: Moves encoded as in chess/position.py.
+    """
+    moves = []
+    if context is None:
+        return moves
+    color, king_square, checkers, check_mask, pinned, pin_lines = context
+    them = color ^ 1
+    pieces = position.pieces
+    occupied = position.occupancy[2]
+    enemy = position.occupancy[them]
+    empty = ~occupied & FULL_BOARD
+    base = color * 6
+    append = moves.append
+    targets = (enemy if kind & CAPTURES else 0) | (empty if kind & QUIETS else 0)
+
+    # King moves: the king itself is taken off the board so that it cannot
+    # hide from a slider behind its own square
+    king = 1 << king_square
+    if king & from_mask:
+        king_targets = KING_ATTACKS[king_square] & targets
+        without_king = occupied ^ king
+        while king_targets:
+            bit = king_targets & -king_targets
+            king_targets ^= bit
+            to_square = bit.bit_length() - 1
+            if not position.attackers_to(to_square, them, without_king):
+                append(king_square | (to_square << 6))
+
+    if checkers & (checkers - 1):
+        return moves  # Double check: only the king can move
+
+    # Castling: not out of, through or into check
+    if position.castling and not checkers and kind & QUIETS and king & from_mask:
+        for right, king_from, king_to, empty_squares, safe in CASTLING_MOVES[color]:
+            if (position.castling & right and king_square == king_from and not occupied & empty_squares
+                    and not position.attackers_to(safe[0], them)
+                    and not position.attackers_to(safe[1], them)):
+                append(king_from | (king_to << 6))
+
+    targets &= check_mask
+
+    # Pawns: single and double pushes, captures, promotions, en passant
+    pawns = pieces[base + PAWN] & from_mask
+    if color == WHITE:
+        single = (pawns << 8) & empty
+        double = ((single & ROW_MASKS[2]) << 8) & empty
+        push, promotion_row = 8, ROW_MASKS[7]
+    else:
+        single = (pawns >> 8) & empty
+        double = ((single & ROW_MASKS[5]) >> 8) & empty
+        push, promotion_row = -8, ROW_MASKS[0]
+    if not kind & QUIETS:
+        single &= promotion_row
+        double = 0
+    elif not kind & CAPTURES:
+        single &= ~promotion_row
+    single &= check_mask
+    double &= check_mask
+    while single:
+        low = single & -single
+        to_square = low.bit_length() - 1
+        single ^= low
+        from_square = to_square - push
+        if (1 << from_square) & pinned and not low & pin_lines[from_square]:
+            continue
+        if low & promotion_row:
+            for promotion in PROMOTION_TYPES:
+                append(from_square | (to_square << 6) | (promotion << 12))
+        else:
+            append(from_square | (to_square << 6))
+    while double:
+        low = double & -double
+        to_square = low.bit_length() - 1
+        double ^= low
+        from_square = to_square - 2 * push
+        if (1 << from_square) & pinned and not low & pin_lines[from_square]:
+            continue
+        append(from_square | (to_square << 6))
+
+    if kind & CAPTURES:
+        pawn_attacks = PAWN_ATTACKS[color]
+        capture_targets = enemy & check_mask
+        ep_square = position.ep_square
+        bb = pawns
+        while bb:
+            low = bb & -bb
+            from_square = low.bit_length() - 1
+            bb ^= low
+            attacks = pawn_attacks[from_square] & capture_targets
+            if low & pinned:
+                attacks &= pin_lines[from_square]
+            while attacks:
+                bit = attacks & -attacks
+                to_square = bit.bit_length() - 1
+                attacks ^= bit
+                if bit & promotion_row:
+                    for promotion in PROMOTION_TYPES:
+                        append(from_square | (to_square << 6) | (promotion << 12))
+                else:
+                    append(from_square | (to_square << 6))
+            if ep_square is not None and pawn_attacks[from_square] & (1 << ep_square):
+                # Check the position after the capture: this catches the pinned
+                # pawn, the captured checker and the two pawns leaving one row
+                captured_square = ep_square - push
+                after = (occupied ^ low ^ (1 << captured_square)) | (1 << ep_square)
+                if not position.attackers_to(king_square, them, after) & after:
+                    append(from_square | (ep_square << 6))
+
+    # Pieces: look up attack sets, mask off own pieces and apply check and pin masks
+    for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+        bb = pieces[base + piece_type] & from_mask
+        while bb:
+            low = bb & -bb
+            from_square = low.bit_length() - 1
+            bb ^= low
+            if piece_type == KNIGHT:
+                if low & pinned:
+                    continue  # A pinned knight can never move
+                attacks = KNIGHT_ATTACKS[from_square]
+            elif piece_type == BISHOP:
+                attacks = BISHOP_TABLES[from_square][occupied & BISHOP_MASKS[from_square]]
+            elif piece_type == ROOK:
+                attacks = ROOK_TABLES[from_square][occupied & ROOK_MASKS[from_square]]
+            else:
+                attacks = (ROOK_TABLES[from_square][occupied & ROOK_MASKS[from_square]]
+                           | BISHOP_TABLES[from_square][occupied & BISHOP_MASKS[from_square]])
+            attacks &= targets
+            if low & pinned:
+                attacks &= pin_lines[from_square]
+            while attacks:
+                bit = attacks & -attacks
+                attacks ^= bit
+                append(from_square | ((bit.bit_length() - 1) << 6))
+
+    return moves
@@ -0,0 +1,410 @@
+# chess/nnue.py
+
+import argparse
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the network evaluation
+    np = None
+
+from chess.bitboard import WHITE, BLACK, PAWN, ROOK, KING
+from chess.evaluation import evaluate_board, PIECE_VALUES
+
+# An efficiently updatable neural network (NNUE) evaluation.
+#
+# Inputs are HalfKP features: for each side ("perspective") and each piece
+# other than the two kings, the triple (own king square, piece kind, piece
+# square), with squares mirrored vertically for black so that both sides see
+# the board from their own back rank. The first layer is a sum of weight
+# columns, one per active feature, kept per perspective in an accumulator.
+# A move changes at most three features (two for a quiet move), so the
+# accumulator of a child position is its parent's plus and minus a few
+# columns; only a move of a side's own king, which changes every one of its
+# features, needs a full refresh.
+#
+#   accumulators  2 x HIDDEN int16, side to move first, clipped to [0, QA]
+#   layer 2       2 HIDDEN -> L2, int8 weights (scale QB), clipped to [0, QA]
+#   layer 3       L2 -> L3, int8 weights (scale QB), clipped to [0, QA]
+#   output        L3 -> 1, int16 weights; the score in pawns is out / (QA * QB)
+
+PIECE_KINDS = 10  # Pawn to queen, own and enemy
+FEATURES_PER_KING = PIECE_KINDS * 64
+INPUT_SIZE = 64 * FEATURES_PER_KING
+
+DEFAULT_HIDDEN = 128
+DEFAULT_L2 = 32
+DEFAULT_L3 = 32
+
+# Quantization: activations are clipped to [0, QA], dense layer weights are
+# scaled by QB = 2 ** WEIGHT_SHIFT
+QA = 127
+WEIGHT_SHIFT = 6
+QB = 1 << WEIGHT_SHIFT
+
+# Units per piece in the material counting units of Network.random
+MATERIAL_SCALE = 8
+
+# Weight file: header (magic, version, hidden, l2, l3), then w1, b1, w2, b2,
+# w3, b3, w4, b4 as little-endian arrays in row-major order
+MAGIC = b'BBNN'
+VERSION = 1
+HEADER_FORMAT = '<4sIHHH'
+
+# An accumulator is rebuilt from the parent position's accumulator when one
+# of the last MAX_LOOKBACK positions has it, and refreshed from scratch otherwise
+MAX_LOOKBACK = 16
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The NNUE evaluation requires numpy (pip install numpy)")
+
+
+def _clipped(values):
+    """ Clip to [0, QA] in place (much faster than np.clip on small arrays). """
+    np.maximum(values, 0, out=values)
+    return np.minimum(values, QA, out=values)
+
+
+# FEATURE_OFFSETS[perspective][piece][square]: feature index less the king's
+# offset, for pieces other than kings
+FEATURE_OFFSETS = [[[((piece % 6) * 2 + (piece // 6 != perspective)) * 64 + (square ^ (56 * perspective))
+                     for square in range(64)] for piece in range(12)] for perspective in (WHITE, BLACK)]
+
+
+def king_offset(perspective, king_square):
+    """ Offset of the features seen from a king on `king_square`. """
+    return (king_square ^ (56 * perspective)) * FEATURES_PER_KING
+
+
+def active_features(position, perspective):
+    """ HalfKP feature indexes of a position seen by `perspective`. """
+    offset = king_offset(perspective, position.king_square(perspective))
+    offsets = FEATURE_OFFSETS[perspective]
+    return [offset + offsets[piece][square]
+            for square, piece in enumerate(position.squares) if piece is not None and piece % 6 != KING]
+
+
+class Network:
+    """
+    Quantized network weights.
+
+    Attributes:
+        w1 (numpy.ndarray): (INPUT_SIZE, hidden) int16 feature columns.
+        b1 (numpy.ndarray): (hidden,) int16 accumulator bias.
+        w2, w3 (numpy.ndarray): Dense layer weights, stored as int8 and held
+                                as int32 for the products.
+        w4 (numpy.ndarray): Output weights, stored as int16.
+        b2, b3, b4: int32 biases, in units of 1 / (QA * QB).
+    """
+
+    def __init__(self, w1, b1, w2, b2, w3, b3, w4, b4):
+        _require_numpy()
+        self.hidden = w1.shape[1]
+        self.l2 = w2.shape[1]
+        self.l3 = w3.shape[1]
+        self.w1 = np.ascontiguousarray(w1, dtype=np.int16)
+        self.b1 = np.asarray(b1, dtype=np.int16)
+        self.w2 = np.asarray(w2, dtype=np.int32)
+        self.b2 = np.asarray(b2, dtype=np.int32)
+        self.w3 = np.asarray(w3, dtype=np.int32)
+        self.b3 = np.asarray(b3, dtype=np.int32)
+        self.w4 = np.asarray(w4, dtype=np.int32)
+        self.b4 = int(b4)
+
+    @classmethod
+    def random(cls, hidden=DEFAULT_HIDDEN, l2=DEFAULT_L2, l3=DEFAULT_L3, seed=0):
+        """
+        An untrained network for benchmarks and tests: random weights on top of
+        a material count. The first PIECE_KINDS units of each layer count the
+        pieces of each kind (MATERIAL_SCALE per piece) and pass the counts on,
+        and the output weighs them with PIECE_VALUES, so that the network
+        scores material plus a little noise. Scores that do not follow the
+        material make the quiescence search explode.
+        """
+        _require_numpy()
+        if min(hidden, l2, l3) < PIECE_KINDS:
+            raise ValueError(f"Every layer needs at least {PIECE_KINDS} units")
+        rng = np.random.default_rng(seed)
+        w1 = rng.integers(-16, 17, (INPUT_SIZE, hidden))
+        b1 = rng.integers(0, 64, hidden)
+        w2 = rng.integers(-16, 17, (2 * hidden, l2))
+        b2 = rng.integers(-QA * QB, QA * QB, l2)
+        w3 = rng.integers(-32, 33, (l2, l3))
+        b3 = rng.integers(-QA * QB, QA * QB, l3)
+        w4 = rng.integers(-4, 5, l3)
+        material = range(PIECE_KINDS)
+        w1[:, :PIECE_KINDS] = 0
+        b1[:PIECE_KINDS] = 0
+        features = w1.reshape(64, PIECE_KINDS, 64, hidden)
+        for kind in material:
+            features[:, kind, :, kind] = MATERIAL_SCALE
+        for weights, bias in ((w2, b2), (w3, b3)):
+            weights[:PIECE_KINDS, :] = 0
+            weights[:, :PIECE_KINDS] = 0
+            weights[material, material] = QB
+            bias[:PIECE_KINDS] = 0
+        # Kind = piece type * 2, plus one for the other side's pieces
+        for kind in material:
+            value = PIECE_VALUES['PNBRQ'[kind // 2]] * QA * QB // MATERIAL_SCALE
+            w4[kind] = -value if kind % 2 else value
+        return cls(w1, b1, w2, b2, w3, b3, w4, 0)
+
+    @classmethod
+    def load(cls, path):
+        """ Read a weight file written by save. """
+        _require_numpy()
+        with open(path, 'rb') as weight_file:
+            data = weight_file.read()
+        magic, version, hidden, l2, l3 = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} network file")
+        offset = struct.calcsize(HEADER_FORMAT)
+        arrays = []
+        for dtype, shape in cls._layout(hidden, l2, l3):
+            count = int(np.prod(shape))
+            arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape))
+            offset += count * np.dtype(dtype).itemsize
+        if offset != len(data):
+            raise ValueError(f"{path} has {len(data) - offset} unexpected bytes")
+        arrays[-1] = int(arrays[-1][0])
+        return cls(*arrays)
+
+    def save(self, path):
+        """ Write the weights as a compact binary file (about 2 * INPUT_SIZE * hidden bytes). """
+        arrays = (self.w1, self.b1, self.w2, self.b2, self.w3, self.b3, self.w4, np.array([self.b4]))
+        with open(path, 'wb') as weight_file:
+            weight_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.hidden, self.l2, self.l3))
+            for array, (dtype, _) in zip(arrays, self._layout(self.hidden, self.l2, self.l3)):
+                weight_file.write(np.asarray(array).astype(dtype).tobytes())
+
+    @staticmethod
+    def _layout(hidden, l2, l3):
+        """ (dtype, shape) of each array in a weight file. """
+        return (('<i2', (INPUT_SIZE, hidden)), ('<i2', (hidden,)),
+                ('i1', (2 * hidden, l2)), ('<i4', (l2,)),
+                ('i1', (l2, l3)), ('<i4', (l3,)),
+                ('<i2', (l3,)), ('<i4', (1,)))
+
+    def refresh(self, position, perspective):
+        """ The accumulator of `perspective` computed from scratch. """
+        features = active_features(position, perspective)
+        return self.b1 + self.w1[features].sum(axis=0, dtype=np.int16)
+
+    def forward(self, own, other):
+        """
+        Score of the side to move from the two accumulators (side to move's first).
+
+        Returns:
+            int: The score in units of 1 / (QA * QB) pawns.
+        """
+        hidden = _clipped(np.concatenate((own, other)).astype(np.int32))
+        hidden = _clipped((hidden @ self.w2 + self.b2) >> WEIGHT_SHIFT)
+        hidden = _clipped((hidden @ self.w3 + self.b3) >> WEIGHT_SHIFT)
+        return int(hidden @ self.w4) + self.b4
+
+    def evaluate(self, position):
+        """ Evaluation in pawns from white's point of view, with both accumulators refreshed. """
+        own, other = self.refresh(position, position.side), self.refresh(position, position.side ^ 1)
+        score = self.forward(own, other) / (QA * QB)
+        return score if position.side == WHITE else -score
+
+
+class NnueEvaluator:
+    """
+    Evaluates positions of one search with incrementally updated accumulators.
+
+    The accumulators are kept on a stack indexed by the length of the
+    position's undo history, tagged with the Zobrist key of the position
+    they belong to. To evaluate a position, the evaluator looks back through
+    the history for the nearest position whose accumulator is known and
+    replays the moves made since then from their undo records, adding and
+    subtracting the feature columns they change. Taking a move back costs
+    nothing: the parent's entry is still on the stack. A perspective whose
+    king has moved in between is refreshed instead.
+
+    evaluate() is a drop-in replacement for evaluate_board on Positions.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.stack = []
+        self.refreshes = 0
+        self.updates = 0
+
+    def evaluate(self, position):
+        """ Evaluation in pawns from white's point of view. """
+        accumulators = self.accumulators(position)
+        side = position.side
+        score = self.network.forward(accumulators[side], accumulators[side ^ 1]) / (QA * QB)
+        return score if side == WHITE else -score
+
+    def accumulators(self, position):
+        """
+        Returns:
+            tuple: The white and black accumulators of the position.
+        """
+        ply = len(position.history)
+        stack = self.stack
+        if len(stack) <= ply:
+            stack.extend([None] * (ply + 1 - len(stack)))
+        entry = stack[ply]
+        if entry is None or entry[0] != position.key:
+            entry = stack[ply] = [position.key, None, None]
+        for perspective in (WHITE, BLACK):
+            if entry[1 + perspective] is None:
+                entry[1 + perspective] = self._accumulator(position, perspective, ply)
+        return entry[1], entry[2]
+
+    def _accumulator(self, position, perspective, ply):
+        """ The accumulator of `perspective` at `ply`, from an ancestor's or from scratch. """
+        history = position.history
+        stack = self.stack
+        king = perspective * 6 + KING
+        for start in range(ply - 1, max(-1, ply - 1 - MAX_LOOKBACK), -1):
+            record = history[start]
+            if record[1] == king:
+                break  # Every feature of this perspective changed
+            entry = stack[start]
+            if entry is not None and entry[0] == record[6] and entry[1 + perspective] is not None:
+                offset = king_offset(perspective, position.king_square(perspective))
+                accumulator = entry[1 + perspective]
+                for index in range(start, ply):
+                    accumulator = self._apply(accumulator, history[index], perspective, offset)
+                    self.updates += 1
+                    key = history[index + 1][6] if index + 1 < ply else position.key
+                    child = stack[index + 1]
+                    if child is None or child[0] != key:
+                        child = stack[index + 1] = [key, None, None]
+                    child[1 + perspective] = accumulator
+                return accumulator
+        self.refreshes += 1
+        return self.network.refresh(position, perspective)
+
+    def _apply(self, accumulator, record, perspective, offset):
+        """ The accumulator after the move of an undo record, for a perspective whose king did not move. """
+        move, piece, captured, _, ep_square = record[:5]
+        if not move:
+            return accumulator  # Null move
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        offsets = FEATURE_OFFSETS[perspective]
+        w1 = self.network.w1
+        piece_type = piece % 6
+        if piece_type != KING:
+            placed = piece - PAWN + promotion if promotion else piece
+            accumulator = accumulator + w1[offset + offsets[placed][to_square]] - w1[offset + offsets[piece][from_square]]
+        elif to_square - from_square in (2, -2):
+            # Castling (of the other side): its rook moves
+            rook = (piece // 6) * 6 + ROOK
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            accumulator = accumulator + w1[offset + offsets[rook][rook_to]] - w1[offset + offsets[rook][rook_from]]
+        if captured is not None:
+            capture_square = to_square
+            if piece_type == PAWN and to_square == ep_square:
+                capture_square = to_square - 8 if piece // 6 == WHITE else to_square + 8
+            accumulator = accumulator - w1[offset + offsets[captured][capture_square]]
+        return accumulator
+
+
+# Network used by the 'nnue' evaluation backend, see load_network
+_network = None
+
+
+def load_network(path):
+    """ Load the weight file `path` for the 'nnue' evaluation backend (None unloads it). """
+    global _network
+    _network = Network.load(path) if path else None
+    return _network
+
+
+def set_network(network):
+    """ Use a Network object for the 'nnue' evaluation backend. """
+    global _network
+    _network = network
+    return _network
+
+
+def get_network():
+    return _network
+
+
+def benchmark(network, count=500, seed=0):
+    """
+    Compare evaluations per second: the classic evaluation, the network with
+    both accumulators refreshed from scratch, and the network with
+    accumulators updated from the parent position. Every legal move of
+    `count` random positions is made and its position evaluated, as a search
+    does; the incremental scores are checked against the refreshed ones.
+
+    Returns:
+        bool: True if the incremental and refreshed evaluations agree.
+    """
+    from chess.batch import random_positions
+    from chess.move_generator import generate_position_moves
+
+    positions = random_positions(count, seed)
+    move_lists = [generate_position_moves(position, position.side) for position in positions]
+    evaluations = sum(len(moves) for moves in move_lists)
+
+    def run(evaluate, prepare=None):
+        scores = []
+        elapsed = 0.0
+        clock = time.perf_counter
+        for position, moves in zip(positions, move_lists):
+            if prepare is not None:
+                prepare(position)
+            for move in moves:
+                position.make_move(move)
+                start = clock()
+                scores.append(evaluate(position))
+                elapsed += clock() - start
+                position.unmake_move()
+        return scores, elapsed
+
+    _, classic_time = run(evaluate_board)
+    refreshed, refresh_time = run(network.evaluate)
+    evaluator = NnueEvaluator(network)
+    incremental, incremental_time = run(evaluator.evaluate, evaluator.evaluate)
+    _, accumulator_refresh_time = run(lambda position: (network.refresh(position, WHITE),
+                                                        network.refresh(position, BLACK)))
+    evaluator = NnueEvaluator(network)
+    _, accumulator_update_time = run(evaluator.accumulators, evaluator.accumulators)
+
+    identical = refreshed == incremental
+    print(f"{evaluations} evaluations in {count} positions, incremental results identical to refresh: {identical}")
+    print(f"  ({evaluator.updates} incremental updates, {evaluator.refreshes} refreshes after king moves "
+          f"and of the {count} roots)")
+    print(f"classic evaluate_board      {evaluations / classic_time:>10.0f} evals/s")
+    print(f"nnue, full refresh          {evaluations / refresh_time:>10.0f} evals/s"
+          f"   accumulators only {evaluations / accumulator_refresh_time:>10.0f}/s")
+    print(f"nnue, incremental update    {evaluations / incremental_time:>10.0f} evals/s"
+          f"   accumulators only {evaluations / accumulator_update_time:>10.0f}/s")
+    return identical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NNUE weight files and evaluation benchmarks.")
+    parser.add_argument("--network", metavar="FILE", help="weight file (default: a random network)")
+    parser.add_argument("--hidden", type=int, default=DEFAULT_HIDDEN, help="accumulator size of a random network")
+    parser.add_argument("--write-random", metavar="FILE", help="write a random network to FILE and exit")
+    parser.add_argument("--positions", type=int, default=500, help="random positions to benchmark on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    _require_numpy()
+
+    if args.write_random:
+        Network.random(args.hidden, seed=args.seed).save(args.write_random)
+        return 0
+    network = Network.load(args.network) if args.network else Network.random(args.hidden, seed=args.seed)
+    return 0 if benchmark(network, args.positions, args.seed) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+# chess/notation.py
+
+import re
+
+from chess.bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_TYPES, square_coords, square_index
+from chess.position import encode_move, move_from_square, move_to_square, move_promotion
+from chess.move_generator import generate_position_moves
+
+FILES = 'abcdefgh'
+
+# Standard algebraic notation: optional piece letter, optional disambiguation
+# file and/or rank, optional capture, destination, optional promotion
+_SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+
+
+def square_name(square):
+    """ Name of a square, e.g. 'e4'. """
+    row, col = square_coords(square)
+    return f"{FILES[col]}{row + 1}"
+
+
+def parse_square(name):
+    """ Square index of a name like 'e4'. """
+    if len(name) != 2 or name[0] not in FILES or name[1] not in '12345678':
+        raise ValueError(f"Invalid square: {name!r}")
+    return square_index(int(name[1]) - 1, FILES.index(name[0]))
+
+
+def move_to_uci(move):
+    """ Coordinate (UCI) notation for a move, e.g. 'e2e4' or 'e7e8q'. """
+    name = square_name(move_from_square(move)) + square_name(move_to_square(move))
+    if move_promotion(move):
+        name += PIECE_TYPES[move_promotion(move)].lower()
+    return name
+
+
+def parse_uci(position, text):
+    """
+    Parse a move in coordinate notation and check that it is legal.
+
+    Returns:
+        int: The move.
+
+    Raises:
+        ValueError: If the text is malformed or the move is not legal.
+    """
+    text = text.strip()
+    if len(text) not in (4, 5):
+        raise ValueError(f"Invalid UCI move: {text!r}")
+    promotion = 0
+    if len(text) == 5:
+        promotion = PIECE_TYPES.find(text[4].upper())
+        if promotion not in (KNIGHT, BISHOP, ROOK, QUEEN):
+            raise ValueError(f"Invalid UCI move: {text!r}")
+    move = encode_move(parse_square(text[:2]), parse_square(text[2:4]), promotion)
+    if move not in generate_position_moves(position, position.side):
+        raise ValueError(f"Illegal move {text!r} in {position.to_fen()}")
+    return move
+
+
+def move_to_san(position, move, legal_moves=None):
+    """
+    Standard algebraic notation for a legal move, e.g. 'Nf3', 'exd5', 'O-O' or 'e8=Q+'.
+
+    Args:
+        position (Position): The position before the move; restored on return.
+        move (int): The move.
+        legal_moves (list): The legal moves of the position, if already known.
+
+    Returns:
+        str: The move in SAN, with '+' or '#' for check and mate.
+    """
+    if legal_moves is None:
+        legal_moves = generate_position_moves(position, position.side)
+    from_square, to_square = move_from_square(move), move_to_square(move)
+    piece_type = position.squares[from_square] % 6
+    if piece_type == KING and abs(to_square - from_square) == 2:
+        san = 'O-O' if to_square > from_square else 'O-O-O'
+    elif piece_type == PAWN:
+        capture = (to_square - from_square) % 8 != 0
+        san = f"{FILES[from_square % 8]}x" if capture else ''
+        san += square_name(to_square)
+        if move_promotion(move):
+            san += '=' + PIECE_TYPES[move_promotion(move)]
+    else:
+        # Disambiguate by file, then rank, then both, against other pieces of
+        # the same kind that can reach the same square
+        rivals = [m for m in legal_moves
+                  if m != move and move_to_square(m) == to_square
+                  and position.squares[move_from_square(m)] == position.squares[from_square]]
+        prefix = ''
+        if rivals:
+            same_file = any(move_from_square(m) % 8 == from_square % 8 for m in rivals)
+            same_rank = any(move_from_square(m) // 8 == from_square // 8 for m in rivals)
+            if not same_file:
+                prefix = FILES[from_square % 8]
+            elif not same_rank:
+                prefix = str(from_square // 8 + 1)
+            else:
+                prefix = square_name(from_square)
+        capture = 'x' if position.squares[to_square] is not None else ''
+        san = PIECE_TYPES[piece_type] + prefix + capture + square_name(to_square)
+
+    position.make_move(move)
+    if position.in_check():
+        san += '#' if not generate_position_moves(position, position.side) else '+'
+    position.unmake_move()
+    return san
+
+
+def parse_san(position, text, legal_moves=None):
+    """
+    Parse a move in standard algebraic notation.
+
+    Check and annotation suffixes ('+', '#', '!', '?') are ignored, and castling
+    may be written with letter O or digit 0.
+
+    Args:
+        position (Position): The position the move is played in.
+        text (str): The move, e.g. 'Nbd7', 'exd5', 'O-O' or 'e8=Q'.
+        legal_moves (list): The legal moves of the position, if already known.
+
+    Returns:
+        int: The move.
+
+    Raises:
+        ValueError: If the text is malformed, matches no legal move or is ambiguous.
+    """
+    san = text.strip().rstrip('+#!?')
+    if legal_moves is None:
+        legal_moves = generate_position_moves(position, position.side)
+
+    if san.replace('0', 'O') in ('O-O', 'O-O-O'):
+        king = position.king_square(position.side)
+        to_square = king + (2 if san.replace('0', 'O') == 'O-O' else -2)
+        candidates = [m for m in legal_moves if m == encode_move(king, to_square)]
+    else:
+        match = _SAN_PATTERN.match(san)
+        if match is None:
+            raise ValueError(f"Invalid SAN move: {text!r}")
+        letter, file, rank, destination, promotion = match.groups()
+        piece_type = PIECE_TYPES.index(letter) if letter else PAWN
+        to_square = parse_square(destination)
+        promotion = PIECE_TYPES.index(promotion.upper()) if promotion else 0
+        candidates = []
+        for move in legal_moves:
+            from_square = move_from_square(move)
+            if (move_to_square(move) == to_square
+                    and position.squares[from_square] % 6 == piece_type
+                    and move_promotion(move) == promotion
+                    and (file is None or FILES[from_square % 8] == file)
+                    and (rank is None or str(from_square // 8 + 1) == rank)):
+                candidates.append(move)
+
+    if not candidates:
+        raise ValueError(f"Illegal move {text!r} in {position.to_fen()}")
+    if len(candidates) > 1:
+        raise ValueError(f"Ambiguous move {text!r} in {position.to_fen()}")
+    return candidates[0]
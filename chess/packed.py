@@ -0,0 +1,252 @@
+# chess/packed.py
+
+import mmap
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the array views
+    np = None
+
+from chess.position import Position
+from chess.zobrist import compute_key
+
+# Fixed-size binary position record, 32 bytes, little-endian:
+#
+#   occupancy   uint64   bit per occupied square (square = row * 8 + col)
+#   pieces      16 bytes one 4-bit piece index per occupied square, in square
+#                        order, low nibble first (at most 32 pieces)
+#   flags       uint8    bit 0: black to move, bits 1-4: castling rights
+#   ep_square   uint8    en passant square, 255 for none
+#   halfmove    uint8    halfmove clock (capped at 255)
+#   result      int8     game result from white's view: 1, 0, -1, or NO_RESULT
+#   fullmove    uint16   fullmove number
+#   score       int16    evaluation label in centipawns, or NO_SCORE
+#
+# A file of positions is just records back to back, so record i starts at
+# byte 32 * i and a file can be memory-mapped and read without parsing.
+
+RECORD_FORMAT = '<Q16sBBBbHh'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)  # 32
+NO_EP = 255
+NO_RESULT = -128
+NO_SCORE = -32768
+
+# Conventional file name extension of packed position files
+PACKED_EXTENSION = '.packed'
+
+# Value of an empty square in decode_squares
+NO_PIECE = 12
+
+if np is not None:
+    PACKED_DTYPE = np.dtype([
+        ('occupancy', '<u8'),
+        ('pieces', 'u1', (16,)),
+        ('flags', 'u1'),
+        ('ep_square', 'u1'),
+        ('halfmove', 'u1'),
+        ('result', 'i1'),
+        ('fullmove', '<u2'),
+        ('score', '<i2'),
+    ])
+else:
+    PACKED_DTYPE = None
+
+
+def pack_position(position, result=None, score=None):
+    """
+    Encode a Position as a 32 byte record.
+
+    Args:
+        position (Position): The position to encode.
+        result (int): Optional game result from white's view (1, 0 or -1).
+        score (int): Optional evaluation label in centipawns.
+
+    Returns:
+        bytes: The record.
+    """
+    nibbles = bytearray(16)
+    count = 0
+    for square, piece in enumerate(position.squares):
+        if piece is not None:
+            if count == 32:
+                raise ValueError("A packed position holds at most 32 pieces")
+            nibbles[count >> 1] |= piece << (4 * (count & 1))
+            count += 1
+    flags = position.side | (position.castling << 1)
+    ep_square = position.ep_square if position.ep_square is not None else NO_EP
+    return struct.pack(
+        RECORD_FORMAT, position.occupancy[2], bytes(nibbles), flags, ep_square,
+        min(position.halfmove_clock, 255),
+        NO_RESULT if result is None else result,
+        min(position.fullmove_number, 0xFFFF),
+        NO_SCORE if score is None else max(-32767, min(32767, score)),
+    )
+
+
+def unpack_position(buffer, offset=0):
+    """
+    Decode the record at `offset` in `buffer`.
+
+    Returns:
+        tuple: (Position, result or None, score or None)
+    """
+    occupancy, nibbles, flags, ep_square, halfmove, result, fullmove, score = \
+        struct.unpack_from(RECORD_FORMAT, buffer, offset)
+    position = Position()
+    count = 0
+    while occupancy:
+        low = occupancy & -occupancy
+        occupancy ^= low
+        piece = (nibbles[count >> 1] >> (4 * (count & 1))) & 15
+        position.put_piece(piece, low.bit_length() - 1)
+        count += 1
+    position.side = flags & 1
+    position.castling = (flags >> 1) & 15
+    position.ep_square = ep_square if ep_square != NO_EP else None
+    position.halfmove_clock = halfmove
+    position.fullmove_number = fullmove
+    position.key = compute_key(position)
+    return (position,
+            None if result == NO_RESULT else result,
+            None if score == NO_SCORE else score)
+
+
+def write_positions(path, records, append=False):
+    """
+    Write positions to a packed file.
+
+    Args:
+        path (str): Output file.
+        records (iterable): Positions, or (position, result, score) tuples.
+        append (bool): Append to an existing file instead of replacing it.
+
+    Returns:
+        int: Number of records written.
+    """
+    count = 0
+    with open(path, 'ab' if append else 'wb') as out:
+        for record in records:
+            if isinstance(record, Position):
+                out.write(pack_position(record))
+            else:
+                out.write(pack_position(*record))
+            count += 1
+    return count
+
+
+class PackedPositionFile:
+    """
+    Read-only memory-mapped view of a packed position file.
+
+    Nothing is decoded up front: len() comes from the file size, indexing
+    decodes a single record, records() hands out zero-copy memoryview slices,
+    and array() exposes the whole file as a NumPy structured array sharing
+    the mapped memory, so millions of positions can be filtered or fed to
+    decode_planes without creating a Python object per position.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % RECORD_SIZE:
+            self._file.close()
+            raise ValueError(f"{path} is not a packed position file ({size} bytes is not a multiple of {RECORD_SIZE})")
+        self._count = size // RECORD_SIZE
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map) if size else memoryview(b'')
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """ Decode record `index` into (Position, result, score). """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return unpack_position(self._view, index * RECORD_SIZE)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield unpack_position(self._view, index * RECORD_SIZE)
+
+    def records(self, start=0, stop=None):
+        """ Yield the raw 32 byte records as memoryview slices of the mapping. """
+        stop = self._count if stop is None else min(stop, self._count)
+        view = self._view
+        for index in range(start, stop):
+            yield view[index * RECORD_SIZE:(index + 1) * RECORD_SIZE]
+
+    def array(self):
+        """
+        The file as a NumPy structured array of PACKED_DTYPE backed by the mapping (no copy).
+
+        The array must be dropped before close() is called.
+        """
+        if np is None:
+            raise ImportError("PackedPositionFile.array requires numpy (pip install numpy)")
+        return np.frombuffer(self._view, dtype=PACKED_DTYPE, count=self._count)
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_squares(records):
+    """
+    Vectorized decoding of packed records into the piece on every square.
+
+    The k-th occupied square of a record takes the k-th nibble, so a running
+    count of the occupancy bits gives every square its nibble index.
+
+    Args:
+        records (numpy.ndarray): Structured array of PACKED_DTYPE, e.g. a slice
+                                 of PackedPositionFile.array().
+
+    Returns:
+        numpy.ndarray: int8 array of shape (N, 64) holding the piece index of
+                       each square (see chess/position.py), NO_PIECE if empty.
+    """
+    if np is None:
+        raise ImportError("decode_squares requires numpy (pip install numpy)")
+    count = len(records)
+    occupancy = np.ascontiguousarray(records['occupancy']).astype('<u8')
+    occupied = np.unpackbits(occupancy.view(np.uint8).reshape(count, 8), axis=1, bitorder='little')
+    packed = records['pieces']
+    nibbles = np.empty((count, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = packed & 15
+    nibbles[:, 1::2] = packed >> 4
+    order = np.cumsum(occupied, axis=1, dtype=np.int64) - 1
+    pieces = np.take_along_axis(nibbles, np.clip(order, 0, 31), axis=1).astype(np.int8)
+    return np.where(occupied.astype(bool), pieces, np.int8(NO_PIECE))
+
+
+def decode_planes(records):
+    """
+    Vectorized decoding of packed records into (N, 12, 64) piece planes, in
+    the layout chess/batch.py expects (see decode_squares).
+
+    Args:
+        records (numpy.ndarray): Structured array of PACKED_DTYPE, e.g. a slice
+                                 of PackedPositionFile.array().
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (N, 12, 64).
+    """
+    if np is None:
+        raise ImportError("decode_planes requires numpy (pip install numpy)")
+    squares = decode_squares(records)
+    planes = np.zeros((len(records), 12, 64), dtype=np.uint8)
+    rows, occupied = np.nonzero(squares != NO_PIECE)
+    planes[rows, squares[rows, occupied], occupied] = 1
+    return planes
@@ -0,0 +1,217 @@
+# chess/parallel.py
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+from chess.position import Position, STARTING_FEN
+from chess.search import iterative_deepening, set_tablebase_path
+from chess.transposition import TranspositionTable, table_bytes
+
+# Lazy SMP: every worker process runs its own iterative deepening search of
+# the same root position. The workers only cooperate through a transposition
+# table in shared memory, which lets each one skip subtrees another has
+# already searched. Odd-numbered helpers start one ply deeper and helpers
+# shuffle their root moves, so the workers spread out over the tree instead
+# of searching it in lockstep.
+
+# How often a search with an external stop_event checks it, in seconds
+STOP_POLL_SECONDS = 0.005
+
+# Per-process state set up by _init_worker
+_worker_tt = None
+_worker_memory = None
+_worker_stop = None
+
+
+def _init_worker(memory_name, size_mb, stop_event, tablebase_path):
+    global _worker_tt, _worker_memory, _worker_stop
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_tt = TranspositionTable(size_mb, buffer=_worker_memory.buf)
+    _worker_stop = stop_event
+    if tablebase_path:
+        set_tablebase_path(tablebase_path)
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _worker_search(position, worker_id, depth, movetime_ms, max_nodes, started):
+    """ Search `position` in a worker process; returns a plain dict summary. """
+    result = iterative_deepening(
+        position, depth, _worker_tt, movetime_ms, max_nodes,
+        start_depth=1 + worker_id % 2,
+        stop_event=_worker_stop,
+        root_seed=worker_id if worker_id else None,
+    )
+    # Completion times relative to the start of the whole parallel search
+    offset = time.time() - started - result.elapsed
+    return {
+        'worker': worker_id,
+        'best_eval': result.best_eval,
+        'best_move': result.best_move,
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'depth_times': dict(zip(range(result.depth - len(result.depth_times) + 1, result.depth + 1),
+                                (offset + t for t in result.depth_times))),
+    }
+
+
+class ParallelSearch:
+    """
+    Lazy SMP search over a pool of worker processes sharing one transposition table.
+
+    The pool and the shared table are kept between searches, so later moves of
+    a game start with a warm table. Call close() (or use as a context manager)
+    to stop the workers and free the shared memory.
+    """
+
+    def __init__(self, workers=None, hash_mb=16, tablebase_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb
+        self._memory = shared_memory.SharedMemory(create=True, size=table_bytes(hash_mb))
+        # The parent's own view of the shared table, e.g. to read the principal variation
+        self.tt = TranspositionTable(hash_mb, buffer=self._memory.buf)
+        # Workers are spawned rather than forked: a fork taken while another
+        # thread holds a lock (such as the UCI front end reading stdin) can
+        # leave the child deadlocked on that lock
+        context = multiprocessing.get_context('spawn')
+        self._stop = context.Event()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._memory.name, hash_mb, self._stop, tablebase_path),
+        )
+        # Start every worker now so that process start-up does not count
+        # against the first search's time budget
+        wait([self._pool.submit(_worker_ready) for _ in range(self.workers)])
+
+    def search(self, board, depth=None, movetime_ms=None, max_nodes=None, stop_event=None):
+        """
+        Search `board` with all workers until the limits are reached.
+
+        Args:
+            board (Position): The position to search.
+            depth (int): Maximum depth.
+            movetime_ms (int): Wall-clock budget in milliseconds.
+            max_nodes (int): Node budget, shared out evenly between the workers.
+            stop_event: Optional threading.Event; when another thread sets it the
+                        workers are stopped and their results so far returned.
+
+        Returns:
+            dict: best_eval, best_move and depth from the worker that completed
+                  the deepest iteration, the total nodes and nodes per second,
+                  the elapsed time and, per depth, the time at which the first
+                  worker completed it (time_to_depth).
+        """
+        if depth is None and movetime_ms is None and max_nodes is None:
+            raise ValueError("ParallelSearch.search needs a depth, movetime_ms or max_nodes limit")
+        self._stop.clear()
+        self.tt.new_search()  # Every worker advances its age once per search too
+        worker_nodes = -(-max_nodes // self.workers) if max_nodes is not None else None
+        started = time.time()
+        futures = [
+            self._pool.submit(_worker_search, board, worker_id, depth, movetime_ms, worker_nodes, started)
+            for worker_id in range(self.workers)
+        ]
+        # As soon as one worker finishes (depth reached or budget spent) the
+        # others are told to stop; their deepest completed results still count
+        if stop_event is None:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        else:
+            done, pending = wait(futures, timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            while not done and not stop_event.is_set():
+                done, pending = wait(futures, timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+        self._stop.set()
+        wait(pending)
+        elapsed = time.time() - started
+
+        results = [future.result() for future in futures]
+        best = max(results, key=lambda r: (r['depth'], r['best_move'] is not None, -r['worker']))
+        nodes = sum(r['nodes'] for r in results)
+        time_to_depth = {}
+        for r in results:
+            for completed_depth, at in r['depth_times'].items():
+                if completed_depth not in time_to_depth or at < time_to_depth[completed_depth]:
+                    time_to_depth[completed_depth] = at
+        return {
+            'best_eval': best['best_eval'],
+            'best_move': best['best_move'],
+            'depth': best['depth'],
+            'nodes': nodes,
+            'nps': nodes / elapsed if elapsed else 0.0,
+            'elapsed': elapsed,
+            'time_to_depth': dict(sorted(time_to_depth.items())),
+            'workers': self.workers,
+        }
+
+    def close(self):
+        self._stop.set()
+        self._pool.shutdown(wait=True)
+        self.tt.release()
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parallel_search_best_move(board, workers=None, depth=None, movetime_ms=None, max_nodes=None, hash_mb=16):
+    """
+    One-off Lazy SMP search, returning (best_eval, best_move) like search_best_move.
+
+    Starting a pool costs far more than a short search; games should keep a
+    ParallelSearch open instead.
+    """
+    with ParallelSearch(workers, hash_mb) as searcher:
+        result = searcher.search(board, depth, movetime_ms, max_nodes)
+    return result['best_eval'], result['best_move']
+
+
+def benchmark(fen, worker_counts, depth=None, movetime_ms=None, hash_mb=16):
+    """
+    Print how nodes per second and time-to-depth scale with the number of
+    workers. Workers beyond the number of CPU cores share cores, so they
+    cannot scale and are flagged.
+    """
+    cores = os.cpu_count()
+    print(f"CPU cores: {cores or 'unknown'}")
+    baseline = None
+    for workers in worker_counts:
+        if cores is not None and workers > cores:
+            print(f"warning: {workers} workers exceed the {cores} CPU cores, so they share cores and cannot scale")
+        with ParallelSearch(workers, hash_mb) as searcher:
+            result = searcher.search(Position.from_fen(fen), depth, movetime_ms)
+        if baseline is None:
+            baseline = result
+        speedup = result['nps'] / baseline['nps'] if baseline['nps'] else 0.0
+        print(f"workers {workers:>3}  depth {result['depth']:>2}  nodes {result['nodes']:>10}  "
+              f"nps {result['nps']:>10.0f}  nps scaling {speedup:5.2f}x  time {result['elapsed']:.2f}s")
+        depths = ' '.join(f"{d}:{t:.2f}s" for d, t in result['time_to_depth'].items())
+        print(f"             time to depth  {depths}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Lazy SMP search across worker counts.")
+    parser.add_argument("--fen", default=STARTING_FEN, help="position to search (default: starting position)")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to compare")
+    parser.add_argument("--depth", type=int, help="depth limit")
+    parser.add_argument("--movetime", type=int, help="time limit per search in milliseconds")
+    parser.add_argument("--hash", type=int, default=16, metavar="MB", help="shared transposition table size")
+    args = parser.parse_args(argv)
+    if args.depth is None and args.movetime is None:
+        args.depth = 5
+    benchmark(args.fen, [int(n) for n in args.workers.split(',')], args.depth, args.movetime, args.hash)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,162 @@
+# chess/perft.py
+
+import argparse
+import time
+from array import array
+
+from chess.position import Position, STARTING_FEN
+from chess.move_generator import generate_position_moves
+from chess.notation import move_to_uci
+
+# Standard reference positions with their known node counts by depth
+# (https://www.chessprogramming.org/Perft_Results)
+REFERENCE_POSITIONS = [
+    ("startpos", STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+class PerftHash:
+    """
+    Fixed-size cache of subtree counts keyed by Zobrist key and depth.
+
+    Each slot is two words in an array('Q'): the key XORed with the depth, and
+    the node count. Transpositions are common in perft, so deeper runs skip
+    large parts of the tree.
+    """
+
+    def __init__(self, size_mb=16):
+        slots = 1
+        while slots * 2 * 16 <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.mask = slots - 1
+        self.table = array('Q', bytes(slots * 16))
+        self.hits = 0
+
+    def get(self, key, depth):
+        check = key ^ depth
+        index = (check & self.mask) * 2
+        if self.table[index] == check and self.table[index + 1]:
+            self.hits += 1
+            return self.table[index + 1]
+        return None
+
+    def put(self, key, depth, nodes):
+        check = key ^ depth
+        index = (check & self.mask) * 2
+        self.table[index] = check
+        self.table[index + 1] = nodes
+
+
+def perft(position, depth, table=None):
+    """
+    Count the leaf nodes of the legal move tree to `depth`.
+
+    At the last ply the moves are counted without being played (bulk counting).
+
+    Args:
+        position (Position): The position to count from; restored on return.
+        depth (int): Depth in plies.
+        table (PerftHash): Optional cache of subtree counts.
+
+    Returns:
+        int: The number of leaf nodes.
+    """
+    moves = generate_position_moves(position, position.side)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    if table is not None:
+        cached = table.get(position.key, depth)
+        if cached is not None:
+            return cached
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1, table)
+        position.unmake_move()
+    if table is not None:
+        table.put(position.key, depth, nodes)
+    return nodes
+
+
+def divide(position, depth, table=None):
+    """ perft split by root move: returns {move: node count}. """
+    counts = {}
+    for move in generate_position_moves(position, position.side):
+        position.make_move(move)
+        counts[move] = perft(position, depth - 1, table) if depth > 1 else 1
+        position.unmake_move()
+    return counts
+
+
+def run_perft(fen, depth, hash_mb=0, show_divide=False):
+    """ Run perft on a FEN and print nodes, time and nodes per second. """
+    position = Position.from_fen(fen)
+    table = PerftHash(hash_mb) if hash_mb else None
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(position, depth, table)
+        for move in sorted(counts, key=move_to_uci):
+            print(f"{move_to_uci(move)}: {counts[move]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, depth, table)
+    elapsed = time.perf_counter() - start
+    print(f"depth {depth}  nodes {nodes}  time {elapsed:.3f}s  nps {nodes / elapsed if elapsed else 0:.0f}")
+    return nodes
+
+
+def verify(max_nodes=1000000, hash_mb=0):
+    """
+    Check the move generator against REFERENCE_POSITIONS.
+
+    Each position is searched to the deepest depth whose expected count does
+    not exceed `max_nodes`. Returns True if every count matches.
+    """
+    ok = True
+    total_nodes = 0
+    start = time.perf_counter()
+    for name, fen, expected_counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(expected_counts, 1):
+            if expected > max_nodes:
+                break
+            position = Position.from_fen(fen)
+            nodes = perft(position, depth, PerftHash(hash_mb) if hash_mb else None)
+            total_nodes += nodes
+            status = "ok" if nodes == expected else "FAILED"
+            ok = ok and nodes == expected
+            print(f"{name:<12} depth {depth}  {nodes:>9} / {expected:<9} {status}")
+    elapsed = time.perf_counter() - start
+    print(f"total {total_nodes} nodes in {elapsed:.3f}s ({total_nodes / elapsed:.0f} nps)")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count legal move tree nodes (perft) to test and time the move generator.")
+    parser.add_argument("--fen", default=STARTING_FEN, help="position to search (default: starting position)")
+    parser.add_argument("--depth", type=int, default=4, help="depth in plies")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--hash", type=int, default=0, metavar="MB", help="size of the perft hash table (0 = off)")
+    parser.add_argument("--verify", action="store_true", help="check the standard reference positions")
+    parser.add_argument("--max-nodes", type=int, default=1000000,
+                        help="with --verify, skip depths whose expected count is larger")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        return 0 if verify(args.max_nodes, args.hash) else 1
+    run_perft(args.fen, args.depth, args.hash, args.divide)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
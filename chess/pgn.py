@@ -0,0 +1,258 @@
+# chess/pgn.py
+
+import os
+import re
+
+from chess.position import Position, STARTING_FEN
+from chess.notation import parse_san
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+_MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+$')
+
+# Tags written first, in this order, by format_game (the PGN "seven tag roster")
+TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+# Export format keeps movetext lines within this many characters
+LINE_LENGTH = 79
+
+# PGN files are read as UTF-8; bytes that are not (old Latin-1 files) are replaced
+ENCODING = 'utf-8'
+
+
+def read_games(stream):
+    """
+    Read games from a PGN file one at a time.
+
+    Only the main line is kept: comments, variations and numeric annotation
+    glyphs are skipped.
+
+    Args:
+        stream: A text file (or any iterable of lines).
+
+    Yields:
+        dict: 'headers' (tag name -> value), 'moves' (SAN strings) and 'result'.
+    """
+    headers = {}
+    movetext = []
+    for line in stream:
+        stripped = line.strip()
+        if stripped.startswith('%'):
+            continue  # Escaped line
+        match = _HEADER_PATTERN.match(stripped) if stripped.startswith('[') else None
+        if match:
+            if movetext:
+                # A tag after movetext starts the next game
+                yield _make_game(headers, movetext)
+                headers, movetext = {}, []
+            headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped:
+            movetext.append(line)
+            if stripped.split()[-1] in RESULTS and _balanced(movetext):
+                yield _make_game(headers, movetext)
+                headers, movetext = {}, []
+    if headers or movetext:
+        yield _make_game(headers, movetext)
+
+
+def read_file(path, start=0, end=None):
+    """
+    Stream the games of a PGN file, or of the byte range [start, end) of it
+    (see split_file), without reading the whole file into memory.
+
+    Yields:
+        dict: Games, as read_games.
+    """
+    with open(path, 'rb') as pgn_file:
+        pgn_file.seek(start)
+        yield from read_games(_decoded_lines(pgn_file, start, end))
+
+
+def _decoded_lines(stream, position, end):
+    """ The lines of a binary stream as text, stopping at the first line that starts at or after `end`. """
+    for line in stream:
+        if end is not None and position >= end:
+            break
+        position += len(line)
+        yield line.decode(ENCODING, errors='replace')
+
+
+def split_file(path, chunks):
+    """
+    Split a PGN file into at most `chunks` byte ranges of about equal size,
+    each starting at the first tag line of a game, so that the ranges can be
+    read independently (in parallel) with read_file.
+
+    Returns:
+        list of tuple: (start, end) byte offsets covering the whole file.
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as pgn_file:
+        for index in range(1, chunks):
+            start = _next_game_start(pgn_file, max(size * index // chunks, starts[-1]))
+            if start >= size:
+                break
+            if start > starts[-1]:
+                starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _next_game_start(stream, offset):
+    """ Offset of the first game that starts at or after `offset`: a tag line following a non-tag line. """
+    stream.seek(offset)
+    position = offset
+    if offset:
+        position += len(stream.readline())  # Skip the partial line
+    after_movetext = False
+    for line in stream:
+        if line.startswith(b'['):
+            if after_movetext:
+                return position
+        else:
+            after_movetext = True
+        position += len(line)
+    return position
+
+
+def _balanced(movetext):
+    """ True when no comment or variation is left open, so a result marker really ends the game. """
+    text = ''.join(movetext)
+    return text.count('{') == text.count('}') and text.count('(') == text.count(')')
+
+
+def _make_game(headers, movetext):
+    moves, result = parse_movetext(''.join(movetext))
+    return {'headers': headers, 'moves': moves, 'result': headers.get('Result', result)}
+
+
+def parse_movetext(text):
+    """
+    Extract the main line moves from PGN movetext.
+
+    Returns:
+        tuple: (list of SAN moves, result marker or '*').
+    """
+    moves = []
+    result = '*'
+    depth = 0
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if char == '{':
+            end = text.find('}', index)
+            index = length if end < 0 else end + 1
+            continue
+        if char == ';':
+            end = text.find('\n', index)
+            index = length if end < 0 else end + 1
+            continue
+        if char == '(':
+            depth += 1
+            index += 1
+            continue
+        if char == ')':
+            depth -= 1
+            index += 1
+            continue
+        if char.isspace():
+            index += 1
+            continue
+        end = index
+        while end < length and not text[end].isspace() and text[end] not in '{;()':
+            end += 1
+        token = text[index:end]
+        index = end
+        if depth:
+            continue
+        if token in RESULTS:
+            result = token
+        elif token.startswith('$') or _MOVE_NUMBER_PATTERN.match(token):
+            continue
+        else:
+            # A move number may be glued to the move, as in "1.e4"
+            token = re.sub(r'^\d+\.+', '', token)
+            if token:
+                moves.append(token)
+    return moves, result
+
+
+def game_start(game):
+    """ The starting Position of a game: the FEN tag if present, else the standard start. """
+    return Position.from_fen(game['headers'].get('FEN', STARTING_FEN))
+
+
+def iter_moves(game):
+    """
+    Replay a game, yielding (position, move) before each move is played.
+
+    The same Position object is updated in place, so copy it to keep it.
+    Parsing stops with ValueError at the first illegal or unreadable move.
+    """
+    position = game_start(game)
+    for san in game['moves']:
+        move = parse_san(position, san)
+        yield position, move
+        position.make_move(move)
+
+
+def format_game(headers, moves, result='*'):
+    """
+    Format a game in PGN export format.
+
+    Args:
+        headers (dict): Tag name -> value. The seven tag roster comes first
+                        (missing roster tags are written as '?'), then the
+                        other tags in the order given.
+        moves (list): The moves in SAN.
+        result (str): One of RESULTS; it also sets the Result tag.
+
+    Returns:
+        str: The game, ending with a blank line.
+    """
+    tags = {name: headers.get(name, '?') for name in TAG_ROSTER}
+    tags['Result'] = result
+    for name, value in headers.items():
+        tags.setdefault(name, value)
+    lines = [f'[{name} "{_escape(value)}"]' for name, value in tags.items()]
+    lines.append('')
+
+    # Number the moves from the starting position's move number and side
+    number, black = 1, False
+    if 'FEN' in headers:
+        fields = headers['FEN'].split()
+        number = int(fields[5]) if len(fields) > 5 else 1
+        black = len(fields) > 1 and fields[1] == 'b'
+    tokens = []
+    for index, san in enumerate(moves):
+        if not black:
+            tokens.append(f"{number}.")
+        elif index == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if black:
+            number += 1
+        black = not black
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def _escape(value):
+    """ Escape backslashes and quotes in a tag value. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_game(stream, headers, moves, result='*'):
+    """ Write one game to a text stream in PGN export format (see format_game). """
+    stream.write(format_game(headers, moves, result))
@@ -0,0 +1,519 @@
+# chess/position.py
+
+from chess.pieces import Piece
+from chess.bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_TYPES, COLOR_NAMES,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    ROOK_MASKS, ROOK_TABLES, BISHOP_MASKS, BISHOP_TABLES,
+    color_index, square_coords, square_index, popcount,
+)
+from chess.zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS, compute_key
+from chess.evaluation import MG_TABLES, EG_TABLES, PHASE_WEIGHTS
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# Castling rights that survive a move from or to each square: moving the king
+# or a rook, or capturing a rook on its initial square, removes the right.
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[7] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASKS[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[63] &= ~BLACK_KINGSIDE
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def piece_index(color, piece_type):
+    """ Index (0-11) of a piece kind in Position.pieces: white P..K, then black P..K. """
+    return color * 6 + piece_type
+
+
+def piece_symbol(piece):
+    """ FEN-style letter for a piece index: uppercase for white, lowercase for black. """
+    letter = PIECE_TYPES[piece % 6]
+    return letter if piece < 6 else letter.lower()
+
+
+# Moves on a Position are plain ints: from square in bits 0-5, to square in
+# bits 6-11 and the promotion piece type (KNIGHT..QUEEN, 0 for none) above that.
+
+def encode_move(from_square, to_square, promotion=0):
+    """ Pack a move into an int. """
+    return from_square | (to_square << 6) | (promotion << 12)
+
+
+def move_from_square(move):
+    return move & 63
+
+
+def move_to_square(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move_to_tuple(move):
+    """ Convert an int move to the (start_pos, end_pos) format used by the list board. """
+    return square_coords(move & 63), square_coords((move >> 6) & 63)
+
+
+def move_from_tuple(move, promotion=0):
+    """ Convert a (start_pos, end_pos) move to an int move. """
+    start_pos, end_pos = move
+    return encode_move(square_index(*start_pos), square_index(*end_pos), promotion)
+
+
+class Position:
+    """
+    Bitboard representation of a chess position.
+
+    `pieces` holds one 64-bit int per piece kind (see piece_index), `occupancy`
+    holds the white, black and combined occupancy, and `squares` is a 64 entry
+    mailbox mapping each square to its piece index (or None) for fast lookups.
+    `history` is the undo stack filled by make_move and emptied by unmake_move.
+    `key` is the Zobrist hash of the position, updated incrementally by make_move,
+    and `pawn_key` the hash of the pawns alone (see chess/pawns.py).
+    `mg_score`/`eg_score` are the running material plus position scores (see
+    chess/evaluation.py) and `phase` the running game phase counter.
+    """
+
+    __slots__ = ('pieces', 'occupancy', 'squares', 'side', 'castling',
+                 'ep_square', 'halfmove_clock', 'fullmove_number', 'history', 'key',
+                 'pawn_key', 'mg_score', 'eg_score', 'phase')
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.occupancy = [0, 0, 0]
+        self.squares = [None] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.history = []
+        self.key = 0
+        self.pawn_key = 0
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+
+    @classmethod
+    def from_board(cls, board, color='white'):
+        """
+        Build a Position from the list-of-lists board used by chess/board.py.
+
+        Args:
+            board (list): 8x8 list of Piece objects (or None).
+            color (str): The side to move ('white' or 'black').
+
+        Returns:
+            Position: The equivalent bitboard position. Castling rights are granted
+                      wherever a king and rook still stand on their initial squares.
+        """
+        position = cls()
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    color_of_piece = WHITE if piece.color == 'white' else BLACK
+                    piece_type = PIECE_TYPES.index(piece.piece_type.upper())
+                    position.put_piece(piece_index(color_of_piece, piece_type), square_index(row, col))
+        position.side = color_index(color)
+        position.castling = position._infer_castling()
+        position.key = compute_key(position)
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Build a Position from a FEN string.
+
+        FEN lists rank 8 first, which is row 7 of the board. The move clocks
+        may be omitted (as in EPD), in which case they default to 0 and 1.
+        Castling rights whose king or rook is not on its home square are
+        dropped.
+
+        Raises:
+            ValueError: For a malformed FEN, an en passant square off the third
+                        and sixth ranks, or a side without exactly one king.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN, expected at least 4 fields: {fen!r}")
+        position = cls()
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"Invalid FEN, expected 8 ranks: {fen!r}")
+        for rank_index, rank in enumerate(rows):
+            row = 7 - rank_index
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                piece_type = PIECE_TYPES.find(char.upper())
+                if piece_type < 0 or col > 7:
+                    raise ValueError(f"Invalid FEN piece placement: {fen!r}")
+                position.put_piece(piece_index(WHITE if char.isupper() else BLACK, piece_type),
+                                   square_index(row, col))
+                col += 1
+            if col != 8:
+                raise ValueError(f"Invalid FEN, rank {8 - rank_index} has {col} columns: {fen!r}")
+        for color in (WHITE, BLACK):
+            if popcount(position.pieces[color * 6 + KING]) != 1:
+                raise ValueError(f"Invalid FEN, {COLOR_NAMES[color]} needs exactly one king: {fen!r}")
+
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move: {fen!r}")
+        position.side = WHITE if fields[1] == 'w' else BLACK
+        rights = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE, '-': 0}
+        for char in fields[2]:
+            if char not in rights:
+                raise ValueError(f"Invalid FEN castling rights: {fen!r}")
+            position.castling |= rights[char]
+        # Drop rights whose king or rook is not on its home square
+        position.castling &= position._infer_castling()
+        if fields[3] != '-':
+            if len(fields[3]) != 2 or fields[3][0] not in 'abcdefgh' or fields[3][1] not in '36':
+                raise ValueError(f"Invalid FEN en passant square: {fen!r}")
+            position.ep_square = square_index(int(fields[3][1]) - 1, ord(fields[3][0]) - ord('a'))
+        if len(fields) > 4:
+            position.halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            position.fullmove_number = int(fields[5])
+        position.key = compute_key(position)
+        return position
+
+    def to_fen(self):
+        """ Serialize the position as a FEN string (side to move, castling, en passant and clocks included). """
+        ranks = []
+        for row in range(7, -1, -1):
+            rank = ''
+            empty = 0
+            for col in range(8):
+                piece = self.squares[square_index(row, col)]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece_symbol(piece)
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = ''.join(letter for right, letter in ((WHITE_KINGSIDE, 'K'), (WHITE_QUEENSIDE, 'Q'),
+                                                         (BLACK_KINGSIDE, 'k'), (BLACK_QUEENSIDE, 'q'))
+                           if self.castling & right) or '-'
+        if self.ep_square is None:
+            ep = '-'
+        else:
+            row, col = square_coords(self.ep_square)
+            ep = 'abcdefgh'[col] + str(row + 1)
+        side = 'w' if self.side == WHITE else 'b'
+        return f"{'/'.join(ranks)} {side} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    def _infer_castling(self):
+        rights = 0
+        squares = self.squares
+        if squares[4] == piece_index(WHITE, KING):
+            if squares[7] == piece_index(WHITE, ROOK):
+                rights |= WHITE_KINGSIDE
+            if squares[0] == piece_index(WHITE, ROOK):
+                rights |= WHITE_QUEENSIDE
+        if squares[60] == piece_index(BLACK, KING):
+            if squares[63] == piece_index(BLACK, ROOK):
+                rights |= BLACK_KINGSIDE
+            if squares[56] == piece_index(BLACK, ROOK):
+                rights |= BLACK_QUEENSIDE
+        return rights
+
+    def to_board(self):
+        """ Convert back to an 8x8 list-of-lists board of Piece objects. """
+        board = [[None for _ in range(8)] for _ in range(8)]
+        for square, piece in enumerate(self.squares):
+            if piece is not None:
+                row, col = square_coords(square)
+                board[row][col] = Piece(PIECE_TYPES[piece % 6], COLOR_NAMES[piece // 6])
+        return board
+
+    def copy(self):
+        """ Return an independent copy of the position. """
+        position = Position.__new__(Position)
+        position.pieces = self.pieces[:]
+        position.occupancy = self.occupancy[:]
+        position.squares = self.squares[:]
+        position.side = self.side
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.history = self.history[:]
+        position.key = self.key
+        position.pawn_key = self.pawn_key
+        position.mg_score = self.mg_score
+        position.eg_score = self.eg_score
+        position.phase = self.phase
+        return position
+
+    def refresh_scores(self):
+        """ Recompute the running evaluation terms from scratch (e.g. after changing the tables). """
+        self.mg_score = self.eg_score = self.phase = 0
+        for square, piece in enumerate(self.squares):
+            if piece is not None:
+                self.mg_score += MG_TABLES[piece][square]
+                self.eg_score += EG_TABLES[piece][square]
+                self.phase += PHASE_WEIGHTS[piece % 6]
+
+    def put_piece(self, piece, square):
+        """ Place `piece` (a piece index) on an empty square. """
+        bit = 1 << square
+        self.pieces[piece] |= bit
+        self.occupancy[piece // 6] |= bit
+        self.occupancy[2] |= bit
+        self.squares[square] = piece
+        if piece % 6 == PAWN:
+            self.pawn_key ^= PIECE_KEYS[piece][square]
+        self.mg_score += MG_TABLES[piece][square]
+        self.eg_score += EG_TABLES[piece][square]
+        self.phase += PHASE_WEIGHTS[piece % 6]
+
+    def remove_piece(self, square):
+        """ Remove and return the piece on `square`. """
+        piece = self.squares[square]
+        bit = 1 << square
+        self.pieces[piece] ^= bit
+        self.occupancy[piece // 6] ^= bit
+        self.occupancy[2] ^= bit
+        self.squares[square] = None
+        if piece % 6 == PAWN:
+            self.pawn_key ^= PIECE_KEYS[piece][square]
+        self.mg_score -= MG_TABLES[piece][square]
+        self.eg_score -= EG_TABLES[piece][square]
+        self.phase -= PHASE_WEIGHTS[piece % 6]
+        return piece
+
+    def king_square(self, color):
+        """ Square of the king of `color`, or None if it has been captured. """
+        king = self.pieces[color * 6 + KING]
+        return (king & -king).bit_length() - 1 if king else None
+
+    def attackers_to(self, square, by_color, occupied=None):
+        """ Bitboard of the pieces of `by_color` attacking `square`. """
+        if occupied is None:
+            occupied = self.occupancy[2]
+        pieces = self.pieces
+        base = by_color * 6
+        queens = pieces[base + QUEEN]
+        return ((PAWN_ATTACKS[by_color ^ 1][square] & pieces[base + PAWN])
+                | (KNIGHT_ATTACKS[square] & pieces[base + KNIGHT])
+                | (KING_ATTACKS[square] & pieces[base + KING])
+                | (BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]] & (pieces[base + BISHOP] | queens))
+                | (ROOK_TABLES[square][occupied & ROOK_MASKS[square]] & (pieces[base + ROOK] | queens)))
+
+    def is_square_attacked(self, square, by_color):
+        """ True if any piece of `by_color` attacks `square`. """
+        return self.attackers_to(square, by_color) != 0
+
+    def make_move(self, move):
+        """
+        Apply an int move to the position in place.
+
+        Captures, double pawn pushes (which set the en passant square), en passant
+        captures, castling (a king move of two columns also moves the rook) and
+        promotions are handled, and castling rights are updated. The side to
+        move is switched afterwards. An undo record is pushed onto `history` so
+        that unmake_move can restore the previous position without copying the
+        board.
+        """
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        squares = self.squares
+        pieces = self.pieces
+        occupancy = self.occupancy
+        piece = squares[from_square]
+        captured = squares[to_square]
+        color = piece // 6
+        piece_type = piece % 6
+        old_ep_square = self.ep_square
+        old_castling = self.castling
+
+        capture_square = to_square
+        if piece_type == PAWN and to_square == old_ep_square:
+            # En passant: the captured pawn stands behind the target square
+            capture_square = to_square - 8 if color == WHITE else to_square + 8
+            captured = squares[capture_square]
+
+        # Undo record: (move, moved piece, captured piece, castling, ep square,
+        #               halfmove clock, key, mg score, eg score, phase, pawn key)
+        self.history.append((move, piece, captured, old_castling, old_ep_square,
+                             self.halfmove_clock, self.key, self.mg_score, self.eg_score, self.phase,
+                             self.pawn_key))
+
+        key = self.key ^ SIDE_KEY
+        if piece_type == PAWN:
+            self.pawn_key ^= PIECE_KEYS[piece][from_square]
+            if not promotion:
+                self.pawn_key ^= PIECE_KEYS[piece][to_square]
+        if captured is not None:
+            capture_bit = 1 << capture_square
+            pieces[captured] ^= capture_bit
+            occupancy[color ^ 1] ^= capture_bit
+            occupancy[2] ^= capture_bit
+            squares[capture_square] = None
+            key ^= PIECE_KEYS[captured][capture_square]
+            if captured % 6 == PAWN:
+                self.pawn_key ^= PIECE_KEYS[captured][capture_square]
+            self.mg_score -= MG_TABLES[captured][capture_square]
+            self.eg_score -= EG_TABLES[captured][capture_square]
+            self.phase -= PHASE_WEIGHTS[captured % 6]
+
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+        pieces[piece] ^= from_bit
+        placed = piece - PAWN + promotion if promotion else piece
+        pieces[placed] |= to_bit
+        occupancy[color] ^= from_bit | to_bit
+        occupancy[2] = (occupancy[2] ^ from_bit) | to_bit
+        squares[from_square] = None
+        squares[to_square] = placed
+        key ^= PIECE_KEYS[piece][from_square] ^ PIECE_KEYS[placed][to_square]
+        self.mg_score += MG_TABLES[placed][to_square] - MG_TABLES[piece][from_square]
+        self.eg_score += EG_TABLES[placed][to_square] - EG_TABLES[piece][from_square]
+        if promotion:
+            self.phase += PHASE_WEIGHTS[promotion] - PHASE_WEIGHTS[PAWN]
+
+        if piece_type == KING and to_square - from_square in (2, -2):
+            # Castling: bring the rook to the other side of the king
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook = squares[rook_from]
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            pieces[rook] ^= rook_bits
+            occupancy[color] ^= rook_bits
+            occupancy[2] ^= rook_bits
+            squares[rook_from] = None
+            squares[rook_to] = rook
+            key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+            self.mg_score += MG_TABLES[rook][rook_to] - MG_TABLES[rook][rook_from]
+            self.eg_score += EG_TABLES[rook][rook_to] - EG_TABLES[rook][rook_from]
+
+        if old_castling:
+            self.castling = old_castling & CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+            key ^= CASTLING_KEYS[old_castling] ^ CASTLING_KEYS[self.castling]
+
+        if old_ep_square is not None:
+            key ^= EP_KEYS[old_ep_square & 7]
+        self.ep_square = None
+        if piece_type == PAWN:
+            if to_square - from_square in (16, -16):
+                self.ep_square = (from_square + to_square) >> 1
+                key ^= EP_KEYS[from_square & 7]
+            self.halfmove_clock = 0
+        elif captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.side ^= 1
+        self.key = key
+
+    def unmake_move(self):
+        """ Take back the last move made with make_move and return it. """
+        (move, piece, captured, self.castling, self.ep_square,
+         self.halfmove_clock, self.key, self.mg_score, self.eg_score, self.phase,
+         self.pawn_key) = self.history.pop()
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        squares = self.squares
+        pieces = self.pieces
+        occupancy = self.occupancy
+        color = piece // 6
+        piece_type = piece % 6
+
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+        pieces[squares[to_square]] ^= to_bit
+        pieces[piece] |= from_bit
+        occupancy[color] ^= from_bit | to_bit
+        occupancy[2] = (occupancy[2] ^ to_bit) | from_bit
+        squares[from_square] = piece
+        squares[to_square] = None
+
+        if captured is not None:
+            capture_square = to_square
+            if piece_type == PAWN and to_square == self.ep_square:
+                capture_square = to_square - 8 if color == WHITE else to_square + 8
+            capture_bit = 1 << capture_square
+            pieces[captured] |= capture_bit
+            occupancy[color ^ 1] |= capture_bit
+            occupancy[2] |= capture_bit
+            squares[capture_square] = captured
+        elif piece_type == KING and to_square - from_square in (2, -2):
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook = squares[rook_to]
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            pieces[rook] ^= rook_bits
+            occupancy[color] ^= rook_bits
+            occupancy[2] ^= rook_bits
+            squares[rook_to] = None
+            squares[rook_from] = rook
+
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.side ^= 1
+        return move
+
+    def make_null_move(self):
+        """
+        Pass the move to the opponent without moving a piece, as null-move
+        pruning does; take it back with unmake_null_move.
+        """
+        self.history.append((0, None, None, self.castling, self.ep_square,
+                             self.halfmove_clock, self.key, self.mg_score, self.eg_score, self.phase,
+                             self.pawn_key))
+        key = self.key ^ SIDE_KEY
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        self.halfmove_clock += 1
+        self.side ^= 1
+        self.key = key
+
+    def unmake_null_move(self):
+        """ Take back a null move made with make_null_move. """
+        (_, _, _, self.castling, self.ep_square, self.halfmove_clock, self.key,
+         self.mg_score, self.eg_score, self.phase, self.pawn_key) = self.history.pop()
+        self.side ^= 1
+
+    def in_check(self, color=None):
+        """ True if the king of `color` (default: the side to move) is attacked. """
+        if color is None:
+            color = self.side
+        king_square = self.king_square(color)
+        return king_square is not None and self.is_square_attacked(king_square, color ^ 1)
+
+    def __str__(self):
+        rows = []
+        for row in range(8):
+            rows.append(' '.join(
+                piece_symbol(self.squares[square_index(row, col)])
+                if self.squares[square_index(row, col)] is not None else '.'
+                for col in range(8)
+            ))
+        return '\n'.join(rows)
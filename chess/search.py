@@ -1,123 +1,1188 @@
 # chess/search.py
 
+import argparse
+import cProfile
 import math
+import pstats
+import random
+import time
 from chess.evaluation import evaluate_board
+from chess.pawns import PAWN_TABLE
 
 # Define the function that will generate all possible legal moves for a given player.
 # You can assume that the function `generate_legal_moves(board, color)` exists and returns
 # a list of possible moves where each move is represented as a tuple of (start_pos, end_pos).
-from chess.move_generator import generate_legal_moves
+from chess.move_generator import (
+    generate_legal_moves, generate_capture_moves, move_context, generate_moves_of_kind,
+    CAPTURES, QUIETS, ALL_MOVES,
+)
+from chess.position import Position, STARTING_FEN, move_to_tuple
+from chess.notation import move_to_uci
+from chess.transposition import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, SCORE_SCALE
+from chess.see import static_exchange_evaluation, SEE_VALUES
+from chess.bitboard import popcount
+from chess.tablebase import Tablebases, WIN
+from chess.cache import AnalysisCache, DEFAULT_MAX_ENTRIES, EVICT_LRU
+from chess.nnue import NnueEvaluator, get_network, load_network
 
 # Define infinity to represent large positive and negative values
 INFINITY = math.inf
 
-def minimax(board, depth, alpha, beta, is_maximizing_player, color, endgame=False):
+# Deepest iteration the iterative deepening driver will start
+MAX_DEPTH = 64
+
+# How many nodes to search between checks of the clock
+CHECK_INTERVAL = 1024
+
+# Piece values (P, N, B, R, Q, K) used to order captures: most valuable victim first,
+# least valuable attacker first among captures of the same victim
+ORDER_VALUES = [1, 3, 3, 5, 9, 20]
+
+# Score of a checkmate, in pawns. A mate found `ply` moves from the root scores
+# MATE_SCORE - ply so that quicker mates are preferred. In the transposition
+# table mates are counted from the stored position instead (see score_to_tt).
+MATE_SCORE = 1000
+
+# Scores this close to MATE_SCORE are mates
+MATE_THRESHOLD = MATE_SCORE - 2 * MAX_DEPTH
+
+# Principal variation search proves moves worse with a "zero" window just
+# above alpha. Scores are float pawns and the transposition table keeps them
+# to 1 / SCORE_SCALE, so that is the narrowest window worth searching.
+NULL_WINDOW = 1 / SCORE_SCALE
+
+# Aspiration windows: from ASPIRATION_MIN_DEPTH on, the root is searched with
+# a window of +/- ASPIRATION_WINDOW pawns around the previous iteration's
+# score. The window doubles each time the score falls outside it, and is
+# opened fully once it is wider than ASPIRATION_MAX.
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 0.5
+ASPIRATION_MAX = 8
+
+# Null-move pruning: the null move is searched NULL_MOVE_REDUCTION plies
+# shallower (one more from NULL_MOVE_DEEP_DEPTH), and cutoffs are verified
+# when the game phase (see chess/evaluation.py) is at most NULL_VERIFY_PHASE
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEEP_DEPTH = 7
+NULL_VERIFY_PHASE = 8
+
+# Late move reductions: from the LMR_MIN_MOVES-th move on, at depths of at
+# least LMR_MIN_DEPTH, quiet moves are reduced by LMR_REDUCTIONS[depth][move
+# number] plies, which grows with both
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_MAX_MOVES = 63
+LMR_REDUCTIONS = [[1 + int(math.log(depth) * math.log(moves) / 2.5) if depth and moves else 0
+                   for moves in range(LMR_MAX_MOVES + 1)] for depth in range(MAX_DEPTH + 1)]
+
+# Delta pruning: skip captures that cannot raise the score to alpha even with
+# this much positional compensation on top of the captured material
+DELTA_MARGIN = 2
+
+# Persistent analysis cache (see chess/cache.py): positions up to CACHE_PLIES
+# moves from the root are loaded into the transposition table before a search
+# and saved after it, when searched to at least CACHE_MIN_DEPTH
+CACHE_PLIES = 2
+CACHE_MIN_DEPTH = 3
+
+# Static evaluation backends: evaluate_board, or the NNUE network loaded
+# with chess.nnue.load_network
+EVAL_CLASSIC = 'classic'
+EVAL_NNUE = 'nnue'
+EVAL_BACKENDS = (EVAL_CLASSIC, EVAL_NNUE)
+
+# Move ordering score bands
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORES = (1 << 23, (1 << 23) - 1)
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time or node budget runs out. """
+
+
+class SearchState:
+    """
+    Bookkeeping shared by all nodes of one search.
+
+    Holds the transposition table, the killer moves (two quiet moves per ply that
+    caused a cutoff), the history table (cutoff counts per piece and target
+    square), the node and cutoff counters and the limits that end the search.
+
+    With `timing` set, move generation and evaluation are called through
+    wrappers that add up the time spent in them; otherwise the plain functions
+    are called and nothing is timed. `evaluate` replaces evaluate_board as the
+    static evaluation (see evaluation_function).
+    """
+
+    def __init__(self, tt=None, deadline=None, max_nodes=None, root_ply=0, stop_event=None, root_seed=None,
+                 timing=False, evaluate=None):
+        self.tt = tt
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [[0] * 64 for _ in range(12)]
+        self.nodes = 0
+        self.qnodes = 0
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.root_ply = root_ply
+        self.stop_event = stop_event  # Set by another thread or process to end the search
+        self.root_random = random.Random(root_seed) if root_seed is not None else None
+        self.can_stop = False  # The first iteration always runs to completion
+        self.tablebases = _tablebases
+        self.tb_hits = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0  # Cutoffs by the first move searched
+        self.null_cutoffs = 0
+        self.root_move = None  # Best move found at the root so far
+        self.movegen_time = 0.0
+        self.eval_time = 0.0
+        self.generate_moves = generate_legal_moves
+        self.generate_captures = generate_capture_moves
+        self.move_context = move_context
+        self.generate_stage = generate_moves_of_kind
+        self.evaluate = evaluate or evaluate_board
+        self.timing = timing
+        if timing:
+            self.generate_moves = self._timed(generate_legal_moves, 'movegen_time')
+            self.generate_captures = self._timed(generate_capture_moves, 'movegen_time')
+            self.move_context = self._timed(move_context, 'movegen_time')
+            self.generate_stage = self._timed(generate_moves_of_kind, 'movegen_time')
+            self.evaluate = self._timed(self.evaluate, 'eval_time')
+
+    def _timed(self, function, counter):
+        """ Wrap `function` so that its running time is added to the attribute `counter`. """
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                setattr(self, counter, getattr(self, counter) + clock() - start)
+        return timed
+
+    def check_limits(self):
+        """ Raise SearchTimeout once the time or node budget is used up or a stop was requested. """
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+        if not self.can_stop:
+            return
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+
+def order_moves(board, moves, state, ply, first_move=None):
+    """
+    Sort moves so that alpha-beta finds cutoffs early.
+
+    Order: the transposition table / previous iteration's best move, captures
+    and promotions by MVV-LVA, the two killer moves of this ply, then quiet
+    moves by history score.
     """
-    Minimax algorithm with alpha-beta pruning and depth limitation.
+    squares = board.squares
+    killers = state.killers[ply] if ply <= MAX_DEPTH else (0, 0)  # No killers in quiescence
+    history = state.history
+    scored = []
+    for move in moves:
+        if move == first_move:
+            score = TT_MOVE_SCORE
+        else:
+            to_square = (move >> 6) & 63
+            victim = squares[to_square]
+            if victim is not None or move >> 12:
+                attacker = squares[move & 63] % 6
+                gain = ORDER_VALUES[victim % 6] if victim is not None else 0
+                if move >> 12:
+                    gain += ORDER_VALUES[move >> 12]
+                score = CAPTURE_SCORE + gain * 64 - ORDER_VALUES[attacker]
+            elif move == killers[0]:
+                score = KILLER_SCORES[0]
+            elif move == killers[1]:
+                score = KILLER_SCORES[1]
+            else:
+                score = history[squares[move & 63]][to_square]
+        scored.append((score, move))
+    scored.sort(reverse=True)
+    ordered = [move for _, move in scored]
+    if ply == 0 and state.root_random is not None:
+        # Parallel helper searches shuffle the root moves after the first one
+        # so that they explore different parts of the tree
+        rest = ordered[1:]
+        state.root_random.shuffle(rest)
+        ordered[1:] = rest
+    return ordered
+
+
+def staged_moves(board, state, ply, tt_move=None):
+    """
+    Yield the legal moves of `board` in search order, generating them in stages.
+
+    Stages: the transposition table move; captures and promotions that do not
+    lose material, most valuable victim first; the killer moves of this ply;
+    the other quiet moves by history score; and last the captures that lose
+    material according to static exchange evaluation. A stage is generated
+    only once the previous one is used up, so a node that cuts off on the
+    table move or a capture never generates its quiet moves. The table move
+    and the killers are checked by generating the moves of their piece only.
+
+    The board must be back in the same position each time the next move is
+    requested, as it is between the iterations of a search loop.
+    """
+    context = state.move_context(board, board.side)
+    generate = state.generate_stage
+    squares = board.squares
+
+    if tt_move:
+        if tt_move in generate(board, context, ALL_MOVES, 1 << (tt_move & 63)):
+            yield tt_move
+        else:
+            tt_move = None  # A key collision or a stale entry
+
+    scored = []
+    for move in generate(board, context, CAPTURES):
+        if move == tt_move:
+            continue
+        victim = squares[(move >> 6) & 63]
+        gain = ORDER_VALUES[victim % 6] if victim is not None else 0
+        if move >> 12:
+            gain += ORDER_VALUES[move >> 12]
+        scored.append((gain * 64 - ORDER_VALUES[squares[move & 63] % 6], move))
+    scored.sort(reverse=True)
+    bad_captures = []
+    for _, move in scored:
+        victim = squares[(move >> 6) & 63]
+        if (victim is not None and ORDER_VALUES[victim % 6] < ORDER_VALUES[squares[move & 63] % 6]
+                and static_exchange_evaluation(board, move) < 0):
+            bad_captures.append(move)
+            continue
+        yield move
+
+    killers = tuple(state.killers[ply]) if ply <= MAX_DEPTH else (0, 0)
+    for killer in killers:
+        if killer and killer != tt_move and killer in generate(board, context, QUIETS, 1 << (killer & 63)):
+            yield killer
+
+    history = state.history
+    quiets = [(history[squares[move & 63]][(move >> 6) & 63], move)
+              for move in generate(board, context, QUIETS)
+              if move != tt_move and move not in killers]
+    quiets.sort(reverse=True)
+    for _, move in quiets:
+        yield move
+
+    yield from bad_captures
+
+
+def _count_cutoff(state, first):
+    """ Count a beta cutoff, and whether the move ordering put the refuting move first. """
+    state.cutoffs += 1
+    if first:
+        state.first_move_cutoffs += 1
+
+
+def _record_cutoff(board, move, depth, state, ply):
+    """ Remember a quiet move that caused a cutoff as a killer and in the history table. """
+    if board.squares[(move >> 6) & 63] is not None or move >> 12:
+        return  # Captures and promotions are already ordered first
+    if ply <= MAX_DEPTH:
+        killers = state.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+    state.history[board.squares[move & 63]][(move >> 6) & 63] += depth * depth
+
+
+# Transposition table kept between calls to search_best_move
+DEFAULT_HASH_MB = 16
+_transposition_table = None
+
+
+def get_transposition_table():
+    """ Return the shared transposition table, allocating it on first use. """
+    global _transposition_table
+    if _transposition_table is None:
+        _transposition_table = TranspositionTable(DEFAULT_HASH_MB)
+    return _transposition_table
+
+
+def set_hash_size(size_mb):
+    """ Replace the shared transposition table with an empty one of `size_mb` megabytes. """
+    global _transposition_table
+    _transposition_table = TranspositionTable(size_mb)
+    return _transposition_table
+
+
+# Endgame tablebases probed by minimax, see set_tablebase_path
+_tablebases = None
+
+
+def set_tablebase_path(path):
+    """
+    Load the endgame tables in directory `path` (see chess/tablebase.py) for
+    use by later searches, or stop using tablebases when `path` is None.
+    """
+    global _tablebases
+    if _tablebases is not None:
+        _tablebases.close()
+    _tablebases = Tablebases(path) if path else None
+    return _tablebases
+
+
+# Persistent analysis cache used by iterative_deepening, see set_analysis_cache
+_analysis_cache = None
+
+
+def set_analysis_cache(path, max_entries=DEFAULT_MAX_ENTRIES, policy=EVICT_LRU):
+    """
+    Keep search results in the cache file `path` (see chess/cache.py) across
+    runs, or stop using a cache when `path` is None.
+    """
+    global _analysis_cache
+    if _analysis_cache is not None:
+        _analysis_cache.close()
+    _analysis_cache = AnalysisCache(path, max_entries, policy) if path else None
+    return _analysis_cache
+
+
+def get_analysis_cache():
+    """ The analysis cache set with set_analysis_cache, or None. """
+    return _analysis_cache
+
+
+def evaluation_function(backend=EVAL_CLASSIC):
+    """
+    The static evaluation of a backend, for one search.
+
+    EVAL_NNUE returns the evaluate method of a new NnueEvaluator, whose
+    accumulators follow the moves the search makes on its board.
+    """
+    if backend == EVAL_CLASSIC:
+        return evaluate_board
+    if backend == EVAL_NNUE:
+        network = get_network()
+        if network is None:
+            raise ValueError("The nnue backend needs a network, see chess.nnue.load_network")
+        return NnueEvaluator(network).evaluate
+    raise ValueError(f"Unknown evaluation backend {backend!r}")
+
+
+def tablebase_score(board, ply, tablebases):
+    """ Exact score of a position from the tablebases, or None if it is not covered. """
+    if popcount(board.occupancy[2]) > tablebases.max_pieces:
+        return None
+    result = tablebases.probe(board)
+    if result is None:
+        return None
+    wdl, plies = result
+    if not wdl:
+        return 0
+    # A mate `plies` moves from here is a mate ply + plies moves from the root
+    score = MATE_SCORE - ply - plies
+    if (wdl == WIN) != (board.side == 0):
+        score = -score
+    return score
+
+
+def minimax(board, depth, alpha, beta, is_maximizing_player, color, state=None):
+    """
+    Search `board` to `depth` plies and return the score from white's point of view.
+
+    This is the interface of the original two-branch minimax, kept for callers
+    that think in terms of a maximizing and a minimizing player; the search
+    itself is negamax (see negamax).
 
     Args:
-        board (list): The current state of the chessboard.
+        board (Position): The current state of the chessboard. It is modified
+                          during the search and restored before returning.
         depth (int): The depth limit for the search.
         alpha (float): The best value that the maximizer can guarantee.
         beta (float): The best value that the minimizer can guarantee.
         is_maximizing_player (bool): True if it's the maximizing player's turn (white), False if it's the minimizing player's turn (black).
         color (str): 'white' or 'black', representing the current player's color.
-        endgame (bool): True if it's an endgame position.
+        state (SearchState): Optional search bookkeeping: transposition table,
+                             move ordering tables and limits. A fresh state
+                             without a table is used when it is omitted.
 
     Returns:
-        (float, tuple): The best evaluation score and the best move (start_pos, end_pos).
+        (float, int): The best evaluation score and the best move.
     """
-    # Base case: depth is 0 or the game is over (no legal moves or checkmate)
-    if depth == 0:
-        return evaluate_board(board, endgame), None
+    if state is None:
+        state = SearchState(root_ply=len(board.history))
+    if is_maximizing_player:
+        score = negamax(board, depth, alpha, beta, state)
+    else:
+        score = -negamax(board, depth, -beta, -alpha, state)
+    return score, state.root_move
+
+
+def negamax(board, depth, alpha, beta, state, pv_node=True, allow_null=True):
+    """
+    Alpha-beta search in negamax form: scores are from the side to move's point
+    of view, and a child's score is the negated score of its own search.
+
+    The first move of a node is searched with the full window. The others are
+    searched with a zero window around alpha, which only proves them worse
+    (principal variation search); a move that unexpectedly beats alpha is
+    searched again with the full window.
+
+    Below the root three kinds of node are cut short:
+      - null-move pruning: a node where passing the move still scores at least
+        beta after a search NULL_MOVE_REDUCTION plies shallower fails high
+        without searching its moves. With little material left (where being
+        forced to move can hurt, "zugzwang") the cutoff is verified by a
+        reduced search without null moves first.
+      - late move reductions: quiet moves late in the move order are searched
+        a few plies shallower, and at full depth only if they beat alpha.
+      - transposition table cutoffs, at nodes off the principal variation.
+
+    Args:
+        board (Position): The position to search; restored on return.
+        depth (int): Remaining depth in plies.
+        alpha (float): Lower bound of the window, side to move's view.
+        beta (float): Upper bound of the window.
+        state (SearchState): The search bookkeeping. The best root move is left
+                             in state.root_move.
+        pv_node (bool): Whether the node is on the principal variation (searched
+                        with an open window).
+        allow_null (bool): False right after a null move, and in verification
+                           searches.
+
+    Returns:
+        float: The score of the position.
+    """
+    if depth <= 0:
+        return quiescence(board, alpha, beta, state)
+
+    state.nodes += 1
+    if state.nodes % CHECK_INTERVAL == 0:
+        state.check_limits()
+    ply = len(board.history) - state.root_ply
+    sign = 1 if board.side == 0 else -1
 
-    legal_moves = generate_legal_moves(board, color)
-    if not legal_moves:
-        return evaluate_board(board, endgame), None
+    # With few pieces left the tablebases give the exact result; the root is
+    # still searched so that a move is returned
+    if state.tablebases is not None and ply > 0:
+        score = tablebase_score(board, ply, state.tablebases)
+        if score is not None:
+            state.tb_hits += 1
+            return score * sign
 
-    # Initialize best_move as None
+    tt = state.tt
+    tt_move = None
+    original_alpha = alpha
+    if tt is not None:
+        entry = tt.probe(board.key)
+        if entry is not None:
+            tt_move, tt_depth, tt_bound, tt_score = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if tt_depth >= depth and ply > 0 and not pv_node:
+                if (tt_bound == BOUND_EXACT
+                        or (tt_bound == BOUND_LOWER and tt_score >= beta)
+                        or (tt_bound == BOUND_UPPER and tt_score <= alpha)):
+                    return tt_score
+
+    in_check = board.in_check()
+
+    # Null-move pruning: give the opponent a free move; if we still reach beta
+    # the position is good enough to cut off. Not in check (passing would be
+    # illegal) and not without pieces, where zugzwang is the rule.
+    if (allow_null and not pv_node and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+            and _has_pieces(board) and state.evaluate(board) * sign >= beta):
+        reduction = NULL_MOVE_REDUCTION + (depth >= NULL_MOVE_DEEP_DEPTH)
+        board.make_null_move()
+        score = -negamax(board, depth - 1 - reduction, -beta, -beta + NULL_WINDOW, state, False, False)
+        board.unmake_null_move()
+        if score >= beta:
+            if board.phase <= NULL_VERIFY_PHASE:
+                # Verify: search this side's own moves, still reduced, with null moves off
+                score = negamax(board, depth - 1 - reduction, beta - NULL_WINDOW, beta, state, False, False)
+            if score >= beta:
+                state.null_cutoffs += 1
+                return beta if score >= MATE_THRESHOLD else score
+
+    # Below the root the moves are generated stage by stage as they are
+    # searched; the root needs them all up front to order (and shuffle) them
+    if ply == 0:
+        moves = order_moves(board, state.generate_moves(board, board.side), state, ply, tt_move)
+    else:
+        moves = staged_moves(board, state, ply, tt_move)
+    killers = state.killers[ply] if ply <= MAX_DEPTH else (0, 0)
+    squares = board.squares
+
+    best_score = -INFINITY
     best_move = None
+    for searched, move in enumerate(moves):
+        to_square = (move >> 6) & 63
+        piece = squares[move & 63]
+        quiet = (squares[to_square] is None and not move >> 12
+                 and not (piece % 6 == 0 and (to_square - (move & 63)) % 8))
+        make_move(board, move)
+        if searched == 0:
+            score = -negamax(board, depth - 1, -beta, -alpha, state, pv_node)
+        else:
+            # Late move reductions: quiet moves that are not killers, late
+            # in the order, when neither side is in check
+            reduction = 0
+            if (depth >= LMR_MIN_DEPTH and searched >= LMR_MIN_MOVES and quiet and not in_check
+                    and move != killers[0] and move != killers[1] and not board.in_check()):
+                reduction = LMR_REDUCTIONS[min(depth, MAX_DEPTH)][min(searched, LMR_MAX_MOVES)]
+                reduction = max(0, min(reduction - pv_node, depth - 2))
+            score = -negamax(board, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha, state, False)
+            if reduction and score > alpha:
+                score = -negamax(board, depth - 1, -alpha - NULL_WINDOW, -alpha, state, False)
+            if pv_node and alpha < score < beta:
+                score = -negamax(board, depth - 1, -beta, -alpha, state, True)
+        unmake_move(board)
 
-    if is_maximizing_player:
-        max_eval = -INFINITY
-        for move in legal_moves:
-            # Make the move (assume the function make_move(board, move) exists)
-            new_board = make_move(board, move)
-            eval, _ = minimax(new_board, depth - 1, alpha, beta, False, 'black', endgame)
+        if score > best_score:
+            best_score = score
+            best_move = move
+            if ply == 0:
+                state.root_move = move
+        if score > alpha:
+            alpha = score
+            if alpha >= beta:
+                _count_cutoff(state, searched == 0)
+                _record_cutoff(board, move, depth, state, ply)
+                break
+
+    if best_move is None:
+        # No legal moves: checkmate or stalemate
+        return -(MATE_SCORE - ply) if in_check else 0
+
+    if tt is not None:
+        _store(tt, board.key, best_move, depth, best_score, original_alpha, beta, ply)
+    return best_score
+
+
+def _has_pieces(board):
+    """ True if the side to move has a piece besides its king and pawns. """
+    base = board.side * 6
+    pieces = board.pieces
+    return bool(pieces[base + 1] | pieces[base + 2] | pieces[base + 3] | pieces[base + 4])
+
+
+def quiescence(board, alpha, beta, state):
+    """
+    Search captures and promotions only, until the position is quiet.
+
+    The side to move may always "stand pat" on the static evaluation instead of
+    capturing. Captures that lose material according to static exchange
+    evaluation, and captures that cannot bring the score back to the window
+    even with DELTA_MARGIN to spare (delta pruning), are not searched.
 
-            # Undo the move (assume the function undo_move(board, move) exists)
-            # undo_move(board, move)
+    Args: as for negamax, without the depth.
 
-            if eval > max_eval:
-                max_eval = eval
-                best_move = move
+    Returns:
+        float: The evaluation of the quiet position, side to move's view.
+    """
+    state.nodes += 1
+    state.qnodes += 1
+    if state.nodes % CHECK_INTERVAL == 0:
+        state.check_limits()
 
-            # Alpha-beta pruning
-            alpha = max(alpha, eval)
-            if beta <= alpha:
-                break  # Beta cutoff, prune the rest of the branch
+    if board.in_check():
+        return _quiescence_evasions(board, alpha, beta, state)
 
-        return max_eval, best_move
+    stand_pat = state.evaluate(board)
+    if board.side:
+        stand_pat = -stand_pat
+    if stand_pat >= beta:
+        return stand_pat
+    if stand_pat > alpha:
+        alpha = stand_pat
 
-    else:  # Minimizing player (black's turn)
-        min_eval = INFINITY
-        for move in legal_moves:
-            # Make the move
-            new_board = make_move(board, move)
-            eval, _ = minimax(new_board, depth - 1, alpha, beta, True, 'white', endgame)
+    squares = board.squares
+    moves = order_moves(board, state.generate_captures(board, board.side), state, MAX_DEPTH + 1)
+    best = stand_pat
+    for searched, move in enumerate(moves):
+        victim = squares[(move >> 6) & 63]
+        gain = SEE_VALUES[victim % 6] if victim is not None else 0
+        if move >> 12:
+            gain += SEE_VALUES[move >> 12] - SEE_VALUES[0]
+        if stand_pat + gain + DELTA_MARGIN <= alpha:
+            continue
+        if static_exchange_evaluation(board, move) < 0:
+            continue
 
-            # Undo the move
-            # undo_move(board, move)
+        make_move(board, move)
+        score = -quiescence(board, -beta, -alpha, state)
+        unmake_move(board)
 
-            if eval < min_eval:
-                min_eval = eval
-                best_move = move
+        if score > best:
+            best = score
+        if score > alpha:
+            alpha = score
+            if alpha >= beta:
+                _count_cutoff(state, searched == 0)
+                break
+    return best
 
-            # Alpha-beta pruning
-            beta = min(beta, eval)
-            if beta <= alpha:
-                break  # Alpha cutoff, prune the rest of the branch
 
-        return min_eval, best_move
+def _quiescence_evasions(board, alpha, beta, state):
+    """ Quiescence node in check: standing pat is not allowed, so every evasion is searched. """
+    moves = state.generate_moves(board, board.side)
+    if not moves:
+        return -(MATE_SCORE - (len(board.history) - state.root_ply))
+    best = -INFINITY
+    for searched, move in enumerate(order_moves(board, moves, state, MAX_DEPTH + 1)):
+        make_move(board, move)
+        score = -quiescence(board, -beta, -alpha, state)
+        unmake_move(board)
+        if score > best:
+            best = score
+        if score > alpha:
+            alpha = score
+            if alpha >= beta:
+                _count_cutoff(state, searched == 0)
+                break
+    return best
+
+
+def game_over_score(board, ply=0):
+    """ Score of a position without legal moves: checkmate or stalemate. """
+    if not board.in_check():
+        return 0  # Stalemate
+    if board.side == 0:
+        return -(MATE_SCORE - ply)  # White is mated
+    return MATE_SCORE - ply
+
+
+def score_to_tt(score, ply):
+    """
+    A score as stored in the transposition table. Mate scores are counted
+    from the node `ply` moves from the root rather than from the root, so
+    that they stay right when the position is reached at another ply or in a
+    later search.
+    """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    """ A score read from the transposition table at `ply`, counted from the root again. """
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def _store(tt, key, move, depth, score, alpha, beta, ply=0):
+    """ Store a node result, classifying the score against the window it was searched with. """
+    if score <= alpha:
+        bound = BOUND_UPPER
+    elif score >= beta:
+        bound = BOUND_LOWER
+    else:
+        bound = BOUND_EXACT
+    tt.store(key, move or 0, depth, bound, score_to_tt(score, ply))
 
 
 def make_move(board, move):
     """
-    Applies the move to the board and returns the new board state.
-    This function should modify the board in-place or return a copy of the board with the move applied.
+    Applies the move to the board in place.
+
+    The information needed to take the move back (moved and captured piece,
+    promotion, castling rights, en passant square and halfmove clock) is pushed
+    onto the position's undo stack, so no copy of the board is made.
+
+    Args:
+        board (Position): The current state of the chessboard.
+        move (int): The move to apply, as produced by generate_legal_moves.
+    """
+    board.make_move(move)
+
+
+def unmake_move(board):
+    """
+    Takes back the last move applied with make_move.
 
     Args:
-        board (list): The current state of the chessboard.
-        move (tuple): The move to apply, represented as (start_pos, end_pos).
+        board (Position): The current state of the chessboard.
 
     Returns:
-        list: The new board state after the move is applied.
+        int: The move that was taken back.
+    """
+    return board.unmake_move()
+
+
+class SearchResult:
     """
-    new_board = [row[:] for row in board]  # Create a deep copy of the board
-    start_pos, end_pos = move
-    piece = new_board[start_pos[0]][start_pos[1]]
-    new_board[end_pos[0]][end_pos[1]] = piece
-    new_board[start_pos[0]][start_pos[1]] = None  # The starting square becomes empty
+    Outcome of an iterative deepening search.
 
-    return new_board
+    Attributes:
+        best_eval (float): Score of the best move, from white's point of view.
+        best_move (int): Best move of the deepest completed iteration.
+        depth (int): Deepest completed iteration.
+        nodes (int): Nodes searched, including quiescence nodes.
+        elapsed (float): Seconds spent searching.
+        depth_times (list): Seconds from the start until each depth completed.
+        depth_moves (list): Best move of each completed depth, in the same order.
+        stats (SearchStats): Counters and timings of the search.
+    """
+
+    def __init__(self):
+        self.best_eval = None
+        self.best_move = None
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.depth_times = []
+        self.depth_moves = []
+        self.stats = SearchStats()
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+
+class SearchStats:
+    """
+    Statistics of one search, for tuning the search and finding where the time goes.
+
+    Attributes:
+        nodes (int): Nodes searched, including quiescence nodes.
+        qnodes (int): Quiescence nodes.
+        elapsed (float): Seconds spent searching.
+        depths (list): The completed iteration depths.
+        depth_times (list): Seconds from the start until each depth completed.
+        depth_nodes (list): Nodes searched by the end of each completed depth.
+        cutoffs (int): Beta cutoffs.
+        first_move_cutoffs (int): Cutoffs caused by the first move searched;
+                                  the higher the share, the better the move ordering.
+        tt_probes (int): Transposition table lookups.
+        tt_hits (int): Lookups that found the position.
+        null_cutoffs (int): Nodes cut off by null-move pruning.
+        pawn_probes (int): Pawn hash table lookups (see chess/pawns.py).
+        pawn_hits (int): Pawn structure scores found in the pawn hash table.
+        tb_hits (int): Positions scored by the endgame tablebases.
+        movegen_time (float): Seconds in move generation, or None when the
+                              search was not run with timing.
+        eval_time (float): Seconds in static evaluation, or None likewise.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.elapsed = 0.0
+        self.depths = []
+        self.depth_times = []
+        self.depth_nodes = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.null_cutoffs = 0
+        self.pawn_probes = 0
+        self.pawn_hits = 0
+        self.tb_hits = 0
+        self.movegen_time = None
+        self.eval_time = None
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def branching_factor(self):
+        """ Effective branching factor: nodes of the last completed iteration over those of the one before. """
+        counts = [b - a for a, b in zip([0] + self.depth_nodes, self.depth_nodes)]
+        if len(counts) < 2 or not counts[-2]:
+            return None
+        return counts[-1] / counts[-2]
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else None
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else None
+
+    @property
+    def pawn_hit_rate(self):
+        return self.pawn_hits / self.pawn_probes if self.pawn_probes else None
+
+    def as_dict(self):
+        """ The statistics, derived rates included, as a plain dict. """
+        stats = dict(vars(self))
+        for name in ('nps', 'branching_factor', 'first_move_cutoff_rate', 'tt_hit_rate', 'pawn_hit_rate'):
+            stats[name] = getattr(self, name)
+        return stats
+
+    def report(self):
+        """ The statistics as lines of text. """
+        def rate(value):
+            return f"{value:.1%}" if value is not None else '-'
+
+        def share(seconds):
+            return rate(seconds / self.elapsed if self.elapsed else None)
+
+        lines = [
+            f"nodes {self.nodes} (quiescence {self.qnodes}, {rate(self.qnodes / self.nodes if self.nodes else None)})"
+            f"  time {self.elapsed:.3f}s  nps {self.nps:.0f}",
+            f"cutoffs {self.cutoffs}  first move {rate(self.first_move_cutoff_rate)}"
+            f"  null move {self.null_cutoffs}  branching factor {self.branching_factor or 0:.2f}",
+            f"tt probes {self.tt_probes}  hits {rate(self.tt_hit_rate)}  pawn hash hits {rate(self.pawn_hit_rate)}"
+            f"  tablebase hits {self.tb_hits}",
+        ]
+        if self.movegen_time is not None:
+            lines.append(f"move generation {self.movegen_time:.3f}s ({share(self.movegen_time)})"
+                         f"  evaluation {self.eval_time:.3f}s ({share(self.eval_time)})")
+        previous = 0
+        for depth, at, nodes in zip(self.depths, self.depth_times, self.depth_nodes):
+            lines.append(f"depth {depth:>2}  time {at:.3f}s  nodes {nodes} (+{nodes - previous})")
+            previous = nodes
+        return lines
+
+
+def principal_variation(board, tt, max_length=MAX_DEPTH):
+    """
+    Follow the best moves stored in the transposition table from `board`.
+
+    The walk stops at a missing or illegal entry (a key collision) or when a
+    position repeats.
+
+    Returns:
+        list of int: The expected line of play, starting with the best move.
+    """
+    line = []
+    seen = set()
+    while len(line) < max_length and board.key not in seen:
+        seen.add(board.key)
+        entry = tt.probe(board.key)
+        if entry is None or not entry[0]:
+            break
+        move = entry[0]
+        if move not in generate_legal_moves(board, board.side):
+            break
+        board.make_move(move)
+        line.append(move)
+    for _ in line:
+        board.unmake_move()
+    return line
 
 
-def search_best_move(board, depth, is_white_turn, endgame=False):
+def aspiration_search(board, depth, previous, state):
     """
-    Searches for the best move using Minimax with Alpha-Beta pruning.
+    Search the root to `depth` in a window around the previous iteration's score.
+
+    A score outside the window only bounds the true score, so the search is
+    repeated with the window widened on that side until the score falls inside.
 
     Args:
-        board (list): The current state of the chessboard.
-        depth (int): The depth limit for the search.
+        board (Position): The root position.
+        depth (int): Depth of this iteration.
+        previous (float): Score of the previous iteration (side to move's view),
+                          or None to search with an open window.
+        state (SearchState): The search bookkeeping.
+
+    Returns:
+        float: The score, from the side to move's point of view.
+    """
+    if previous is None or depth < ASPIRATION_MIN_DEPTH or abs(previous) >= MATE_THRESHOLD:
+        return negamax(board, depth, -INFINITY, INFINITY, state)
+    delta = ASPIRATION_WINDOW
+    alpha, beta = previous - delta, previous + delta
+    while True:
+        score = negamax(board, depth, alpha, beta, state)
+        if score <= alpha:
+            alpha = score - delta
+        elif score >= beta:
+            beta = score + delta
+        else:
+            return score
+        delta *= 2
+        if delta > ASPIRATION_MAX:
+            alpha, beta = -INFINITY, INFINITY
+
+
+def _cache_keys(board, plies=CACHE_PLIES):
+    """ Keys of the positions at most `plies` legal moves from `board`, the root first. """
+    keys = [board.key]
+    if plies > 0:
+        for move in generate_legal_moves(board, board.side):
+            board.make_move(move)
+            keys.extend(_cache_keys(board, plies - 1))
+            board.unmake_move()
+    return list(dict.fromkeys(keys))
+
+
+def load_cache(board, tt, cache, keys):
+    """
+    Copy the cached results for `keys` into the transposition table, where
+    they are deeper than what the table holds.
+
+    Returns:
+        tuple or None: The cached (move, depth, bound, score) of the root (keys[0]).
+    """
+    found = cache.probe_many(keys)
+    for key, (move, depth, bound, score) in found.items():
+        entry = tt.probe(key)
+        if entry is None or entry[1] < depth:
+            tt.store(key, move, depth, bound, score)
+    return found.get(keys[0])
+
+
+def save_cache(tt, cache, keys):
+    """ Write the transposition table's results for `keys` to the cache, leaving out shallow ones. """
+    entries = []
+    for key in keys:
+        entry = tt.probe(key)
+        if entry is not None and entry[1] >= CACHE_MIN_DEPTH:
+            entries.append((key,) + entry)
+    cache.store_many(entries)
+
+
+def iterative_deepening(board, depth=None, tt=None, movetime_ms=None, max_nodes=None,
+                        start_depth=1, stop_event=None, root_seed=None, on_iteration=None, timing=False,
+                        backend=EVAL_CLASSIC):
+    """
+    Search at depth start_depth, start_depth + 1, ... within the given limits.
+
+    Args:
+        board (Position): The position to search; restored on return.
+        depth (int): Maximum depth, or None for no depth limit.
+        tt (TranspositionTable): Table to use; defaults to the shared table.
+        movetime_ms (int): Wall-clock budget in milliseconds.
+        max_nodes (int): Node budget.
+        start_depth (int): First depth to search.
+        stop_event: Optional threading/multiprocessing Event; the search stops
+                    soon after it is set.
+        root_seed (int): When given, root moves after the first are searched in a
+                         shuffled order (used by parallel helper searches).
+        on_iteration (callable): Called with the SearchResult (nodes, elapsed
+                                 and stats up to date) after every completed
+                                 iteration, with the board at the root.
+        timing (bool): Also measure the time spent in move generation and
+                       evaluation (see SearchStats). This slows the search down.
+        backend (str): Static evaluation, EVAL_CLASSIC or EVAL_NNUE (see
+                       evaluation_function).
+
+    With an analysis cache set (see set_analysis_cache) the cached results
+    near the root are loaded into the table first. An exact cached result
+    for the root counts as a completed iteration at its depth: it is returned
+    at once when that reaches `depth`, and otherwise the search continues from
+    the next depth. Helper searches (with `root_seed`) and searches with
+    another backend than EVAL_CLASSIC leave the cache alone, since its scores
+    come from the classic evaluation. For the same reason the transposition
+    table is cleared when the backend differs from the one that last used it.
+
+    Returns:
+        SearchResult: The result of the deepest completed iteration.
+    """
+    if tt is None:
+        tt = get_transposition_table()
+    if tt.evaluation != backend:
+        # Scores of another evaluation would give wrong cutoffs
+        if tt.evaluation is not None:
+            tt.clear()
+        tt.evaluation = backend
+    tt.new_search()
+
+    start = time.perf_counter()
+    deadline = start + movetime_ms / 1000 if movetime_ms is not None else None
+    state = SearchState(tt, deadline, max_nodes, len(board.history), stop_event, root_seed, timing,
+                        evaluation_function(backend))
+    sign = 1 if board.side == 0 else -1
+    max_depth = min(depth, MAX_DEPTH) if depth is not None else MAX_DEPTH
+
+    cache = _analysis_cache if root_seed is None and backend == EVAL_CLASSIC else None
+    cached = None
+    if cache is not None:
+        cache_keys = _cache_keys(board)
+        cached = load_cache(board, tt, cache, cache_keys)
+    counters = (tt.probes, tt.hits, PAWN_TABLE.probes, PAWN_TABLE.hits)
+
+    result = SearchResult()
+    score = None
+    if (cached is not None and cached[2] == BOUND_EXACT
+            and cached[0] in generate_legal_moves(board, board.side)):
+        move, cached_depth, _, tt_score = cached
+        score = score_from_tt(tt_score, 0)
+        result.best_eval, result.best_move = score * sign, move
+        result.depth = cached_depth
+        result.depth_times.append(time.perf_counter() - start)
+        result.depth_moves.append(move)
+        result.stats.depths.append(cached_depth)
+        result.stats.depth_nodes.append(0)
+        state.can_stop = True
+        start_depth = max(start_depth, cached_depth + 1)
+        if on_iteration is not None:
+            _update_result(result, state, tt, start, counters)
+            on_iteration(result)
+
+    for iteration_depth in range(min(start_depth, max_depth), max_depth + 1):
+        if iteration_depth <= result.depth:
+            break  # The cached result is deep enough
+        state.root_move = None
+        try:
+            score = aspiration_search(board, iteration_depth, score, state)
+        except SearchTimeout:
+            # Unwind the moves (and null moves) the aborted iteration left on the board
+            while len(board.history) > state.root_ply:
+                if board.history[-1][0]:
+                    board.unmake_move()
+                else:
+                    board.unmake_null_move()
+            break
+        move = state.root_move
+        result.best_eval, result.best_move = score * sign, move
+        result.depth = iteration_depth
+        result.depth_times.append(time.perf_counter() - start)
+        result.depth_moves.append(move)
+        result.stats.depths.append(iteration_depth)
+        result.stats.depth_nodes.append(state.nodes)
+        state.can_stop = True
+        if on_iteration is not None:
+            _update_result(result, state, tt, start, counters)
+            on_iteration(result)
+        if move is None:
+            break  # No legal moves
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+    _update_result(result, state, tt, start, counters)
+    if cache is not None:
+        save_cache(tt, cache, cache_keys)
+    return result
+
+
+def _update_result(result, state, tt, start, counters):
+    """ Copy the counters of a search into its result; `counters` are the hash table counters before it. """
+    tt_probes, tt_hits, pawn_probes, pawn_hits = counters
+    result.nodes = state.nodes
+    result.elapsed = time.perf_counter() - start
+    stats = result.stats
+    stats.nodes = state.nodes
+    stats.qnodes = state.qnodes
+    stats.elapsed = result.elapsed
+    stats.depth_times = result.depth_times
+    stats.cutoffs = state.cutoffs
+    stats.first_move_cutoffs = state.first_move_cutoffs
+    stats.null_cutoffs = state.null_cutoffs
+    stats.tt_probes = tt.probes - tt_probes
+    stats.tt_hits = tt.hits - tt_hits
+    stats.pawn_probes = PAWN_TABLE.probes - pawn_probes
+    stats.pawn_hits = PAWN_TABLE.hits - pawn_hits
+    stats.tb_hits = state.tb_hits
+    if state.timing:
+        stats.movegen_time = state.movegen_time
+        stats.eval_time = state.eval_time
+
+
+def search_best_move(board, depth=None, is_white_turn=None, tt=None, movetime_ms=None, max_nodes=None,
+                     stats=False, backend=EVAL_CLASSIC):
+    """
+    Searches for the best move using iterative deepening Minimax with Alpha-Beta pruning.
+
+    Depth 1, 2, 3, ... are searched in turn until the depth limit is reached or
+    the time or node budget runs out; the move of the deepest completed
+    iteration is returned. Each iteration starts with the previous iteration's
+    best move, and results are kept in a transposition table, so positions
+    reached again by a different move order, or in a later call, are not
+    searched twice.
+
+    Args:
+        board (list or Position): The current state of the chessboard. A list board
+                                  is converted to a Position first.
+        depth (int): Maximum depth to search. None means no depth limit.
         is_white_turn (bool): True if it's white's turn, False if it's black's turn.
-        endgame (bool): True if it's an endgame position.
+                              For a Position it defaults to (and must match)
+                              the side to move.
+        tt (TranspositionTable): Table to use; defaults to the shared table.
+        movetime_ms (int): Wall-clock budget in milliseconds.
+        max_nodes (int): Node budget.
+        stats (bool): Also return the SearchStats of the search.
+        backend (str): Static evaluation: EVAL_CLASSIC (evaluate_board) or
+                       EVAL_NNUE (the network loaded with chess.nnue.load_network).
 
     Returns:
-        tuple: The best move (start_pos, end_pos).
+        tuple: The best evaluation and the best move, plus the SearchStats when
+               `stats` is set. The move is an int for a Position, or
+               (start_pos, end_pos) when a list board was passed in.
     """
-    if is_white_turn:
-        best_eval, best_move = minimax(board, depth, -INFINITY, INFINITY, True, 'white', endgame)
+    if depth is None and movetime_ms is None and max_nodes is None:
+        raise ValueError("search_best_move needs a depth, movetime_ms or max_nodes limit")
+
+    if not isinstance(board, Position):
+        if is_white_turn is None:
+            is_white_turn = True
+        position = Position.from_board(board, 'white' if is_white_turn else 'black')
+        found = search_best_move(position, depth, is_white_turn, tt, movetime_ms, max_nodes, stats, backend)
+        best_move = move_to_tuple(found[1]) if found[1] is not None else None
+        return (found[0], best_move) + found[2:]
+
+    if is_white_turn is not None and is_white_turn != (board.side == 0):
+        raise ValueError("is_white_turn does not match the side to move of the position")
+
+    result = iterative_deepening(board, depth, tt, movetime_ms, max_nodes, backend=backend)
+    if stats:
+        return result.best_eval, result.best_move, result.stats
+    return result.best_eval, result.best_move
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search one position and report search statistics.")
+    parser.add_argument("--fen", default=STARTING_FEN, help="position to search (default: starting position)")
+    parser.add_argument("--depth", type=int, help="depth limit")
+    parser.add_argument("--movetime", type=int, help="time limit in milliseconds")
+    parser.add_argument("--nodes", type=int, help="node limit")
+    parser.add_argument("--hash", type=int, default=DEFAULT_HASH_MB, metavar="MB", help="transposition table size")
+    parser.add_argument("--cache", metavar="FILE", help="persistent analysis cache to consult and update")
+    parser.add_argument("--eval", choices=EVAL_BACKENDS, default=EVAL_CLASSIC, help="static evaluation backend")
+    parser.add_argument("--network", metavar="FILE", help="NNUE weight file for --eval nnue (see chess/nnue.py)")
+    parser.add_argument("--timing", action="store_true", help="time move generation and evaluation (slower)")
+    parser.add_argument("--trace", action="store_true", help="print a line after every completed depth")
+    parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="run under cProfile and print the top functions, or save the profile to FILE")
+    args = parser.parse_args(argv)
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.depth = 4
+    if args.eval == EVAL_NNUE and not args.network:
+        parser.error("--eval nnue needs a --network weight file")
+
+    position = Position.from_fen(args.fen)
+    tt = set_hash_size(args.hash)
+    cache = set_analysis_cache(args.cache)
+    if args.network:
+        load_network(args.network)
+
+    def trace(result):
+        print(f"depth {result.depth:>2}  eval {result.best_eval:+.2f}  move {move_to_uci(result.best_move)}  "
+              f"nodes {result.nodes}  time {result.elapsed:.3f}s")
+
+    def run():
+        return iterative_deepening(position, args.depth, tt, args.movetime, args.nodes,
+                                   on_iteration=trace if args.trace else None, timing=args.timing,
+                                   backend=args.eval)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run)
+        if args.profile == '-':
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+        else:
+            profiler.dump_stats(args.profile)
     else:
-        best_eval, best_move = minimax(board, depth, -INFINITY, INFINITY, False, 'black', endgame)
-    
-    return best_eval, best_move
\ No newline at end of file
+        result = run()
+
+    best_move = move_to_uci(result.best_move) if result.best_move is not None else '-'
+    print(f"best move {best_move}  eval {result.best_eval:+.2f}  depth {result.depth}")
+    for line in result.stats.report():
+        print(line)
+    if cache is not None:
+        print(f"  analysis cache {cache.stats()['entries']} entries, {cache.hits} of {cache.probes} positions found")
+        cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
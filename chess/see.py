@@ -0,0 +1,68 @@
+# chess/see.py
+
+from chess.bitboard import PAWN, KING
+from chess.evaluation import PIECE_VALUES
+
+# Piece values (P, N, B, R, Q, K) for exchanges. The king is worth more than
+# everything else combined, so it only recaptures as the last attacker.
+SEE_VALUES = [PIECE_VALUES[piece_type] for piece_type in 'PNBRQ'] + [100]
+
+
+def static_exchange_evaluation(position, move):
+    """
+    Material balance of the capture sequence started by `move` on its target square.
+
+    Both sides keep recapturing with their least valuable attacker and may
+    stop whenever continuing would lose material. Sliders hidden behind a
+    piece that has captured (x-rays) join in as the square is cleared.
+
+    Args:
+        position (Position): The position before the move.
+        move (int): A capture or promotion.
+
+    Returns:
+        float: Material won (positive) or lost (negative) by the side making
+               the move, in pawns.
+    """
+    from_square = move & 63
+    to_square = (move >> 6) & 63
+    promotion = move >> 12
+    squares = position.squares
+    pieces = position.pieces
+
+    gain = [0.0] * 34
+    victim = squares[to_square]
+    gain[0] = SEE_VALUES[victim % 6] if victim is not None else 0
+    attacker = squares[from_square]
+    side = attacker // 6
+    on_square = SEE_VALUES[attacker % 6]
+    if promotion:
+        gain[0] += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+        on_square = SEE_VALUES[promotion]
+
+    occupied = position.occupancy[2] ^ (1 << from_square)
+    depth = 0
+    while True:
+        side ^= 1
+        attackers = position.attackers_to(to_square, side, occupied) & occupied
+        if not attackers:
+            break
+        # Least valuable attacker of the side to recapture
+        for piece_type in range(6):
+            candidates = attackers & pieces[side * 6 + piece_type]
+            if candidates:
+                break
+        depth += 1
+        gain[depth] = on_square - gain[depth - 1]
+        if max(-gain[depth - 1], gain[depth]) < 0:
+            break  # Neither side can improve by continuing
+        if piece_type == KING and position.attackers_to(to_square, side ^ 1, occupied) & occupied:
+            depth -= 1  # The king cannot recapture onto a defended square
+            break
+        occupied ^= candidates & -candidates
+        on_square = SEE_VALUES[piece_type]
+
+    while depth:
+        gain[depth - 1] = -max(-gain[depth - 1], gain[depth])
+        depth -= 1
+    return gain[0]
@@ -0,0 +1,397 @@
+# chess/service.py
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from chess.position import Position
+from chess.notation import move_to_uci, move_to_san
+from chess.search import (
+    iterative_deepening, principal_variation, get_transposition_table, set_hash_size, set_tablebase_path,
+    set_analysis_cache,
+    DEFAULT_HASH_MB, MAX_DEPTH,
+)
+from chess.uci import format_score
+
+# A long-lived analysis server. Clients POST JSON to /analyse:
+#
+#   {"fen": "<fen>", "depth": 8, "movetime": 1000, "nodes": 100000, "timeout": 5000}
+#
+# or a JSON array of such objects to analyse a batch in one round trip, and
+# GET /stats for queue depth and latency percentiles. Searches run in a pool
+# of worker processes. Each worker keeps its transposition table between
+# requests, so positions from the same game, or ones analysed before, start
+# from a warm table. Identical requests that arrive while one is already
+# being searched share its result instead of being searched again.
+
+DEFAULT_PORT = 8765
+DEFAULT_MOVETIME_MS = 1000
+MAX_MOVETIME_MS = 600000
+MAX_BODY_BYTES = 1 << 20
+
+# A request's timeout also limits its search, to this share of the timeout
+# less an allowance for queueing and the round trip to the worker process, so
+# that the result arrives before the client gives up
+TIMEOUT_SEARCH_SHARE = 0.75
+TIMEOUT_OVERHEAD_MS = 50
+
+# Latencies kept for the percentiles reported by /stats
+LATENCY_WINDOW = 1000
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    """ An invalid request; reported to the client with an HTTP status. """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(hash_mb, tablebase_path, cache_path):
+    set_hash_size(hash_mb)
+    if tablebase_path:
+        set_tablebase_path(tablebase_path)
+    if cache_path:
+        set_analysis_cache(cache_path)
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def analyse_position(fen, depth=None, movetime_ms=None, max_nodes=None):
+    """
+    Search one position in a worker process, with the worker's warm table.
+
+    Returns:
+        dict: fen, bestmove (UCI) and san, score ('cp N' or 'mate N' from the
+              side to move, as in UCI), eval (pawns, white's view), depth,
+              nodes, time (seconds), pv (UCI moves) and the worker's pid.
+    """
+    position = Position.from_fen(fen)
+    tt = get_transposition_table()
+    result = iterative_deepening(position, depth, tt, movetime_ms, max_nodes)
+    best_move = result.best_move
+    pv = principal_variation(position, tt, max(result.depth, 1)) if best_move is not None else []
+    if best_move is not None and (not pv or pv[0] != best_move):
+        pv = [best_move]
+    return {
+        'fen': fen,
+        'bestmove': move_to_uci(best_move) if best_move is not None else None,
+        'san': move_to_san(position, best_move) if best_move is not None else None,
+        'score': format_score(result.best_eval, position.side) if result.best_eval is not None else None,
+        'eval': result.best_eval,
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'time': result.elapsed,
+        'pv': [move_to_uci(move) for move in pv],
+        'worker': os.getpid(),
+    }
+
+
+def parse_request(request):
+    """
+    Validate one analysis request.
+
+    Returns:
+        tuple: (key, timeout) where key = (fen, depth, movetime_ms, max_nodes)
+               identifies identical searches and timeout is in seconds or None.
+    """
+    if not isinstance(request, dict) or not isinstance(request.get('fen'), str):
+        raise RequestError("Each request needs a 'fen' string")
+    try:
+        # Normalized, so that the same position written differently is one search
+        fen = Position.from_fen(request['fen']).to_fen()
+    except (ValueError, IndexError) as error:
+        raise RequestError(f"Invalid FEN: {error}")
+
+    limits = []
+    for name, maximum in (('depth', MAX_DEPTH), ('movetime', MAX_MOVETIME_MS), ('nodes', None)):
+        value = request.get(name)
+        if value is not None:
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise RequestError(f"'{name}' must be a positive integer")
+            if maximum is not None:
+                value = min(value, maximum)
+        limits.append(value)
+    depth, movetime_ms, max_nodes = limits
+    if depth is None and movetime_ms is None and max_nodes is None:
+        movetime_ms = DEFAULT_MOVETIME_MS
+
+    timeout = request.get('timeout')
+    if timeout is not None:
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            raise RequestError("'timeout' must be a positive number of milliseconds")
+        timeout = timeout / 1000
+    return (fen, depth, movetime_ms, max_nodes), timeout
+
+
+def search_movetime(movetime_ms, timeout):
+    """
+    The movetime to search with: the requested one, cut down to fit a
+    timeout (seconds) with time to spare for getting the result back.
+    """
+    if timeout is None:
+        return movetime_ms
+    budget = max(1, int(timeout * 1000 * TIMEOUT_SEARCH_SHARE - TIMEOUT_OVERHEAD_MS))
+    return min(movetime_ms, budget) if movetime_ms is not None else budget
+
+
+def percentile(sorted_values, fraction):
+    """ The value at `fraction` (0 to 1) of a sorted list, by nearest rank. """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class AnalysisService:
+    """
+    Dispatches analysis requests to a pool of worker processes.
+
+    Searches are identified by (fen, depth, movetime, nodes). While one is
+    running, identical requests wait for the same result (deduplication).
+    A request's timeout bounds how long that client waits; the search it
+    starts gets a movetime that fits in the timeout (see search_movetime).
+    A request that joins a running search gets that search's result, limited
+    by the timeout of the request that started it. When the last client
+    waiting for a search
+    times out, a search that has not started yet is cancelled; one already
+    running finishes within its movetime.
+    """
+
+    def __init__(self, workers=None, hash_mb=DEFAULT_HASH_MB, tablebase_path=None, cache_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Spawned, not forked: the event loop process may already run threads
+        context = multiprocessing.get_context('spawn')
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(hash_mb, tablebase_path, cache_path))
+        # Start the workers up front so the first requests do not wait for them
+        wait([self._pool.submit(_worker_ready) for _ in range(self.workers)])
+        self._in_flight = {}
+        self._waiting = {}  # Clients waiting for each in-flight key
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.requests = 0
+        self.searches = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def analyse(self, request):
+        """ Analyse one request dict; returns the result dict (see analyse_position). """
+        start = time.perf_counter()
+        self.requests += 1
+        key, timeout = parse_request(request)
+        future = self._in_flight.get(key)
+        if future is None:
+            self.searches += 1
+            fen, depth, movetime_ms, max_nodes = key
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, analyse_position, fen, depth, search_movetime(movetime_ms, timeout), max_nodes)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.deduplicated += 1
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            # Shielded: one client giving up must not cancel the search for the others
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if self._waiting[key] == 1 and not future.done():
+                # Nobody is left waiting: drop the search if a worker has not picked it up yet
+                self._forget(key, future)
+                future.cancel()
+            raise RequestError(f"No result within {timeout * 1000:.0f} ms", 504)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+        self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def _forget(self, key, future):
+        """ Remove a search from the in-flight table, unless a newer one has taken its place. """
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def analyse_batch(self, requests):
+        """ Analyse a list of requests concurrently; failed entries hold an 'error' instead of a result. """
+        outcomes = await asyncio.gather(*(self.analyse(request) for request in requests), return_exceptions=True)
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, RequestError):
+                results.append({'error': str(outcome), 'status': outcome.status})
+            elif isinstance(outcome, BaseException):
+                self.errors += 1
+                results.append({'error': f"{type(outcome).__name__}: {outcome}", 'status': 500})
+            else:
+                results.append(outcome)
+        return results
+
+    def stats(self):
+        """ Queue depth, request counters and latency percentiles (milliseconds) of recent requests. """
+        latencies = sorted(self._latencies)
+        return {
+            'workers': self.workers,
+            'uptime': time.time() - self.started,
+            'in_flight': len(self._in_flight),
+            'queued': max(0, len(self._in_flight) - self.workers),
+            'requests': self.requests,
+            'searches': self.searches,
+            'deduplicated': self.deduplicated,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'latency_ms': {name: (value * 1000 if value is not None else None)
+                           for name, value in (('p50', percentile(latencies, 0.5)),
+                                               ('p90', percentile(latencies, 0.9)),
+                                               ('p99', percentile(latencies, 0.99)),
+                                               ('max', latencies[-1] if latencies else None))},
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def _read_request(reader):
+    """ Read one HTTP request; returns (method, path, headers, body) or None at end of stream. """
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise RequestError("Malformed request line")
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0) or 0)
+    except ValueError:
+        raise RequestError("Invalid Content-Length")
+    if length < 0:
+        raise RequestError("Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise RequestError("Request body too large", 413)
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def handle_connection(service, reader, writer):
+    """ Serve HTTP requests on one connection (keep-alive) until the client closes it. """
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if path == '/stats':
+                    status, payload = 200, service.stats()
+                elif path != '/analyse':
+                    raise RequestError(f"Unknown path {path}", 404)
+                elif method != 'POST':
+                    raise RequestError("Use POST for /analyse", 405)
+                else:
+                    try:
+                        data = json.loads(body or b'null')
+                    except ValueError as error:
+                        raise RequestError(f"Invalid JSON: {error}")
+                    if isinstance(data, list):
+                        status, payload = 200, await service.analyse_batch(data)
+                    else:
+                        status, payload = 200, await service.analyse(data)
+            except RequestError as error:
+                status, payload = error.status, {'error': str(error)}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as error:
+                # A failed search: reported like the failed entries of a batch
+                service.errors += 1
+                status, payload = 500, {'error': f"{type(error).__name__}: {error}"}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=None, hash_mb=DEFAULT_HASH_MB, tablebase_path=None,
+                cache_path=None):
+    """ Run the analysis service until cancelled. """
+    service = AnalysisService(workers, hash_mb, tablebase_path, cache_path)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer),
+                                        host, port)
+    print(f"analysis service on http://{host}:{port} with {service.workers} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def request_analysis(fen, depth=None, movetime_ms=None, max_nodes=None, timeout_ms=None,
+                     host='127.0.0.1', port=DEFAULT_PORT):
+    """
+    Ask a running service to analyse a position (a small blocking client).
+
+    Returns:
+        dict: The result, as returned by analyse_position.
+    """
+    request = {'fen': fen}
+    for name, value in (('depth', depth), ('movetime', movetime_ms), ('nodes', max_nodes), ('timeout', timeout_ms)):
+        if value is not None:
+            request[name] = value
+    http_request = urllib.request.Request(f"http://{host}:{port}/analyse", data=json.dumps(request).encode(),
+                                          headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(http_request) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the engine as a local JSON-over-HTTP analysis service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, help="number of search processes (default: one per CPU)")
+    parser.add_argument("--hash", type=int, default=DEFAULT_HASH_MB, metavar="MB",
+                        help="transposition table size per worker")
+    parser.add_argument("--tablebases", metavar="DIR", help="endgame tablebase directory")
+    parser.add_argument("--cache", metavar="FILE", help="persistent analysis cache shared by the workers")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.hash, args.tablebases, args.cache))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,589 @@
+# chess/tablebase.py
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from chess.bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_TYPES,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rook_attacks, bishop_attacks, queen_attacks,
+    iter_squares,
+)
+
+# Endgame tablebases: for every placement of a small set of pieces, the exact
+# outcome with best play and the distance to mate (DTM) in plies.
+#
+# A table covers one material signature, such as "KQvK" (white has king and
+# queen, black a bare king). Positions where black has the stronger material
+# are probed by swapping the colors. Each table file holds a 16 byte header
+#
+#   magic       4 bytes  b'BBTB'
+#   version     uint8
+#   pieces      uint8    number of pieces
+#   signature   10 bytes ASCII, zero padded
+#
+# followed by one byte per position (see encode_value). Castling rights, en
+# passant and the fifty-move rule are ignored.
+#
+# Positions are indexed by side to move, then the square of every piece: the
+# white king first, then the black king, then the other white and black
+# pieces in signature order. Symmetric positions have the same value, so only
+# one representative of each is stored: without pawns the board may be
+# mirrored and rotated, which puts the white king on one of the 10 squares of
+# the a1-d1-d4 triangle; with pawns only the left-right mirror applies, which
+# puts the white king on files a-d.
+
+MAGIC = b'BBTB'
+VERSION = 1
+HEADER_FORMAT = '<4sBB10s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)  # 16
+FILE_SUFFIX = '.bbtb'
+
+# Signature letters, strongest first
+SIGNATURE_ORDER = 'QRBNP'
+_LETTER_VALUES = {'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+
+# Endgames generated by default; each table needs the ones reachable from it
+# by a capture or promotion, which are generated first
+DEFAULT_SIGNATURES = ['KQvK', 'KRvK', 'KPvK', 'KBNvK']
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+
+def encode_value(wdl, plies):
+    """
+    Pack a result for the side to move into one byte.
+
+    0 is a draw (or an unreachable position), an odd byte is a win in that
+    many plies and an even byte b >= 2 is a loss in b - 2 plies (2 means the
+    side to move is checkmated).
+    """
+    if wdl == WIN:
+        return plies
+    if wdl == LOSS:
+        return plies + 2
+    return 0
+
+
+def decode_value(value):
+    """ Unpack a table byte into (wdl, plies), wdl being WIN, DRAW or LOSS for the side to move. """
+    if value == 0:
+        return DRAW, 0
+    if value & 1:
+        return WIN, value
+    return LOSS, value - 2
+
+
+# The eight symmetries of the board as square maps: optionally transpose
+# (swap row and col), then optionally flip the rows, then the cols
+def _symmetries():
+    maps = []
+    for transpose in (False, True):
+        for flip_rows in (False, True):
+            for flip_cols in (False, True):
+                table = []
+                for square in range(64):
+                    row, col = square >> 3, square & 7
+                    if transpose:
+                        row, col = col, row
+                    if flip_rows:
+                        row = 7 - row
+                    if flip_cols:
+                        col = 7 - col
+                    table.append(row * 8 + col)
+                maps.append(table)
+    return maps
+
+
+SYMMETRIES = _symmetries()
+MIRROR_FILES = SYMMETRIES[1]
+
+TRIANGLE = [square for square in range(64) if (square & 7) <= 3 and (square >> 3) <= (square & 7)]
+HALF_BOARD = [square for square in range(64) if (square & 7) <= 3]
+_TRIANGLE_SLOT = [TRIANGLE.index(square) if square in TRIANGLE else -1 for square in range(64)]
+_HALF_SLOT = [HALF_BOARD.index(square) if square in HALF_BOARD else -1 for square in range(64)]
+
+# For each white king square, the symmetries that bring it into the stored region
+_PAWNLESS_CANDIDATES = [[t for t in SYMMETRIES if _TRIANGLE_SLOT[t[square]] >= 0] for square in range(64)]
+_PAWN_CANDIDATES = [[t for t in (SYMMETRIES[0], MIRROR_FILES) if _HALF_SLOT[t[square]] >= 0] for square in range(64)]
+
+
+def split_signature(signature):
+    """ 'KBNvK' -> ('KBN', 'K') """
+    white, _, black = signature.partition('v')
+    return white, black
+
+
+def _side_strength(letters):
+    return sum(_LETTER_VALUES.get(letter, 0) for letter in letters), sorted(5 - SIGNATURE_ORDER.index(letter) for letter in letters[1:])
+
+
+def _side_letters(types):
+    return 'K' + ''.join(sorted((PIECE_TYPES[t] for t in types if t != KING), key=SIGNATURE_ORDER.index))
+
+
+def normalize_signature(white, black):
+    """
+    Table signature for the given white and black letters, strongest side first.
+
+    Returns:
+        tuple: (signature, swapped) where swapped tells that the colors had to be
+               exchanged to put the stronger side first.
+    """
+    if _side_strength(black) > _side_strength(white):
+        return f"{black}v{white}", True
+    return f"{white}v{black}", False
+
+
+def is_trivial_draw(signature):
+    """ True for material that can never mate: bare kings or a single minor piece. """
+    return signature in ('KvK', 'KBvK', 'KNvK')
+
+
+def dependencies(signature):
+    """ Signatures reachable from `signature` by one capture or promotion, excluding trivial draws. """
+    white, black = split_signature(signature)
+    found = set()
+    sides = [white, black]
+    for color in (WHITE, BLACK):
+        own, other = sides[color], sides[color ^ 1]
+        # Captures by the other side remove one of our pieces
+        for index in range(1, len(own)):
+            reduced = own[:index] + own[index + 1:]
+            found.add(normalize_signature(*((reduced, other) if color == WHITE else (other, reduced)))[0])
+        # Promotions replace one of our pawns
+        if 'P' in own:
+            index = own.index('P')
+            for letter in 'QRBN':
+                promoted = _side_letters([PIECE_TYPES.index(c) for c in own[:index] + letter + own[index + 1:]])
+                found.add(normalize_signature(*((promoted, other) if color == WHITE else (other, promoted)))[0])
+    return sorted(s for s in found if not is_trivial_draw(s))
+
+
+class TableLayout:
+    """ Index arithmetic for one material signature. """
+
+    def __init__(self, signature):
+        white, black = split_signature(signature)
+        self.signature = signature
+        self.pieces = ([(WHITE, KING), (BLACK, KING)]
+                       + [(WHITE, PIECE_TYPES.index(letter)) for letter in white[1:]]
+                       + [(BLACK, PIECE_TYPES.index(letter)) for letter in black[1:]])
+        self.count = len(self.pieces)
+        self.has_pawns = any(piece_type == PAWN for _, piece_type in self.pieces)
+        if self.has_pawns:
+            self.king_squares, self._slots, self._candidates = HALF_BOARD, _HALF_SLOT, _PAWN_CANDIDATES
+        else:
+            self.king_squares, self._slots, self._candidates = TRIANGLE, _TRIANGLE_SLOT, _PAWNLESS_CANDIDATES
+        self.side_size = len(self.king_squares) * 64 ** (self.count - 1)
+        self.size = 2 * self.side_size
+
+    def index(self, squares, side):
+        """ Index of the stored representative of a placement (squares in self.pieces order). """
+        slots = self._slots
+        best = None
+        for transform in self._candidates[squares[0]]:
+            index = slots[transform[squares[0]]]
+            for square in squares[1:]:
+                index = index * 64 + transform[square]
+            if best is None or index < best:
+                best = index
+        return side * self.side_size + best
+
+    def decode(self, index):
+        """ Inverse of index for stored representatives: (squares, side). """
+        side, index = divmod(index, self.side_size)
+        squares = [0] * self.count
+        for i in range(self.count - 1, 0, -1):
+            index, squares[i] = divmod(index, 64)
+        squares[0] = self.king_squares[index]
+        return squares, side
+
+
+def _attacks(color, piece_type, square, occupied):
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece_type == BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(square, occupied)
+    if piece_type == QUEEN:
+        return queen_attacks(square, occupied)
+    if piece_type == KING:
+        return KING_ATTACKS[square]
+    return PAWN_ATTACKS[color][square]
+
+
+def _in_check(pieces, squares, color):
+    """ Is the king of `color` attacked? pieces[0]/pieces[1] are the white/black kings. """
+    king = 1 << squares[color]
+    occupied = 0
+    for square in squares:
+        occupied |= 1 << square
+    for (piece_color, piece_type), square in zip(pieces, squares):
+        if piece_color != color and _attacks(piece_color, piece_type, square, occupied) & king:
+            return True
+    return False
+
+
+def _valid(layout, squares, side):
+    """ Distinct squares, no pawn on a back rank and the side not to move not in check. """
+    if len(set(squares)) != layout.count:
+        return False
+    for (_, piece_type), square in zip(layout.pieces, squares):
+        if piece_type == PAWN and not 8 <= square < 56:
+            return False
+    return not _in_check(layout.pieces, squares, side ^ 1)
+
+
+def _moves(pieces, squares, side):
+    """
+    Legal moves of `side` in a placement.
+
+    Yields:
+        tuple: (new pieces, new squares, changed) where changed tells that a
+               capture or promotion changed the material.
+    """
+    occupied = own = 0
+    for (color, _), square in zip(pieces, squares):
+        occupied |= 1 << square
+        if color == side:
+            own |= 1 << square
+    forward = 8 if side == WHITE else -8
+    for i, ((color, piece_type), square) in enumerate(zip(pieces, squares)):
+        if color != side:
+            continue
+        if piece_type == PAWN:
+            targets = PAWN_ATTACKS[side][square] & occupied & ~own
+            push = square + forward
+            if not occupied >> push & 1:
+                targets |= 1 << push
+                start_row = 1 if side == WHITE else 6
+                if square >> 3 == start_row and not occupied >> (push + forward) & 1:
+                    targets |= 1 << (push + forward)
+        else:
+            targets = _attacks(side, piece_type, square, occupied) & ~own
+        for target in iter_squares(targets):
+            new_pieces, new_squares = list(pieces), list(squares)
+            new_squares[i] = target
+            changed = False
+            if occupied >> target & 1:
+                captured = squares.index(target)
+                del new_pieces[captured], new_squares[captured]
+                changed = True
+            if _in_check(new_pieces, new_squares, side):
+                continue
+            if piece_type == PAWN and target >> 3 in (0, 7):
+                at = new_squares.index(target)
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    promoted = list(new_pieces)
+                    promoted[at] = (side, promotion)
+                    yield promoted, new_squares, True
+            else:
+                yield new_pieces, new_squares, changed
+
+
+def _unmoves(layout, squares, side):
+    """ Placements one non-capturing, non-promoting move before this one (the other side to move). """
+    mover = side ^ 1
+    occupied = 0
+    for square in squares:
+        occupied |= 1 << square
+    for i, ((color, piece_type), square) in enumerate(zip(layout.pieces, squares)):
+        if color != mover:
+            continue
+        if piece_type == PAWN:
+            back = -8 if mover == WHITE else 8
+            origins = []
+            start = square + back
+            if 8 <= start < 56 and not occupied >> start & 1:
+                origins.append(start)
+                double = start + back
+                if double >> 3 == (1 if mover == WHITE else 6) and not occupied >> double & 1:
+                    origins.append(double)
+        else:
+            origins = iter_squares(_attacks(mover, piece_type, square, occupied) & ~occupied)
+        for origin in origins:
+            previous = list(squares)
+            previous[i] = origin
+            if not _in_check(layout.pieces, previous, side):
+                yield previous
+
+
+class Tablebases:
+    """
+    Memory-mapped tablebase files, probed by Position.
+
+    Tables are found by file name (signature + FILE_SUFFIX) in the given
+    directories and mapped read-only; a probe reads a single byte.
+    """
+
+    def __init__(self, *directories):
+        self.tables = {}
+        self.max_pieces = 0
+        for directory in directories:
+            self.add_directory(directory)
+
+    def add_directory(self, directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(FILE_SUFFIX):
+                self.add_table(os.path.join(directory, name))
+
+    def add_table(self, path):
+        table_file = open(path, 'rb')
+        data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, signature = struct.unpack_from(HEADER_FORMAT, data)
+        signature = signature.rstrip(b'\0').decode('ascii')
+        layout = TableLayout(signature)
+        if magic != MAGIC or version != VERSION or len(data) != HEADER_SIZE + layout.size:
+            data.close()
+            table_file.close()
+            raise ValueError(f"{path} is not a version {VERSION} tablebase file")
+        self.tables[signature] = (layout, data, table_file)
+        self.max_pieces = max(self.max_pieces, count)
+
+    def probe_pieces(self, pieces, squares, side):
+        """
+        Look up a placement given as parallel lists of (color, type) and squares.
+
+        Returns:
+            tuple or None: (wdl, plies) for the side to move, or None when no
+                           table covers the material.
+        """
+        signature, swapped = normalize_signature(
+            _side_letters([t for c, t in pieces if c == WHITE]),
+            _side_letters([t for c, t in pieces if c == BLACK]))
+        if is_trivial_draw(signature):
+            return DRAW, 0
+        table = self.tables.get(signature)
+        if table is None:
+            return None
+        layout, data, _ = table
+        if swapped:
+            pieces = [(color ^ 1, piece_type) for color, piece_type in pieces]
+            squares = [square ^ 56 for square in squares]
+            side ^= 1
+        ordered = [0] * layout.count
+        used = [False] * len(pieces)
+        for slot, wanted in enumerate(layout.pieces):
+            for i, piece in enumerate(pieces):
+                if not used[i] and piece == wanted:
+                    used[i] = True
+                    ordered[slot] = squares[i]
+                    break
+        return decode_value(data[HEADER_SIZE + layout.index(ordered, side)])
+
+    def probe(self, position):
+        """
+        Look up a Position.
+
+        Returns:
+            tuple or None: (wdl, plies) for the side to move, or None if the
+                           position has castling rights or an en passant capture,
+                           or no table covers its material.
+        """
+        if position.castling:
+            return None
+        ep_square = position.ep_square
+        if ep_square is not None and PAWN_ATTACKS[position.side ^ 1][ep_square] & position.pieces[position.side * 6 + PAWN]:
+            return None
+        pieces, squares = [], []
+        for square, piece in enumerate(position.squares):
+            if piece is not None:
+                pieces.append(divmod(piece, 6))
+                squares.append(square)
+        if len(pieces) > self.max_pieces:
+            return None
+        return self.probe_pieces(pieces, squares, position.side)
+
+    def close(self):
+        for _, data, table_file in self.tables.values():
+            data.close()
+            table_file.close()
+        self.tables = {}
+
+
+def generate_table(signature, tables, progress=None):
+    """
+    Solve one endgame by retrograde analysis.
+
+    A forward pass over every stored position counts its legal moves that
+    stay inside the table and scores the ones that leave it (captures and
+    promotions) by probing `tables`. Checkmates start the backward pass, which
+    works outwards one ply at a time: a position with a move to a position
+    lost for the opponent is won one ply later, and a position whose every
+    move reaches a position won for the opponent is lost one ply after the
+    slowest of them. Positions never reached this way are draws.
+
+    Args:
+        signature (str): e.g. 'KRvK'.
+        tables (Tablebases): Tables for every signature in dependencies(signature).
+        progress (callable): Optional callback taking a status string.
+
+    Returns:
+        bytearray: One encoded value per index.
+    """
+    layout = TableLayout(signature)
+    size = layout.size
+    pieces = layout.pieces
+    values = bytearray(size)
+    resolved = bytearray(size)
+    remaining = bytearray(size)      # In-table successors not yet known to be won for the opponent
+    slowest = bytearray(size)        # Longest win for the opponent among the moves leaving the table
+    can_hold = bytearray(size)       # A move leaving the table draws or wins, so the position is not lost
+    win_level = bytearray(b'\xff') * size
+    buckets = {}
+
+    def schedule(level, index, wdl):
+        buckets.setdefault(level, array('Q')).append(index * 2 + (wdl == WIN))
+
+    start = time.perf_counter()
+    for index in range(size):
+        if progress is not None and index % 500000 == 0 and index:
+            progress(f"{signature}: scanned {index}/{size} in {time.perf_counter() - start:.0f}s")
+        squares, side = layout.decode(index)
+        if not _valid(layout, squares, side) or layout.index(squares, side) != index:
+            continue
+        children = set()
+        has_moves = False
+        best_win = None
+        for new_pieces, new_squares, changed in _moves(pieces, squares, side):
+            has_moves = True
+            if not changed:
+                children.add(layout.index(new_squares, side ^ 1))
+                continue
+            wdl, plies = tables.probe_pieces(new_pieces, new_squares, side ^ 1)
+            if wdl == LOSS:
+                if best_win is None or plies + 1 < best_win:
+                    best_win = plies + 1
+            elif wdl == DRAW:
+                can_hold[index] = 1
+            elif plies > slowest[index]:
+                slowest[index] = plies
+        if not has_moves:
+            if _in_check(pieces, squares, side):
+                schedule(0, index, LOSS)
+            else:
+                resolved[index] = 1  # Stalemate
+            continue
+        remaining[index] = len(children)
+        if best_win is not None:
+            win_level[index] = best_win
+            schedule(best_win, index, WIN)
+        if not children and not can_hold[index] and best_win is None:
+            schedule(slowest[index] + 1, index, LOSS)
+
+    level = 0
+    while buckets:
+        bucket = buckets.pop(level, None)
+        if bucket is not None:
+            for code in bucket:
+                index, wdl = code >> 1, WIN if code & 1 else LOSS
+                if resolved[index]:
+                    continue
+                resolved[index] = 1
+                values[index] = encode_value(wdl, level)
+                squares, side = layout.decode(index)
+                for previous in {layout.index(p, side ^ 1) for p in _unmoves(layout, squares, side)}:
+                    if resolved[previous]:
+                        continue
+                    if wdl == LOSS:
+                        if level + 1 < win_level[previous]:
+                            win_level[previous] = level + 1
+                            schedule(level + 1, previous, WIN)
+                    else:
+                        remaining[previous] -= 1
+                        if not remaining[previous] and not can_hold[previous] and win_level[previous] == 255:
+                            schedule(max(level, slowest[previous]) + 1, previous, LOSS)
+        if progress is not None and level % 10 == 0:
+            progress(f"{signature}: ply {level} done in {time.perf_counter() - start:.0f}s")
+        level += 1
+        if level > 253:
+            raise ValueError(f"{signature}: distance to mate does not fit in a byte")
+    if progress is not None:
+        progress(f"{signature}: solved in {time.perf_counter() - start:.0f}s, longest mate {level - 1} plies")
+    return values
+
+
+def write_table(path, signature, values):
+    with open(path, 'wb') as out:
+        out.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(signature) - 1, signature.encode('ascii')))
+        out.write(values)
+
+
+def generate(signatures, directory, progress=print):
+    """
+    Generate tables (and the tables they depend on) into `directory`, skipping existing files.
+
+    Returns:
+        Tablebases: The tables in `directory`, ready for probing.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tables = Tablebases(directory)
+
+    def build(signature):
+        if signature in tables.tables:
+            return
+        for dependency in dependencies(signature):
+            build(dependency)
+        path = os.path.join(directory, signature + FILE_SUFFIX)
+        write_table(path, signature, generate_table(signature, tables, progress))
+        tables.add_table(path)
+
+    for signature in signatures:
+        white, black = split_signature(signature)
+        build(normalize_signature(white, black)[0])
+    return tables
+
+
+def table_statistics(tables, signature):
+    """ Wins, draws, losses and the longest mate of a table, counted over valid positions with white to move. """
+    layout, data, _ = tables.tables[signature]
+    counts = {WIN: 0, DRAW: 0, LOSS: 0}
+    longest = 0
+    for index in range(layout.side_size):
+        squares, side = layout.decode(index)
+        if layout.index(squares, side) != index or not _valid(layout, squares, side):
+            continue
+        wdl, plies = decode_value(data[HEADER_SIZE + index])
+        counts[wdl] += 1
+        if wdl == WIN:
+            longest = max(longest, plies)
+    return counts, longest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases.")
+    parser.add_argument("--dir", default="tablebases", help="directory holding the tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("generate", help="generate tables (with their dependencies)")
+    make.add_argument("signatures", nargs="*", default=DEFAULT_SIGNATURES, help="e.g. KQvK KRvK KPvK KBNvK")
+    look = commands.add_parser("probe", help="probe a position")
+    look.add_argument("fen")
+    commands.add_parser("stats", help="print win/draw/loss counts of the generated tables")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.signatures, args.dir)
+    elif args.command == "probe":
+        from chess.position import Position
+        result = Tablebases(args.dir).probe(Position.from_fen(args.fen))
+        if result is None:
+            print("not in the tablebases")
+        else:
+            wdl, plies = result
+            print({WIN: f"win, mate in {(plies + 1) // 2}", DRAW: "draw", LOSS: f"loss, mated in {plies // 2}"}[wdl])
+    else:
+        tables = Tablebases(args.dir)
+        for signature in sorted(tables.tables):
+            counts, longest = table_statistics(tables, signature)
+            print(f"{signature:<8} white to move: {counts[WIN]:>8} wins {counts[DRAW]:>8} draws "
+                  f"{counts[LOSS]:>8} losses, longest win {(longest + 1) // 2} moves")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,194 @@
+# chess/transposition.py
+
+from array import array
+
+# Bound types stored with a score. 0 marks an empty entry.
+BOUND_EXACT = 1  # The score is the exact minimax value
+BOUND_LOWER = 2  # The search failed high: the true value is >= score
+BOUND_UPPER = 3  # The search failed low: the true value is <= score
+
+ENTRY_WORDS = 2     # Each entry is a check word (key XOR data) followed by a 64-bit data word
+BUCKET_ENTRIES = 2  # Entries per bucket that compete for replacement
+BUCKET_WORDS = ENTRY_WORDS * BUCKET_ENTRIES
+
+SCORE_SCALE = 1000  # Scores are stored as signed 32-bit thousandths of a pawn
+_SCORE_OFFSET = 1 << 31
+_SCORE_LIMIT = (1 << 31) - 1
+
+
+def pack_entry(move, depth, bound, age, score):
+    """
+    Pack an entry into one 64-bit data word.
+
+    Layout: move in bits 0-15, depth in bits 16-23, bound in bits 24-25,
+    search age in bits 26-31 and the offset score in bits 32-63.
+    """
+    scaled = int(round(score * SCORE_SCALE))
+    scaled = max(-_SCORE_LIMIT, min(_SCORE_LIMIT, scaled))
+    return (move
+            | (min(depth, 255) << 16)
+            | (bound << 24)
+            | ((age & 63) << 26)
+            | ((scaled + _SCORE_OFFSET) << 32))
+
+
+def unpack_entry(data):
+    """ Unpack a data word into (move, depth, bound, score). """
+    return (data & 0xFFFF,
+            (data >> 16) & 0xFF,
+            (data >> 24) & 3,
+            ((data >> 32) - _SCORE_OFFSET) / SCORE_SCALE)
+
+
+def table_bytes(size_mb):
+    """ Bytes used by a table with a budget of `size_mb`: the largest power-of-two bucket count that fits. """
+    bucket_bytes = BUCKET_WORDS * 8
+    buckets = 1
+    while buckets * 2 * bucket_bytes <= size_mb * 1024 * 1024:
+        buckets *= 2
+    return buckets * bucket_bytes
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table keyed by Zobrist hash.
+
+    Entries live in one flat array of unsigned 64-bit words rather than in a
+    dict, so the memory footprint is fixed by `size_mb` and does not grow
+    with the number of positions searched. Entries are grouped in buckets of
+    two; on a store into a full bucket the entry left over from an older
+    search, or failing that the shallower one, is replaced.
+
+    The first word of an entry holds the key XORed with the data word. Several
+    processes can then share one table without locks (see chess/parallel.py):
+    an entry torn by two concurrent writers fails the key check on probe and
+    is simply treated as a miss.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        """
+        Args:
+            size_mb (int): Memory budget in megabytes.
+            buffer: Optional writable buffer (e.g. SharedMemory.buf) to hold the
+                    table instead of a private array. It must be zero-filled
+                    and at least table_bytes(size_mb) long.
+        """
+        bucket_bytes = BUCKET_WORDS * 8
+        buckets = table_bytes(size_mb) // bucket_bytes
+        self.size_mb = size_mb
+        self.bucket_count = buckets
+        self.mask = buckets - 1
+        if buffer is None:
+            self.table = array('Q', bytes(buckets * bucket_bytes))
+        else:
+            self.table = memoryview(buffer)[:buckets * bucket_bytes].cast('Q')
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+        self.evaluation = None  # Evaluation backend whose scores the table holds (see chess/search.py)
+
+    def clear(self):
+        """ Empty the table and reset the counters. """
+        if isinstance(self.table, array):
+            self.table = array('Q', bytes(len(self.table) * 8))
+        else:
+            self.table[:] = array('Q', bytes(len(self.table) * 8))
+        self.age = 0
+        self.reset_stats()
+
+    def release(self):
+        """ Drop the view of a shared buffer so that the shared memory can be closed. """
+        if isinstance(self.table, memoryview):
+            self.table.release()
+
+    def reset_stats(self):
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def new_search(self):
+        """ Advance the search age so that entries from earlier searches are replaced first. """
+        self.age = (self.age + 1) & 63
+
+    def probe(self, key):
+        """
+        Look up a position.
+
+        Returns:
+            tuple or None: (move, depth, bound, score) for a stored position,
+                           None when the position is not in the table.
+        """
+        self.probes += 1
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        for slot in range(index, index + BUCKET_WORDS, ENTRY_WORDS):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                self.hits += 1
+                return unpack_entry(data)
+        return None
+
+    def store(self, key, move, depth, bound, score):
+        """
+        Store a search result, replacing an existing entry if the bucket is full.
+
+        Args:
+            key (int): Zobrist key of the position.
+            move (int): Best move found (0 if none).
+            depth (int): Remaining depth the position was searched to.
+            bound (int): BOUND_EXACT, BOUND_LOWER or BOUND_UPPER.
+            score (float): The score, from the side to move's point of view.
+                           Mate scores count plies from this position, not
+                           from the root (see score_to_tt in chess/search.py).
+        """
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        age = self.age
+        victim = None
+        victim_value = None
+        for slot in range(index, index + BUCKET_WORDS, ENTRY_WORDS):
+            data = table[slot + 1]
+            if not data:
+                value = -1000  # Empty slots are always taken first
+            elif table[slot] ^ data == key:
+                if not move:
+                    move = data & 0xFFFF  # Keep the old best move for move ordering
+                victim = slot
+                break
+            else:
+                # Depth preferred, but every search of age counts as 4 plies
+                age_gap = (age - ((data >> 26) & 63)) & 63
+                value = ((data >> 16) & 0xFF) - 4 * age_gap
+            if victim is None or value < victim_value:
+                victim = slot
+                victim_value = value
+        else:
+            if table[victim + 1]:
+                self.collisions += 1
+        self.stores += 1
+        data = pack_entry(move, depth, bound, age, score)
+        table[victim] = key ^ data
+        table[victim + 1] = data
+
+    def hashfull(self):
+        """ Permille of entries written during the current search, sampled over the first 1000. """
+        table = self.table
+        sample = min(1000, len(table) // ENTRY_WORDS)
+        used = 0
+        for slot in range(0, sample * ENTRY_WORDS, ENTRY_WORDS):
+            data = table[slot + 1]
+            if data and ((data >> 26) & 63) == self.age:
+                used += 1
+        return used * 1000 // sample
+
+    def stats(self):
+        """ Counters for sizing the table: probes, hits, stores, collisions and hit rate. """
+        return {
+            'size_mb': self.size_mb,
+            'entries': self.bucket_count * BUCKET_ENTRIES,
+            'probes': self.probes,
+            'hits': self.hits,
+            'stores': self.stores,
+            'collisions': self.collisions,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+        }
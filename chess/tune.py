@@ -0,0 +1,516 @@
+# chess/tune.py
+
+import argparse
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for tuning
+    np = None
+
+from chess import evaluation
+from chess.evaluation import MAX_PHASE, PHASE_WEIGHTS, TABLE_NAMES
+from chess.pawns import pawn_structure
+from chess.pgn import read_file
+from chess.epd import parse_epd
+from chess.extract import extract_positions, PositionFilter
+from chess.packed import PackedPositionFile, decode_squares, NO_PIECE, NO_RESULT, PACKED_EXTENSION
+
+# Texel tuning: fit the evaluation to game results. A position scored s
+# pawns (white's view) is expected to score sigmoid(s) = 1 / (1 + 10 ** (-K s / 4))
+# for white, and the parameters are chosen to minimise the mean squared
+# difference between that and the results of the games the positions came
+# from. K is fitted first, with the current parameters, and then held fixed.
+#
+# The evaluation is linear in its parameters for a given position: every
+# piece adds (minus, for black) its material value and one table entry, and
+# the king's two tables are blended by game phase. Each position is therefore
+# a sparse row of coefficients, and the scores of all positions are a sparse
+# matrix times the parameter vector. The pawn structure terms (chess/pawns.py)
+# are not tuned; they are a fixed offset per position.
+
+# Parameter vector layout: the material values of MATERIAL_PIECES, then the
+# 64 entries of each table of TABLE_NAMES, as drawn in chess/evaluation.py
+# (row 0 is black's back rank). The king's material value stays 0.
+MATERIAL_PIECES = 'PNBRQ'
+TABLE_OFFSET = len(MATERIAL_PIECES)
+TABLE_ENTRIES = 64 * len(TABLE_NAMES)
+PARAMETER_COUNT = TABLE_OFFSET + TABLE_ENTRIES
+
+RESULT_LABELS = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5,
+                 '[1.0]': 1.0, '[0.5]': 0.5, '[0.0]': 0.0, '[1]': 1.0, '[0]': 0.0}
+
+# Positions this early in a PGN game are skipped: they come from opening books
+SKIP_PLIES = 8
+
+# Optimiser defaults: passes over the positions, positions per step, and the
+# Adam step size (in pawns) and moment decay rates
+EPOCHS = 50
+BATCH_SIZE = 16384
+LEARNING_RATE = 0.002
+ADAM_BETAS = (0.9, 0.999)
+ADAM_EPSILON = 1e-8
+
+# Packed position files are decoded this many records at a time
+PACKED_BLOCK = 1 << 18
+
+# board_array: the translation that expands a FEN board to one character per
+# square, and the FEN character index of each square (FEN lists the squares
+# from a8 to h1)
+_FEN_EXPAND = str.maketrans({**{str(run): '.' * run for run in range(1, 9)}, '/': None})
+_FEN_INDEX = [(7 - (square >> 3)) * 8 + (square & 7) for square in range(64)]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Tuning requires numpy (pip install numpy)")
+
+
+def _fen_lookup():
+    lookup = np.full(256, -1, dtype=np.int8)
+    for index, letter in enumerate('PNBRQKpnbrqk'):
+        lookup[ord(letter)] = index
+    lookup[ord('.')] = NO_PIECE
+    return lookup
+
+
+_FEN_LOOKUP = _fen_lookup() if np is not None else None
+
+
+def parse_labelled_line(line):
+    """
+    Read a labelled position: a FEN or EPD record followed by the game result.
+
+    The result is a '1-0', '0-1' or '1/2-1/2' token, a '[1.0]', '[0.5]' or
+    '[0.0]' token, or an EPD `c9` operation holding one of those.
+
+    Returns:
+        tuple: (FEN board field, result for white between 0 and 1).
+    """
+    fields = line.split()
+    if len(fields) < 2:
+        raise ValueError(f"Expected a position and a result: {line!r}")
+    label = fields[-1].strip('";')
+    if label not in RESULT_LABELS and 'c9' in fields:
+        label = parse_epd(line)[1].get('c9', [''])[0]
+    if label not in RESULT_LABELS:
+        raise ValueError(f"No game result in {line!r}")
+    return fields[0], RESULT_LABELS[label]
+
+
+def read_labelled_positions(path, skip_plies=SKIP_PLIES, limit=None):
+    """
+    Read labelled positions from a text file (see parse_labelled_line) or a
+    .pgn file. A PGN game gives its quiet positions (see chess/extract.py)
+    after the first `skip_plies` plies, labelled with the game's result;
+    unfinished games are skipped.
+
+    Returns:
+        tuple: (list of FEN board fields, list of results for white).
+    """
+    boards, labels = [], []
+    if path.endswith('.pgn'):
+        position_filter = PositionFilter(min_ply=skip_plies, quiet=True)
+        for position, info in extract_positions(read_file(path), position_filter):
+            boards.append(position.to_fen().split()[0])
+            labels.append((info['result'] + 1) / 2)
+            if limit is not None and len(boards) >= limit:
+                break
+        return boards, labels
+    with open(path) as stream:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                board, label = parse_labelled_line(line)
+                boards.append(board)
+                labels.append(label)
+                if limit is not None and len(boards) >= limit:
+                    break
+    return boards, labels
+
+
+def read_packed_positions(path, limit=None):
+    """
+    Read the positions with a game result from a packed position file (as
+    written by chess/extract.py), decoding them in blocks.
+
+    Returns:
+        tuple: ((N, 64) array of the piece on each square, results for white).
+    """
+    _require_numpy()
+    grids, labels = [], []
+    with PackedPositionFile(path) as packed:
+        records = packed.array()
+        stop = len(records) if limit is None else min(limit, len(records))
+        for start in range(0, stop, PACKED_BLOCK):
+            block = records[start:min(stop, start + PACKED_BLOCK)]
+            labelled = block['result'] != NO_RESULT
+            grids.append(decode_squares(block[labelled]))
+            labels.append((block['result'][labelled].astype(np.float64) + 1) / 2)
+        del records, block
+    if not grids:
+        return np.empty((0, 64), dtype=np.int8), np.empty(0)
+    return np.concatenate(grids), np.concatenate(labels)
+
+
+def load_features(path, skip_plies=SKIP_PLIES, limit=None):
+    """
+    The feature matrix of a file of labelled positions: a packed position
+    file (PACKED_EXTENSION), a .pgn file or a text file of FEN/EPD lines.
+    """
+    if path.endswith(PACKED_EXTENSION):
+        return features_from_squares(*read_packed_positions(path, limit))
+    return build_features(*read_labelled_positions(path, skip_plies, limit))
+
+
+class FeatureMatrix:
+    """
+    The positions as a sparse matrix over the table entries.
+
+    A piece's material value is added to every entry of its table, so the
+    material parameters need no columns of their own: scores are computed
+    with the material folded into the tables, and the gradient of a material
+    value is the sum of the gradients of its table's entries.
+
+    Rows are stored with a fixed width: `columns[i]` holds the table entries
+    of position i and `values[i]` their coefficients, padded with a zero
+    coefficient on a dummy entry. The scores of a block of positions are then
+    one gather, multiply and row sum, and the gradient one weighted bincount.
+
+    Attributes:
+        columns (numpy.ndarray): (N, width) int16 table entry indexes.
+        values (numpy.ndarray): (N, width) float32 coefficients.
+        offsets (numpy.ndarray): Fixed part of each score (pawn structure), in pawns.
+        labels (numpy.ndarray): Game results for white.
+    """
+
+    def __init__(self, columns, values, offsets, labels):
+        self.columns = columns
+        self.values = values
+        self.offsets = offsets
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    def scores(self, parameters):
+        """ Evaluation of every position in pawns, white's view. """
+        entries = _folded_entries(parameters)
+        return (self.values * entries[self.columns]).sum(axis=1, dtype=np.float64) + self.offsets
+
+    def gradient(self, weights):
+        """ Transposed product: the sum over positions of weights[i] times row i, per parameter. """
+        products = (self.values * weights[:, None].astype(np.float32)).ravel()
+        entries = np.bincount(self.columns.ravel(), weights=products, minlength=TABLE_ENTRIES + 1)[:TABLE_ENTRIES]
+        material = entries[:64 * TABLE_OFFSET].reshape(TABLE_OFFSET, 64).sum(axis=1)
+        return np.concatenate([material, entries])
+
+    def subset(self, rows):
+        return FeatureMatrix(self.columns[rows], self.values[rows], self.offsets[rows], self.labels[rows])
+
+    def blocks(self, size):
+        """ Yield consecutive blocks of at most `size` positions (views, not copies). """
+        for start in range(0, len(self), size):
+            end = start + size
+            yield FeatureMatrix(self.columns[start:end], self.values[start:end],
+                                self.offsets[start:end], self.labels[start:end])
+
+
+def _folded_entries(parameters):
+    """ The table entries with each piece's material value added in, plus the zero dummy entry. """
+    entries = np.append(parameters[TABLE_OFFSET:], 0.0).astype(np.float32)
+    entries[:64 * TABLE_OFFSET] += np.repeat(parameters[:TABLE_OFFSET], 64).astype(np.float32)
+    return entries
+
+
+def board_array(boards):
+    """
+    Decode FEN board fields into an (N, 64) int8 array of piece indexes (see
+    chess/position.py) by square, with NO_PIECE on empty squares.
+    """
+    _require_numpy()
+    # Expand all boards at once to one character per square
+    expanded = ''.join(boards).replace('/', '')
+    for run in range(2, 9):
+        expanded = expanded.replace(str(run), '.' * run)
+    expanded = expanded.replace('1', '.')
+    if len(expanded) != 64 * len(boards):
+        bad = next(board for board in boards if len(board.translate(_FEN_EXPAND)) != 64)
+        raise ValueError(f"Invalid FEN board {bad!r}")
+    grid = _FEN_LOOKUP[np.frombuffer(expanded.encode('ascii'), dtype=np.uint8)].reshape(-1, 64)
+    if (grid < 0).any():
+        raise ValueError("Invalid piece letter in FEN board")
+    return grid[:, _FEN_INDEX]
+
+
+def build_features(boards, labels):
+    """
+    Build the feature matrix of positions given by FEN board fields.
+
+    Returns:
+        FeatureMatrix: One row per position.
+    """
+    return features_from_squares(board_array(boards), labels)
+
+
+def features_from_squares(grid, labels):
+    """
+    Build the feature matrix of positions given as an (N, 64) array of the
+    piece on each square (see board_array and chess.packed.decode_squares).
+
+    Returns:
+        FeatureMatrix: One row per position.
+    """
+    _require_numpy()
+    count = len(grid)
+    rows, squares = np.nonzero(grid != NO_PIECE)
+    pieces = grid[rows, squares].astype(np.int64)
+    piece_types, colors = pieces % 6, pieces // 6
+    signs = (1 - 2 * colors).astype(np.float32)
+    phase = np.minimum(np.bincount(rows, weights=np.array(PHASE_WEIGHTS)[piece_types], minlength=count), MAX_PHASE)
+    middle_weight = (phase / MAX_PHASE).astype(np.float32)
+
+    # Table entry of each piece: white reads the tables flipped vertically.
+    # The king has one entry in each of its tables, blended by game phase.
+    drawn_rows = np.where(colors == 0, 7 - (squares >> 3), squares >> 3)
+    cells = drawn_rows * 8 + (squares & 7)
+    kings = piece_types == 5
+    # Each row holds the entries of the other pieces, in square order, then
+    # the middlegame and endgame entries of each king
+    others, king_rows = rows[~kings], rows[kings]
+    other_counts = np.bincount(others, minlength=count)
+    king_counts = np.bincount(king_rows, minlength=count)
+    other_slots = np.arange(len(others)) - (np.cumsum(other_counts) - other_counts)[others]
+    king_slots = (other_counts[king_rows]
+                  + 2 * (np.arange(len(king_rows)) - (np.cumsum(king_counts) - king_counts)[king_rows]))
+    width = int((other_counts + 2 * king_counts).max()) if count else 0
+    columns = np.full((count, width), TABLE_ENTRIES, dtype=np.int16)
+    values = np.zeros((count, width), dtype=np.float32)
+    columns[others, other_slots] = piece_types[~kings] * 64 + cells[~kings]
+    values[others, other_slots] = signs[~kings]
+    columns[king_rows, king_slots] = 5 * 64 + cells[kings]
+    values[king_rows, king_slots] = signs[kings] * middle_weight[king_rows]
+    columns[king_rows, king_slots + 1] = 6 * 64 + cells[kings]
+    values[king_rows, king_slots + 1] = signs[kings] * (1 - middle_weight[king_rows])
+
+    # Pawn structure, computed once per distinct pair of pawn bitboards
+    pawn_planes = np.stack([grid == 0, grid == 6], axis=1)
+    pawn_boards = np.packbits(pawn_planes, axis=2, bitorder='little').view('<u8').reshape(-1, 2)
+    pawn_cache = {}
+    pawn_terms = []
+    for pair in map(tuple, pawn_boards.tolist()):
+        terms = pawn_cache.get(pair)
+        if terms is None:
+            terms = pawn_cache[pair] = pawn_structure(*pair)
+        pawn_terms.append(terms)
+    pawn = np.array(pawn_terms, dtype=np.float64).reshape(-1, 2)
+    pawn_offsets = (pawn[:, 0] * phase + pawn[:, 1] * (MAX_PHASE - phase)) / (MAX_PHASE * evaluation.SCORE_UNITS)
+    return FeatureMatrix(columns, values, pawn_offsets, np.array(labels, dtype=np.float64))
+
+
+def parameters_from_tables(tables=None):
+    """ The parameter vector of evaluation tables (default: the ones in use), see current_tables. """
+    _require_numpy()
+    tables = tables or evaluation.current_tables()
+    parameters = [tables['PIECE_VALUES'][letter] for letter in MATERIAL_PIECES]
+    for name in TABLE_NAMES:
+        parameters.extend(value for row in tables[name] for value in row)
+    return np.array(parameters, dtype=np.float64)
+
+
+def tables_from_parameters(parameters, decimals=2):
+    """ Evaluation tables (a dict for set_tables) from a parameter vector, rounded to centipawns. """
+    values = [round(float(value), decimals) + 0.0 for value in parameters]
+    tables = {'PIECE_VALUES': dict(zip(MATERIAL_PIECES, values[:TABLE_OFFSET]))}
+    tables['PIECE_VALUES']['K'] = 0
+    for index, name in enumerate(TABLE_NAMES):
+        start = TABLE_OFFSET + index * 64
+        tables[name] = [values[start + row * 8:start + row * 8 + 8] for row in range(8)]
+    return tables
+
+
+def win_probability(scores, k):
+    """ Expected result for white of positions scored `scores` pawns. """
+    return 1 / (1 + np.power(10.0, -k * scores / 4))
+
+
+def texel_loss(features, parameters, k, block_size=BATCH_SIZE * 16):
+    """ Mean squared difference between the game results and win_probability of the scores. """
+    total = 0.0
+    for block in features.blocks(block_size):
+        errors = block.labels - win_probability(block.scores(parameters), k)
+        total += float(np.dot(errors, errors))
+    return total / len(features)
+
+
+def fit_k(features, parameters, low=0.05, high=5.0, tolerance=1e-4):
+    """ The K minimising the loss with fixed parameters, by golden-section search. """
+    scores = np.concatenate([block.scores(parameters) for block in features.blocks(BATCH_SIZE * 16)])
+    ratio = (math.sqrt(5) - 1) / 2
+
+    def loss(k):
+        return float(np.mean((features.labels - win_probability(scores, k)) ** 2))
+
+    a, b = low, high
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    loss_c, loss_d = loss(c), loss(d)
+    while b - a > tolerance:
+        if loss_c < loss_d:
+            b, d, loss_d = d, c, loss_c
+            c = b - ratio * (b - a)
+            loss_c = loss(c)
+        else:
+            a, c, loss_c = c, d, loss_d
+            d = a + ratio * (b - a)
+            loss_d = loss(d)
+    return (a + b) / 2
+
+
+def tune(features, parameters, k, epochs=EPOCHS, batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE,
+         tolerance=1e-6, validation=None, seed=0, progress=None):
+    """
+    Minimise the Texel loss with mini-batch Adam.
+
+    Each epoch shuffles the positions and takes one step per batch, so a
+    pass over the data makes len(features) / batch_size updates rather than
+    one; a few dozen epochs are enough where full-batch descent needs
+    hundreds of passes.
+
+    Args:
+        features (FeatureMatrix): The training positions.
+        parameters (numpy.ndarray): Starting parameter vector (not modified).
+        k (float): Sigmoid scale, see fit_k.
+        epochs (int): Maximum number of passes over the positions.
+        batch_size (int): Positions per step.
+        learning_rate (float): Adam step size, in pawns.
+        tolerance (float): Stop once an epoch improves the loss by less than this.
+        validation (FeatureMatrix): Held-out positions whose loss is reported.
+        seed (int): Seed of the shuffles.
+        progress (callable): Called as progress(epoch, loss, validation_loss)
+                             after every epoch.
+
+    Returns:
+        numpy.ndarray: The tuned parameter vector.
+    """
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    parameters = parameters.copy()
+    first_moment = np.zeros_like(parameters)
+    second_moment = np.zeros_like(parameters)
+    beta1, beta2 = ADAM_BETAS
+    # d/ds of win_probability(s) is ln(10) K / 4 * p (1 - p)
+    slope = math.log(10) * k / 4
+    step = 0
+    previous_loss = None
+    for epoch in range(1, epochs + 1):
+        shuffled = features.subset(rng.permutation(len(features)))
+        total_loss = 0.0
+        for batch in shuffled.blocks(batch_size):
+            probabilities = win_probability(batch.scores(parameters), k)
+            errors = probabilities - batch.labels
+            total_loss += float(np.dot(errors, errors))
+            weights = 2 * errors * probabilities * (1 - probabilities) * slope / len(batch)
+            gradient = batch.gradient(weights)
+            step += 1
+            first_moment = beta1 * first_moment + (1 - beta1) * gradient
+            second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+            corrected_first = first_moment / (1 - beta1 ** step)
+            corrected_second = second_moment / (1 - beta2 ** step)
+            parameters -= learning_rate * corrected_first / (np.sqrt(corrected_second) + ADAM_EPSILON)
+        del shuffled
+        # The mean loss over the epoch, while the parameters were moving
+        loss = total_loss / len(features)
+        if progress is not None:
+            progress(epoch, loss, texel_loss(validation, parameters, k) if validation is not None else None)
+        if previous_loss is not None and previous_loss - loss < tolerance:
+            break
+        previous_loss = loss
+    return parameters
+
+
+def _format_value(value):
+    return f"{value:g}"
+
+
+def format_tables(tables, comment=None):
+    """ Python source of an evaluation table module, laid out as chess/evaluation.py. """
+    lines = []
+    if comment:
+        lines.extend(f"# {line}" for line in comment.splitlines())
+        lines.append("")
+    lines.append("PIECE_VALUES = {")
+    letters = list(tables['PIECE_VALUES'])
+    for index, letter in enumerate(letters):
+        separator = ',' if index < len(letters) - 1 else ''
+        lines.append(f"    '{letter}': {_format_value(tables['PIECE_VALUES'][letter])}{separator}")
+    lines.append("}")
+    for name in TABLE_NAMES:
+        lines.append("")
+        lines.append(f"{name} = [")
+        for index, row in enumerate(tables[name]):
+            separator = ',' if index < 7 else ''
+            lines.append(f"    [{', '.join(_format_value(value) for value in row)}]{separator}")
+        lines.append("]")
+    return '\n'.join(lines) + '\n'
+
+
+def write_tables(path, tables, comment=None):
+    """ Write an evaluation table module, which evaluation.load_tables reads back. """
+    with open(path, 'w') as table_file:
+        table_file.write(format_tables(tables, comment))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the evaluation tables to game results (Texel tuning).")
+    parser.add_argument("positions", help=f"labelled positions: FEN/EPD lines with results, a .pgn file, "
+                                          f"or a {PACKED_EXTENSION} file written by chess/extract.py")
+    parser.add_argument("--output", default="tuned_tables.py", help="evaluation table module to write")
+    parser.add_argument("--tables", metavar="FILE", help="start from this table module instead of the built-in tables")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--learning-rate", type=float, default=LEARNING_RATE)
+    parser.add_argument("--k", type=float, help="sigmoid scale (default: fitted)")
+    parser.add_argument("--validation", type=float, default=0.1, help="fraction of positions held out")
+    parser.add_argument("--limit", type=int, help="use at most this many positions")
+    parser.add_argument("--skip-plies", type=int, default=SKIP_PLIES, help="opening plies skipped in PGN games")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    _require_numpy()
+
+    if args.tables:
+        evaluation.load_tables(args.tables)
+    start = time.perf_counter()
+    features = load_features(args.positions, args.skip_plies, args.limit)
+    print(f"{len(features)} positions read in {time.perf_counter() - start:.1f}s")
+
+    order = np.random.default_rng(args.seed).permutation(len(features))
+    held_out = int(len(features) * args.validation)
+    validation = features.subset(order[:held_out]) if held_out else None
+    training = features.subset(order[held_out:])
+    del features
+
+    parameters = parameters_from_tables()
+    k = args.k if args.k is not None else fit_k(training, parameters)
+    initial_loss = texel_loss(training, parameters, k)
+    print(f"K {k:.4f}  initial loss {initial_loss:.6f}")
+
+    def progress(epoch, loss, validation_loss):
+        held = f"  validation {validation_loss:.6f}" if validation_loss is not None else ""
+        print(f"epoch {epoch:>4}  loss {loss:.6f}{held}  {time.perf_counter() - start:.1f}s", flush=True)
+
+    tuned = tune(training, parameters, k, args.epochs, args.batch_size, args.learning_rate,
+                 validation=validation, seed=args.seed, progress=progress)
+    tables = tables_from_parameters(tuned)
+    final_loss = texel_loss(training, parameters_from_tables(tables), k)
+    comment = (f"Evaluation tables tuned by chess/tune.py on {len(training)} positions from {args.positions}\n"
+               f"K {k:.4f}, loss {initial_loss:.6f} -> {final_loss:.6f}. "
+               f"Load with chess.evaluation.load_tables(path).")
+    write_tables(args.output, tables, comment)
+    print(f"loss {initial_loss:.6f} -> {final_loss:.6f}, tables written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,314 @@
+# chess/uci.py
+
+import sys
+import threading
+
+from chess.position import Position, STARTING_FEN
+from chess.notation import parse_uci, move_to_uci
+from chess.parallel import ParallelSearch
+from chess.polyglot import PolyglotBook
+from chess.search import (
+    iterative_deepening, principal_variation, get_transposition_table, set_hash_size, set_tablebase_path,
+    DEFAULT_HASH_MB, MATE_SCORE, MATE_THRESHOLD, MAX_DEPTH,
+)
+
+ENGINE_NAME = "BarebonesChess"
+ENGINE_AUTHOR = "kuromadoshiMJ"
+
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+
+# Time management: with no movestogo the remaining time is spread over this
+# many moves, plus most of the increment. MOVE_OVERHEAD_MS is kept back for
+# the GUI's own latency.
+DEFAULT_MOVES_TO_GO = 30
+MOVE_OVERHEAD_MS = 50
+
+
+def allocate_time(time_left, increment=0, moves_to_go=None):
+    """
+    Milliseconds to spend on the next move.
+
+    Args:
+        time_left (int): Time left on our clock in milliseconds.
+        increment (int): Increment per move in milliseconds.
+        moves_to_go (int): Moves until the next time control, if known.
+
+    Returns:
+        int: The budget, never more than the time left minus MOVE_OVERHEAD_MS.
+    """
+    budget = time_left // (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 3 // 4
+    return max(1, min(budget, time_left - MOVE_OVERHEAD_MS))
+
+
+def format_score(best_eval, side):
+    """ UCI score of a white-relative evaluation in pawns: 'cp N' or 'mate N' from the side to move. """
+    score = best_eval if side == 0 else -best_eval
+    if abs(score) >= MATE_THRESHOLD:
+        plies = round(MATE_SCORE - abs(score))
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {round(score * 100)}"
+
+
+class UciEngine:
+    """
+    UCI protocol front end.
+
+    Commands are handled on the thread that reads the input, and every search
+    runs on a background thread, so `stop`, `ponderhit` and `isready` are
+    answered while the engine is thinking. The search polls a threading.Event
+    every CHECK_INTERVAL nodes (see chess/search.py), which ends it within
+    milliseconds of `stop`.
+
+    The transposition table is kept between moves (only `ucinewgame` clears
+    it), so each search starts from what the previous one, and the ponder
+    search, already found.
+    """
+
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.position = Position.from_fen(STARTING_FEN)
+        self.hash_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.own_book = False
+        self.book = None
+        self.tablebase_path = None
+        self._parallel = None
+        self._thread = None
+        self._stop = threading.Event()     # Ends the running search
+        self._release = threading.Event()  # Set once the bestmove may be sent (not pondering)
+        self._timer = None
+        self._ponder_time_ms = None
+        self._output_lock = threading.Lock()
+
+    def send(self, line):
+        with self._output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, stream=None):
+        """ Read commands until `quit` or end of input. """
+        for line in stream or sys.stdin:
+            if not self.handle(line):
+                break
+        self._finish_search()
+        self._close_parallel()
+        if self.book is not None:
+            self.book.close()
+
+    def handle(self, line):
+        """
+        Handle one command line.
+
+        A command with bad arguments (an illegal move, a missing number, a
+        book file that cannot be read) is ignored and reported with an `info
+        string` line; the engine keeps running.
+
+        Returns:
+            bool: False after `quit`, True otherwise.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        try:
+            return self._dispatch(tokens[0], tokens[1:])
+        except (ValueError, IndexError, OSError) as error:
+            self.send(f"info string {error}")
+            return True
+
+    def _dispatch(self, command, args):
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name Ponder type check default false")
+            self.send("option name OwnBook type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self._finish_search()
+            self._set_option(args)
+        elif command == 'ucinewgame':
+            self._finish_search()
+            set_hash_size(self.hash_mb)
+            self._open_parallel()
+        elif command == 'position':
+            self._finish_search()
+            self._set_position(args)
+        elif command == 'go':
+            self._finish_search()
+            self._go(args)
+        elif command == 'stop':
+            self._stop.set()
+            self._release.set()
+        elif command == 'ponderhit':
+            self._ponderhit()
+        elif command == 'd':
+            self.send(str(self.position))
+            self.send(f"Fen: {self.position.to_fen()}")
+        elif command == 'quit':
+            return False
+        return True
+
+    def _set_option(self, args):
+        """ setoption name <name> value <value> """
+        if 'name' not in args:
+            return
+        value_at = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:value_at]).lower()
+        value = ' '.join(args[value_at + 1:])
+        if name == 'hash':
+            self.hash_mb = max(1, min(MAX_HASH_MB, int(value)))
+            set_hash_size(self.hash_mb)
+            self._open_parallel()
+        elif name == 'threads':
+            self.threads = max(1, min(MAX_THREADS, int(value)))
+            self._open_parallel()
+        elif name == 'ownbook':
+            self.own_book = value.lower() == 'true'
+        elif name == 'bookfile':
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            self.book = PolyglotBook(value) if value and value != '<empty>' else None
+        elif name == 'tablebasepath':
+            self.tablebase_path = value if value and value != '<empty>' else None
+            set_tablebase_path(self.tablebase_path)
+            self._open_parallel()
+
+    def _set_position(self, args):
+        """ position [startpos | fen <fen>] [moves <move> ...] """
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'fen':
+            position = Position.from_fen(' '.join(args[1:moves_at]))
+        else:
+            position = Position.from_fen(STARTING_FEN)
+        for text in args[moves_at + 1:]:
+            position.make_move(parse_uci(position, text))
+        self.position = position
+
+    def _go(self, args):
+        """ go [wtime N] [btime N] [winc N] [binc N] [movestogo N] [movetime N] [depth N] [nodes N] [infinite] [ponder] """
+        limits = {}
+        flags = set()
+        for index, token in enumerate(args):
+            if token in ('infinite', 'ponder'):
+                flags.add(token)
+            elif token in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes'):
+                limits[token] = int(args[index + 1])
+
+        # A book move is played at once, without searching
+        if self.own_book and self.book is not None and not flags:
+            move = self.book.choose_move(self.position)
+            if move is not None:
+                self.send(f"bestmove {move_to_uci(move)}")
+                return
+
+        white = self.position.side == 0
+        movetime_ms = limits.get('movetime')
+        time_left = limits.get('wtime' if white else 'btime')
+        if movetime_ms is None and time_left is not None:
+            movetime_ms = allocate_time(time_left, limits.get('winc' if white else 'binc', 0), limits.get('movestogo'))
+
+        # While pondering (and in infinite mode) the clock is not running: the
+        # search runs until `stop`, or until `ponderhit` starts the clock
+        waiting = bool(flags)
+        self._ponder_time_ms = movetime_ms if 'ponder' in flags else None
+        if waiting:
+            movetime_ms = None
+        self._stop.clear()
+        if waiting:
+            self._release.clear()
+        else:
+            self._release.set()
+
+        position = self.position.copy()
+        self._thread = threading.Thread(
+            target=self._search, args=(position, limits.get('depth'), movetime_ms, limits.get('nodes')), daemon=True)
+        self._thread.start()
+
+    def _ponderhit(self):
+        """ The opponent played the expected move: the ponder search continues on our own clock. """
+        if self._ponder_time_ms is not None:
+            self._timer = threading.Timer(self._ponder_time_ms / 1000, self._stop.set)
+            self._timer.daemon = True
+            self._timer.start()
+            self._ponder_time_ms = None
+        self._release.set()
+
+    def _send_info(self, position, tt, depth, best_eval, best_move, nodes, elapsed):
+        """ Send an info line for a completed depth; returns the principal variation. """
+        pv = principal_variation(position, tt, max(depth, 1))
+        if best_move is not None and (not pv or pv[0] != best_move):
+            pv = [best_move]
+        nps = nodes / elapsed if elapsed else 0
+        self.send(f"info depth {depth} score {format_score(best_eval, position.side)} nodes {nodes} "
+                  f"nps {nps:.0f} time {elapsed * 1000:.0f} hashfull {tt.hashfull()} "
+                  f"pv {' '.join(move_to_uci(m) for m in pv)}")
+        return pv
+
+    def _search(self, position, depth, movetime_ms, max_nodes):
+        if depth is None and movetime_ms is None and max_nodes is None:
+            depth = MAX_DEPTH  # Until stopped
+
+        pv = []
+        if self._parallel is not None:
+            result = self._parallel.search(position, depth, movetime_ms, max_nodes, stop_event=self._stop)
+            best_move = result['best_move']
+            if best_move is not None:
+                pv = self._send_info(position, self._parallel.tt, result['depth'], result['best_eval'],
+                                     best_move, result['nodes'], result['elapsed'])
+        else:
+            tt = get_transposition_table()
+
+            def report(result):
+                pv[:] = self._send_info(position, tt, result.depth, result.best_eval,
+                                        result.best_move, result.nodes, result.elapsed)
+
+            best_move = iterative_deepening(position, depth, tt, movetime_ms, max_nodes,
+                                            stop_event=self._stop, on_iteration=report).best_move
+
+        # In ponder and infinite mode the bestmove waits for `stop` or `ponderhit`
+        self._release.wait()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if best_move is None:
+            self.send("bestmove 0000")
+        elif len(pv) > 1 and pv[0] == best_move:
+            self.send(f"bestmove {move_to_uci(best_move)} ponder {move_to_uci(pv[1])}")
+        else:
+            self.send(f"bestmove {move_to_uci(best_move)}")
+
+    def _finish_search(self):
+        """ Stop a running search and wait for its bestmove. """
+        if self._thread is not None:
+            self._stop.set()
+            self._release.set()
+            self._thread.join()
+            self._thread = None
+
+    def _open_parallel(self):
+        """ (Re)start the worker pool for the current Threads and Hash settings, with an empty table. """
+        self._close_parallel()
+        if self.threads > 1:
+            self._parallel = ParallelSearch(self.threads, self.hash_mb, self.tablebase_path)
+
+    def _close_parallel(self):
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+
+def main():
+    UciEngine().run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
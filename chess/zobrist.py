@@ -0,0 +1,40 @@
+# chess/zobrist.py
+
+import random
+
+# Zobrist hashing: every (piece, square) pair, the side to move, each castling
+# rights combination and each en passant file gets a fixed random 64-bit key.
+# A position's key is the XOR of the keys of its features, so make_move can
+# update it with a handful of XORs instead of rehashing the whole board.
+
+_rng = random.Random(0x5EED_C0FFEE)
+
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+SIDE_KEY = _rng.getrandbits(64)  # XORed in when black is to move
+CASTLING_KEYS = [0] + [_rng.getrandbits(64) for _ in range(15)]  # No rights hashes to 0
+EP_KEYS = [_rng.getrandbits(64) for _ in range(8)]  # Indexed by column
+
+del _rng
+
+
+def compute_key(position):
+    """ Compute the Zobrist key of a Position from scratch. """
+    key = 0
+    for square, piece in enumerate(position.squares):
+        if piece is not None:
+            key ^= PIECE_KEYS[piece][square]
+    if position.side:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square is not None:
+        key ^= EP_KEYS[position.ep_square & 7]
+    return key
+
+
+def compute_pawn_key(position):
+    """ Compute the pawn-only Zobrist key of a Position (the pawn hash key) from scratch. """
+    key = 0
+    for square, piece in enumerate(position.squares):
+        if piece is not None and piece % 6 == 0:
+            key ^= PIECE_KEYS[piece][square]
+    return key
@@ -1,8 +1,11 @@
+import queue
+import threading
+
 import pygame
-from chess.board import setup_initial_board, print_board
+from chess.board import setup_initial_position, print_board
 from chess.move_generator import generate_legal_moves
-from chess.search import search_best_move, make_move
-# from chess.move_generator import make_move
+from chess.search import iterative_deepening, make_move
+from chess.position import piece_symbol, move_to_tuple
 
 # Initialize pygame
 pygame.init()
@@ -15,6 +18,11 @@ BLACK = (0, 0, 0)
 BLUE = (106, 159, 181)
 DARK_BROWN = (181, 136, 99)
 LIGHT_BROWN = (240, 217, 181)
+SELECTED_COLOR = (246, 246, 105)
+TARGET_COLOR = (106, 159, 181)
+
+FPS = 60
+ENGINE_MOVETIME_MS = 2000  # The engine searches as deep as it gets in this time
 
 # Initialize screen
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -40,73 +48,151 @@ PIECE_IMAGES = {
     "k": load_and_scale_image("assets/b_king_2x_ns.png"),  # Black king
 }
 
+def square_rect(row, col):
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
 def draw_board():
-    """ Draws the chessboard on the screen. """
+    """ Draws the empty chessboard once onto a surface that is reused for every redraw. """
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
     colors = [LIGHT_BROWN, DARK_BROWN]
     for row in range(8):
         for col in range(8):
             color = colors[(row + col) % 2]
-            pygame.draw.rect(screen, color, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            pygame.draw.rect(surface, color, square_rect(row, col))
+    return surface
 
-def draw_pieces(board):
-    """ Draws the pieces on the board based on the current state of the game. """
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece is not None:
-                piece_img = PIECE_IMAGES[piece.piece_type.lower() if piece.color == 'black' else piece.piece_type.upper()]
-                screen.blit(piece_img, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+def draw_square(board_surface, board, row, col, selected_square=None, targets=()):
+    """ Redraws a single square: background from the cached board, highlights, then the piece. """
+    rect = square_rect(row, col)
+    screen.blit(board_surface, rect, rect)
+    if (row, col) == selected_square:
+        pygame.draw.rect(screen, SELECTED_COLOR, rect)
+    elif (row, col) in targets:
+        pygame.draw.circle(screen, TARGET_COLOR, rect.center, SQUARE_SIZE // 6)
+    piece = board.squares[row * 8 + col]
+    if piece is not None:
+        screen.blit(PIECE_IMAGES[piece_symbol(piece)], rect)
+    return rect
+
+def draw_pieces(board_surface, board, squares, selected_square=None, targets=()):
+    """ Redraws the given squares and returns the screen areas that changed. """
+    return [draw_square(board_surface, board, row, col, selected_square, targets) for row, col in squares]
+
+def changed_squares(board, move):
+    """ Squares whose contents a move changes: from and to, plus the rook for castling and the pawn for en passant. """
+    (from_row, from_col), (to_row, to_col) = move_to_tuple(move)
+    squares = {(from_row, from_col), (to_row, to_col)}
+    piece = board.squares[from_row * 8 + from_col]
+    if piece is not None and piece % 6 == 5 and abs(to_col - from_col) == 2:
+        squares |= {(from_row, 0), (from_row, 3), (from_row, 5), (from_row, 7)}
+    if piece is not None and piece % 6 == 0 and from_col != to_col:
+        squares.add((from_row, to_col))
+    return squares
 
 def pos_to_coord(mouse_pos):
     """ Convert mouse click position to board coordinates (row, col). """
     x, y = mouse_pos
     return y // SQUARE_SIZE, x // SQUARE_SIZE
 
+def engine_worker(board, results, stop_event):
+    """ Search a copy of the position on a background thread and post the best move to `results`. """
+    result = iterative_deepening(board.copy(), movetime_ms=ENGINE_MOVETIME_MS, stop_event=stop_event)
+    results.put(result)
+
+def moves_by_square(legal_moves):
+    """ Group the legal moves of a position by their from-square (row, col). """
+    grouped = {}
+    for move in legal_moves:
+        grouped.setdefault(move_to_tuple(move)[0], []).append(move)
+    return grouped
+
 def main():
     # Initialize the chessboard
-    chess_board = setup_initial_board()
-    
+    chess_board = setup_initial_position()
+    board_surface = draw_board()
+    clock = pygame.time.Clock()
+
     selected_square = None  # Store the square that is clicked first (piece selection)
     player_turn = 'white'  # White starts the game
+    # Legal moves are generated once per position and grouped by from-square
+    legal_moves = moves_by_square(generate_legal_moves(chess_board, player_turn))
+
+    engine_results = queue.Queue()
+    engine_stop = threading.Event()
+    engine_thread = None
+    game_over = False
+
+    # The whole board is drawn once; after that only changed squares are redrawn
+    screen.blit(board_surface, (0, 0))
+    draw_pieces(board_surface, chess_board, [(row, col) for row in range(8) for col in range(8)])
+    pygame.display.flip()
 
     running = True
     while running:
-        draw_board()
-        draw_pieces(chess_board)
-        pygame.display.flip()
+        dirty = set()
+        targets = set()
+        if selected_square:
+            targets = {move_to_tuple(m)[1] for m in legal_moves.get(selected_square, [])}
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
-            if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.type == pygame.MOUSEBUTTONDOWN and player_turn == 'white' and legal_moves:
                 row, col = pos_to_coord(pygame.mouse.get_pos())
-                print(row, col)
                 if selected_square:
-                    print("this")
                     # Try to make the move
                     move = (selected_square, (row, col))
-                    legal_moves = generate_legal_moves(chess_board, player_turn)
-                    
-                    print(legal_moves)
-                    if move in legal_moves:
-                        print("yes")
-                        chess_board = make_move(chess_board, move)
-                        player_turn = 'black' if player_turn == 'white' else 'white'
+                    # Promotions come queen first, so the first match is the one we want
+                    matching = [m for m in legal_moves.get(selected_square, []) if move_to_tuple(m) == move]
+                    dirty |= {selected_square} | targets
+                    if matching:
+                        dirty |= changed_squares(chess_board, matching[0])
+                        make_move(chess_board, matching[0])
+                        player_turn = 'black'
+                        legal_moves = moves_by_square(generate_legal_moves(chess_board, player_turn))
                     selected_square = None
+                    targets = set()
                 else:
-                    print("that")
                     # Select a piece to move
-                    piece = chess_board[row][col]
-                    if piece is not None and piece.color == player_turn:
+                    piece = chess_board.squares[row * 8 + col]
+                    if piece is not None and (piece < 6) == (player_turn == 'white'):
                         selected_square = (row, col)
+                        targets = {move_to_tuple(m)[1] for m in legal_moves.get(selected_square, [])}
+                        dirty |= {selected_square} | targets
+
+        # AI move for black: searched on a worker thread so the window keeps
+        # responding, with the result posted back through a queue
+        if player_turn == 'black' and legal_moves:
+            if engine_thread is None:
+                engine_thread = threading.Thread(
+                    target=engine_worker, args=(chess_board, engine_results, engine_stop), daemon=True)
+                engine_thread.start()
+                pygame.display.set_caption("Chess Engine GUI - thinking...")
+            try:
+                result = engine_results.get_nowait()
+            except queue.Empty:
+                result = None
+            if result is not None:
+                engine_thread = None
+                dirty |= changed_squares(chess_board, result.best_move)
+                make_move(chess_board, result.best_move)
+                player_turn = 'white'
+                legal_moves = moves_by_square(generate_legal_moves(chess_board, player_turn))
+                pygame.display.set_caption(f"Chess Engine GUI - depth {result.depth}, eval {result.best_eval:+.2f}")
+
+        if not legal_moves and not game_over:
+            game_over = True
+            if not chess_board.in_check():
+                pygame.display.set_caption("Chess Engine GUI - Stalemate!")
+            else:
+                pygame.display.set_caption(f"Chess Engine GUI - {'Black' if player_turn == 'white' else 'White'} wins!")
 
-        # AI move for black
-        if player_turn == 'black':
-            best_eval, best_move = search_best_move(chess_board, depth=3, is_white_turn=False)
-            chess_board = make_move(chess_board, best_move)
-            player_turn = 'white'
+        if dirty:
+            pygame.display.update(draw_pieces(board_surface, chess_board, dirty, selected_square, targets))
+        clock.tick(FPS)
 
+    engine_stop.set()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -1,11 +1,12 @@
-from chess.board import setup_initial_board, print_board
+from chess.board import setup_initial_position, print_board
 from chess.search import search_best_move, make_move
 from chess.move_generator import generate_legal_moves
+from chess.position import move_to_tuple
 # from chess.pieces import Piece
 
 def main():
     # Step 1: Initialize the chessboard
-    chess_board = setup_initial_board()
+    chess_board = setup_initial_position()
     print("Initial Board:")
     print_board(chess_board)
     # Step 2: Set up game loop
@@ -23,30 +24,28 @@ def main():
         # Step 3: Generate and search for the best move using Minimax
         best_eval, best_move = search_best_move(chess_board, depth=max_depth, is_white_turn=is_white_turn)
 
-        if not best_move:
+        if best_move is None:
             print("No legal moves available!")
-            if is_white_turn:
-                print("Black wins!")
-            else:
-                print("White wins!")
             break
 
         # Step 4: Apply the best move to the board
-        start_pos, end_pos = best_move
+        start_pos, end_pos = move_to_tuple(best_move)
         print(f"Best move: {start_pos} -> {end_pos}")
 
-        # Update the board with the best move
-        chess_board = make_move(chess_board, best_move)
+        # Update the board with the best move (in place)
+        make_move(chess_board, best_move)
 
         # Print the updated board
         print_board(chess_board)
-        # Step 5: Check for game-ending conditions (e.g., checkmate, stalemate)
-        legal_moves = generate_legal_moves(chess_board, 'white' if is_white_turn else 'black')
+        # Step 5: Check for game-ending conditions (checkmate, stalemate) for the side now to move
+        legal_moves = generate_legal_moves(chess_board, 'black' if is_white_turn else 'white')
         if not legal_moves:
-            if is_white_turn:
-                print("Black wins!")
-            else:
+            if not chess_board.in_check():
+                print("Stalemate!")
+            elif is_white_turn:
                 print("White wins!")
+            else:
+                print("Black wins!")
             break
 
         # Step 6: Switch turns
@@ -0,0 +1,29 @@
+import pytest
+
+from chess.position import Position, STARTING_FEN
+
+
+def test_starting_position_round_trips():
+    assert Position.from_fen(STARTING_FEN).to_fen() == STARTING_FEN
+
+
+def test_en_passant_square_round_trips():
+    fen = 'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2'
+    assert Position.from_fen(fen).to_fen() == fen
+
+
+@pytest.mark.parametrize('square', ['e9', 'e4', 'i3', 'e', 'e33'])
+def test_en_passant_square_off_the_third_and_sixth_ranks_is_rejected(square):
+    with pytest.raises(ValueError):
+        Position.from_fen(f'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq {square} 0 1')
+
+
+@pytest.mark.parametrize('placement', [
+    '8/8/8/8/8/8/8/8',            # no kings
+    '8/8/8/8/8/8/8/4K3',          # no black king
+    '4k3/8/8/8/8/8/8/8',          # no white king
+    '4k3/8/8/8/8/8/8/3KK3',       # two white kings
+])
+def test_each_side_needs_exactly_one_king(placement):
+    with pytest.raises(ValueError):
+        Position.from_fen(f'{placement} w - - 0 1')
@@ -0,0 +1,36 @@
+import asyncio
+
+from chess.position import STARTING_FEN
+from chess.service import AnalysisService, parse_request, search_movetime
+
+
+def test_timeout_is_not_part_of_the_key():
+    first, _ = parse_request({'fen': STARTING_FEN, 'depth': 30, 'timeout': 300})
+    second, _ = parse_request({'fen': STARTING_FEN, 'depth': 30, 'timeout': 1000})
+    assert first == second
+
+
+def test_search_movetime_fits_in_the_timeout():
+    assert search_movetime(None, None) is None
+    assert search_movetime(2000, None) == 2000
+    assert 0 < search_movetime(None, 0.3) < 300
+    assert search_movetime(100, 1.0) == 100
+
+
+def test_binding_timeout_returns_a_result():
+    async def run():
+        service = AnalysisService(workers=1, hash_mb=1)
+        try:
+            results = []
+            for timeout in (300, 1000):
+                request = {'fen': STARTING_FEN, 'depth': 30, 'timeout': timeout}
+                results.append(await service.analyse(request))
+            return results, service.timeouts
+        finally:
+            service.close()
+
+    results, timeouts = asyncio.run(run())
+    assert timeouts == 0
+    for result in results:
+        assert result['bestmove'] is not None
+        assert result['depth'] >= 1